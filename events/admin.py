@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import AlertRule
+
+
+@admin.register(AlertRule)
+class AlertRuleAdmin(admin.ModelAdmin):
+    list_display = ["name", "metric", "kind", "operator", "threshold", "window_seconds", "enabled"]
+    list_filter = ["enabled", "metric", "kind"]
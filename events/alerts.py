@@ -0,0 +1,346 @@
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+
+from .encoding import dumps
+from .executor import run_sync
+from .models import AlertRule
+from .sketch import ZERO_KEY, bin_index, quantiles
+
+logger = logging.getLogger(__name__)
+
+# How often rules are checked, which also expires window slots when no events arrive
+EVALUATE_SECONDS = 1.0
+
+PERCENTILE_METRICS = {"p50_latency": 0.5, "p95_latency": 0.95, "p99_latency": 0.99}
+
+
+class Slot:
+    """One second of a Window"""
+
+    __slots__ = ("epoch", "count", "errors", "duration_sum", "bins")
+
+    def __init__(self, epoch):
+        self.epoch = epoch
+        self.count = 0
+        self.errors = 0
+        self.duration_sum = 0
+        self.bins = {}  # sketch bin -> count, as in events.sketch
+
+
+class Window:
+    """
+    Counts, 5xx errors, summed durations and a duration sketch over the last
+    `seconds` seconds, kept as a ring of one-second slots plus running totals.
+    Adding an event touches one slot and the totals; an expiring slot is
+    subtracted from the totals, so each event costs O(1) to add and to
+    forget. Expired slots are handed to `spill`, the window before this one,
+    when a change rule needs it.
+    """
+
+    def __init__(self, seconds, now):
+        self.seconds = seconds
+        self.created = now
+        self.ring = [None] * seconds
+        self.expired_through = now - seconds  # newest epoch no longer covered
+        self.count = 0
+        self.errors = 0
+        self.duration_sum = 0
+        self.bins = {}
+        self.spill = None
+
+    def add(self, epoch, duration_ms, status_code):
+        """Fold in one event; returns False for one older than the window"""
+        if epoch <= self.expired_through:
+            return False
+        self.advance(epoch)
+        slot = self._slot(epoch)
+        key = str(bin_index(duration_ms)) if duration_ms > 0 else ZERO_KEY
+        error = status_code >= 500
+        slot.count += 1
+        slot.errors += error
+        slot.duration_sum += duration_ms
+        slot.bins[key] = slot.bins.get(key, 0) + 1
+        self.count += 1
+        self.errors += error
+        self.duration_sum += duration_ms
+        self.bins[key] = self.bins.get(key, 0) + 1
+        return True
+
+    def add_slot(self, slot):
+        """Take over a whole slot expired from the next window"""
+        if slot.epoch <= self.expired_through:
+            return
+        self.advance(slot.epoch)
+        self.ring[slot.epoch % self.seconds] = slot
+        self.count += slot.count
+        self.errors += slot.errors
+        self.duration_sum += slot.duration_sum
+        for key, count in slot.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+
+    def _slot(self, epoch):
+        index = epoch % self.seconds
+        slot = self.ring[index]
+        if slot is None or slot.epoch != epoch:
+            slot = self.ring[index] = Slot(epoch)
+        return slot
+
+    def advance(self, now):
+        """Expire every slot older than `seconds` before `now`"""
+        through = now - self.seconds
+        if through <= self.expired_through:
+            return
+        # A gap longer than the window visits each ring position once
+        first = max(self.expired_through + 1, through - self.seconds + 1)
+        for epoch in range(first, through + 1):
+            index = epoch % self.seconds
+            slot = self.ring[index]
+            if slot is not None and slot.epoch <= through:
+                self.ring[index] = None
+                self._forget(slot)
+        self.expired_through = through
+
+    def _forget(self, slot):
+        self.count -= slot.count
+        self.errors -= slot.errors
+        self.duration_sum -= slot.duration_sum
+        for key, count in slot.bins.items():
+            left = self.bins[key] - count
+            if left:
+                self.bins[key] = left
+            else:
+                del self.bins[key]
+        if self.spill is not None:
+            self.spill.add_slot(slot)
+
+    def value(self, metric):
+        """`metric` of AlertRule.METRICS over the window, or None without events"""
+        if metric == "rate":
+            return self.count / self.seconds
+        if not self.count:
+            return None
+        if metric == "error_rate":
+            return 100 * self.errors / self.count
+        if metric == "avg_latency":
+            return self.duration_sum / self.count
+        return quantiles(self.bins, [PERCENTILE_METRICS[metric]])[0]
+
+
+class RuleState:
+    """
+    A loaded AlertRule and its last reported status: "resolved", "firing",
+    or "no_data" for a rule that was firing until its window ran out of
+    events to judge it on
+    """
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.config = rule_config(rule)
+        self.status = "resolved"
+        self.value = None
+        self.changed_at = None
+
+    @property
+    def firing(self):
+        return self.status == "firing"
+
+
+def rule_config(rule):
+    """The fields that, when edited, restart a rule's state"""
+    return (rule.metric, rule.kind, rule.operator, rule.threshold, rule.window_seconds, rule.min_events)
+
+
+def load_rules():
+    return list(AlertRule.objects.filter(enabled=True))
+
+
+class AlertEvaluator:
+    """
+    Checks the enabled AlertRules against the live event stream. Every bus
+    message is folded into one sliding Window per distinct window length,
+    shared by the rules using it, in O(1) per event. Once a second the rules
+    read their metric from the totals, and each change between firing and
+    resolved is passed to `broadcast` as a message with an `alert` SSE frame.
+    A firing rule whose window no longer has enough events to judge it moves
+    to no_data instead of staying firing after traffic stops.
+
+    Rules are re-read every ALERT_RULES_REFRESH_SECONDS. A new window only
+    counts once it has covered its whole length (twice that for change
+    rules), so a fresh rule does not fire on a partial window.
+    """
+
+    def __init__(self, broadcast):
+        self.broadcast = broadcast
+        self.states = {}  # rule id -> RuleState
+        self.windows = {}  # seconds -> Window
+        self._task = None
+        self._loaded_at = None
+        self.observed = 0
+        self.late = 0
+        self.observe_seconds = 0.0
+        self.evaluations = 0
+        self.evaluation_seconds = 0.0
+        self.evaluation_max_seconds = 0.0
+        self.transitions = 0
+
+    def ensure_running(self):
+        """Start the evaluation loop if it is not running on the current loop"""
+        loop = asyncio.get_running_loop()
+        if self._task and not self._task.done() and self._task.get_loop() is loop:
+            return
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                now = time.time()
+                if self._loaded_at is None or now - self._loaded_at >= settings.ALERT_RULES_REFRESH_SECONDS:
+                    self.set_rules(await run_sync(load_rules), int(now))
+                    self._loaded_at = now
+                self.evaluate(now)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Alert evaluation failed: {str(e)}")
+            await asyncio.sleep(EVALUATE_SECONDS)
+
+    def set_rules(self, rules, now):
+        """Swap in freshly loaded rules, keeping the state and windows of unchanged ones"""
+        previous = self.states
+        states = {}
+        for rule in rules:
+            state = previous.pop(rule.id, None)
+            if state is not None and state.config != rule_config(rule):
+                previous[rule.id] = state
+                state = None
+            if state is None:
+                state = RuleState(rule)
+            state.rule = rule
+            states[rule.id] = state
+        for state in previous.values():
+            # Deleted, disabled or edited while reported: let clients clear it
+            if state.status != "resolved":
+                state.status = "resolved"
+                self._transition(state, time.time())
+        self.states = states
+
+        windows = {}
+        for state in states.values():
+            seconds = state.rule.window_seconds
+            window = windows.get(seconds) or self.windows.get(seconds) or Window(seconds, now)
+            if state.rule.kind == "change" and window.spill is None:
+                # Covers the `seconds` before the window, filled as its slots expire
+                window.spill = Window(seconds, now - seconds)
+                window.spill.created = now
+            windows[seconds] = window
+        self.windows = windows
+
+    def observe(self, message):
+        """Fold one bus message (see stream.encode_event_message) into every window"""
+        if not self.windows:
+            return
+        started = time.perf_counter()
+        epoch = message["id"] // 1_000_000
+        data = message["data"]
+        for window in self.windows.values():
+            if not window.add(epoch, data["duration_ms"], data["status_code"]):
+                self.late += 1
+        self.observed += 1
+        self.observe_seconds += time.perf_counter() - started
+
+    def evaluate(self, now):
+        """Check every rule against its window at `now` (epoch seconds)"""
+        started = time.perf_counter()
+        epoch = int(now)
+        for window in self.windows.values():
+            window.advance(epoch)
+            if window.spill is not None:
+                window.spill.advance(epoch - window.seconds)
+
+        for state in self.states.values():
+            rule = state.rule
+            window = self.windows[rule.window_seconds]
+            value = self.rule_value(rule, window, epoch)
+            state.value = value
+            if value is None:
+                # E.g. traffic stopped: a firing rule can no longer be judged,
+                # so it stops being reported as firing
+                status = "no_data" if state.status == "firing" else state.status
+            elif value > rule.threshold if rule.operator == ">" else value < rule.threshold:
+                status = "firing"
+            else:
+                status = "resolved"
+            if status != state.status:
+                state.status = status
+                self._transition(state, now)
+
+        elapsed = time.perf_counter() - started
+        self.evaluations += 1
+        self.evaluation_seconds += elapsed
+        self.evaluation_max_seconds = max(self.evaluation_max_seconds, elapsed)
+
+    def rule_value(self, rule, window, epoch):
+        """The value `rule` compares, or None when its window cannot tell yet"""
+        if epoch - window.created < window.seconds:
+            return None
+        if rule.kind == "change" and epoch < max(
+            window.created + 2 * window.seconds, window.spill.created + window.seconds
+        ):
+            # The window before is not yet made of seconds this window saw
+            return None
+        if rule.metric != "rate" and window.count < rule.min_events:
+            return None
+        value = window.value(rule.metric)
+        if rule.kind == "threshold" or value is None:
+            return value
+        previous = window.spill.value(rule.metric)
+        if not previous or (rule.metric != "rate" and window.spill.count < rule.min_events):
+            return None
+        return 100 * (value - previous) / previous
+
+    def _transition(self, state, now):
+        state.changed_at = now
+        self.transitions += 1
+        logger.info("Alert %s %s (%s)", state.rule.name, state.status, state.value)
+        self.broadcast(alert_message(state))
+
+    def firing_messages(self):
+        """Messages for the rules firing now, for a client that just connected"""
+        return [alert_message(state) for state in self.states.values() if state.firing]
+
+    def stats(self):
+        return {
+            "rules": len(self.states),
+            "firing": sum(state.firing for state in self.states.values()),
+            "observed": self.observed,
+            "late": self.late,
+            "observe_seconds": self.observe_seconds,
+            "evaluations": self.evaluations,
+            "evaluation_seconds": self.evaluation_seconds,
+            "evaluation_max_seconds": self.evaluation_max_seconds,
+            "transitions": self.transitions,
+        }
+
+
+def alert_message(state):
+    """
+    A bus message for a rule's current status. It has no id: alerts are not
+    events, so they are neither replayed nor allowed to move Last-Event-ID.
+    """
+    rule = state.rule
+    payload = {
+        "rule": rule.id,
+        "name": rule.name,
+        "state": state.status,
+        "metric": rule.metric,
+        "kind": rule.kind,
+        "operator": rule.operator,
+        "threshold": rule.threshold,
+        "window_seconds": rule.window_seconds,
+        "value": round(state.value, 3) if state.value is not None else None,
+        "timestamp": int(state.changed_at * 1000) if state.changed_at else None,
+    }
+    return {"id": None, "data": payload, "frame": f"data: {dumps(payload).decode()}\nevent: alert\n\n"}
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class EventsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "events"
+
+    def ready(self):
+        from .instrumentation import configure_logging, install_query_recorder
+
+        connection_created.connect(install_query_recorder)
+        configure_logging(settings.EVENT_LOG_LEVEL)
@@ -0,0 +1,79 @@
+from datetime import datetime, timezone as dt_timezone
+
+from .sketch import add_value, merge_sketch
+
+# A bucket is a plain dict of additive statistics for one time slot, shared
+# by the rollup tables and the in-memory ring buffer
+COUNTER_FIELDS = ["count", "duration_sum", "status_2xx", "status_3xx", "status_4xx", "status_5xx"]
+
+
+def floor_epoch(ts, seconds):
+    """Start of the `seconds`-wide bucket containing `ts`, as epoch seconds"""
+    epoch = int(ts.timestamp())
+    return epoch - epoch % seconds
+
+
+def epoch_to_datetime(epoch):
+    return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+
+
+def empty_bucket(timestamp):
+    return {
+        "timestamp": timestamp,
+        "count": 0,
+        "duration_sum": 0,
+        "duration_min": None,
+        "duration_max": None,
+        "status_2xx": 0,
+        "status_3xx": 0,
+        "status_4xx": 0,
+        "status_5xx": 0,
+        "method_counts": {},
+        "duration_sketch": {},
+        "method_sketches": {},  # method -> duration sketch
+    }
+
+
+def add_event(bucket, method, duration_ms, status_code):
+    """Fold a single event into a bucket"""
+    bucket["count"] += 1
+    bucket["duration_sum"] += duration_ms
+    if bucket["duration_min"] is None or duration_ms < bucket["duration_min"]:
+        bucket["duration_min"] = duration_ms
+    if bucket["duration_max"] is None or duration_ms > bucket["duration_max"]:
+        bucket["duration_max"] = duration_ms
+    status_field = f"status_{status_code // 100}xx"
+    if status_field in bucket:
+        bucket[status_field] += 1
+    methods = bucket["method_counts"]
+    methods[method] = methods.get(method, 0) + 1
+    add_value(bucket["duration_sketch"], duration_ms)
+    add_value(bucket["method_sketches"].setdefault(method, {}), duration_ms)
+
+
+def merge_bucket(target, other):
+    """Fold bucket `other` into bucket `target`"""
+    for name in COUNTER_FIELDS:
+        target[name] += other[name]
+    for name, pick in (("duration_min", min), ("duration_max", max)):
+        values = [v for v in (target[name], other[name]) if v is not None]
+        target[name] = pick(values) if values else None
+    methods = target["method_counts"]
+    for method, count in other["method_counts"].items():
+        methods[method] = methods.get(method, 0) + count
+    merge_sketch(target["duration_sketch"], other["duration_sketch"])
+    sketches = target["method_sketches"]
+    for method, sketch in other["method_sketches"].items():
+        merge_sketch(sketches.setdefault(method, {}), sketch)
+
+
+def regroup_buckets(buckets, interval_seconds):
+    """Merge time-ordered buckets into new, coarser `interval_seconds` buckets"""
+    merged = {}
+    for bucket in buckets:
+        start = floor_epoch(bucket["timestamp"], interval_seconds)
+        target = merged.get(start)
+        if target is None:
+            target = merged[start] = empty_bucket(epoch_to_datetime(start))
+        merge_bucket(target, bucket)
+    return [merged[start] for start in sorted(merged)]
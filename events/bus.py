@@ -0,0 +1,181 @@
+import asyncio
+import logging
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """A single SSE client's view of the event bus"""
+
+    def __init__(self, max_queue_size):
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        self.dropped = 0
+        self.closed = False
+
+    async def get(self):
+        """Wait for the next message, or None once the subscription is closed"""
+        if self.closed and self.queue.empty():
+            return None
+        return await self.queue.get()
+
+    def close(self):
+        """Drain pending messages and wake the consumer with a sentinel"""
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class EventBus:
+    """
+    Single-producer, multi-consumer fan-out for the SSE stream.
+
+    One producer task generates each event once and pushes the already
+    encoded message onto a bounded queue per subscriber. When a subscriber
+    falls behind, its oldest message is dropped; once it has dropped more than
+    `max_dropped` messages it is disconnected so it can reconnect fresh.
+    `on_stop`, if given, is awaited whenever the producer task ends.
+
+    With `replay_size`, the last messages published are kept so a client
+    reconnecting with the `id` of the last message it saw can be sent what
+    it missed; message ids must be unique. `newest_id` is the highest id
+    published so far.
+    """
+
+    def __init__(
+        self, produce, is_active, next_delay, max_queue_size=None, max_dropped=None, on_stop=None,
+        replay_size=0,
+    ):
+        self._produce = produce
+        self._is_active = is_active
+        self._next_delay = next_delay
+        self._on_stop = on_stop
+        self._replay = deque(maxlen=replay_size)
+        self.newest_id = None
+        self.max_queue_size = max_queue_size or getattr(settings, "EVENT_BUS_QUEUE_SIZE", 256)
+        self.max_dropped = max_dropped or getattr(settings, "EVENT_BUS_MAX_DROPPED", 1024)
+        self._subscribers = set()
+        self._task = None
+        self._loop = None
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        """Register a new subscriber and make sure the producer is running"""
+        subscription = Subscription(self.max_queue_size)
+        self._subscribers.add(subscription)
+        self._ensure_producer()
+        logger.info("Subscriber added (%d connected)", len(self._subscribers))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+        subscription.close()
+        logger.info("Subscriber removed (%d connected)", len(self._subscribers))
+
+    def replay_after(self, last_id):
+        """
+        (messages published after the one with id `last_id`, whether that is
+        all of them). Found by position rather than by comparing ids, so ids
+        that went backwards, e.g. from a new producer with a slower clock,
+        lose nothing. When that message is no longer buffered, the result is
+        the buffered messages with larger ids and not complete.
+        """
+        messages = []
+        for message in reversed(self._replay):
+            if message["id"] == last_id:
+                messages.reverse()
+                return messages, True
+            messages.append(message)
+        return [message for message in self._replay if message["id"] > last_id], False
+
+    def clear_replay(self):
+        """Forget the replay buffer, e.g. after messages were missed"""
+        self._replay.clear()
+
+    def publish(self, message):
+        """Fan a message out to every subscriber without ever blocking the producer"""
+        if self._replay.maxlen:
+            self._replay.append(message)
+        if self.newest_id is None or message["id"] > self.newest_id:
+            self.newest_id = message["id"]
+        self._fan_out(message)
+
+    def broadcast(self, message):
+        """
+        Fan out a message that is not an event, e.g. an alert. It stays out
+        of the replay buffer, and with an `id` of None it never moves a
+        client's Last-Event-ID.
+        """
+        self._fan_out(message)
+
+    def _fan_out(self, message):
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                subscription.queue.get_nowait()
+                subscription.queue.put_nowait(message)
+                subscription.dropped += 1
+                if subscription.dropped > self.max_dropped:
+                    logger.warning(
+                        "Disconnecting slow subscriber after %d dropped messages",
+                        subscription.dropped,
+                    )
+                    self.unsubscribe(subscription)
+
+    def stop(self):
+        """Stop the producer and close every subscriber; safe to call from any thread"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._shutdown()
+        else:
+            self._loop.call_soon_threadsafe(self._shutdown)
+
+    def _shutdown(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        for subscription in list(self._subscribers):
+            self.unsubscribe(subscription)
+
+    def _ensure_producer(self):
+        if self._task and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run())
+
+    async def _run(self):
+        logger.info("Event bus producer started")
+        try:
+            while self._subscribers and self._is_active():
+                try:
+                    message = await self._produce()
+                except Exception as e:
+                    logger.error(f"Error in producer: {str(e)}")
+                    break
+                if message is not None:
+                    self.publish(message)
+                await asyncio.sleep(self._next_delay())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for subscription in list(self._subscribers):
+                self.unsubscribe(subscription)
+            if self._on_stop:
+                try:
+                    await self._on_stop()
+                except Exception as e:
+                    logger.error(f"Error stopping producer: {str(e)}")
+            logger.info("Event bus producer stopped")
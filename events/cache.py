@@ -0,0 +1,192 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .buckets import epoch_to_datetime, floor_epoch
+
+# Marks a closed bucket that is known to hold no events
+EMPTY = "empty"
+
+# Invalidations touching more keys than this just clear the bucket cache
+MAX_INVALIDATE_KEYS = 10000
+
+
+class LocalBackend:
+    """Size-bounded in-process LRU store"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+        return found
+
+    def set_many(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCacheBackend:
+    """
+    Store backed by one of the configured Django caches, e.g. Redis, which
+    may be shared with other applications. Keys include a version kept in
+    the cache itself, so clear() moves every worker to fresh keys without
+    touching anyone else's; the old ones expire with their timeout.
+    """
+
+    VERSION_KEY = "events:bucket:version"
+
+    def __init__(self, alias, timeout):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def _version(self):
+        version = self.cache.get(self.VERSION_KEY)
+        if version is None:
+            # Started from the clock rather than 1, so a version lost to
+            # eviction does not come back to keys that are still cached
+            self.cache.add(self.VERSION_KEY, time.time_ns(), timeout=None)
+            version = self.cache.get(self.VERSION_KEY)
+        return version
+
+    @staticmethod
+    def _key(version, key):
+        return f"events:bucket:{version}:" + ":".join(str(part) for part in key)
+
+    def get_many(self, keys):
+        version = self._version()
+        names = {self._key(version, key): key for key in keys}
+        return {names[name]: value for name, value in self.cache.get_many(list(names)).items()}
+
+    def set_many(self, values):
+        version = self._version()
+        self.cache.set_many(
+            {self._key(version, key): value for key, value in values.items()}, self.timeout
+        )
+
+    def delete_many(self, keys):
+        version = self._version()
+        self.cache.delete_many([self._key(version, key) for key in keys])
+
+    def clear(self):
+        try:
+            self.cache.incr(self.VERSION_KEY)
+        except ValueError:  # not set, e.g. evicted; a new version starts from the clock
+            self._version()
+
+
+class BucketCache:
+    """
+    Cache of closed time buckets, keyed by (metric, interval, bucket start).
+
+    A bucket is closed once its end is older than the ingest settle time;
+    closed buckets never change, so a repeated chart load only recomputes
+    the buckets after the last cached one, normally just the open tail.
+    """
+
+    def __init__(self, backend, settle_seconds):
+        self.backend = backend
+        self.settle_seconds = settle_seconds
+        self.hits = 0
+        self.misses = 0
+        self._intervals = set()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def fetch(self, metric, start_time, end_time, interval_seconds, compute):
+        """
+        Buckets from `start_time` (aligned down to the interval) to `end_time`,
+        using `compute(start, end, interval)` for whatever is not cached.
+        """
+        self._intervals.add((metric, interval_seconds))
+        first = floor_epoch(start_time, interval_seconds)
+        closed_until = floor_epoch(end_time, interval_seconds)
+        settled = floor_epoch(timezone.now(), 1) - self.settle_seconds
+        closed_until = min(closed_until, settled - settled % interval_seconds)
+
+        starts = list(range(first, closed_until, interval_seconds))
+        cached = self.backend.get_many([(metric, interval_seconds, start) for start in starts])
+
+        # Everything from the first uncached bucket onward is recomputed in one call
+        missing_from = closed_until
+        for start in starts:
+            if (metric, interval_seconds, start) not in cached:
+                missing_from = start
+                break
+        hit_count = (missing_from - first) // interval_seconds
+        self.hits += hit_count
+        self.misses += len(starts) - hit_count
+
+        fresh = compute(epoch_to_datetime(missing_from), end_time, interval_seconds)
+        fresh_by_start = {int(bucket["timestamp"].timestamp()): bucket for bucket in fresh}
+        self.backend.set_many({
+            (metric, interval_seconds, start): fresh_by_start.get(start, EMPTY)
+            for start in range(missing_from, closed_until, interval_seconds)
+        })
+
+        buckets = []
+        for start in starts:
+            if start >= missing_from:
+                break
+            bucket = cached[(metric, interval_seconds, start)]
+            if bucket != EMPTY:
+                buckets.append(bucket)
+        return buckets + fresh
+
+    def invalidate(self, start_time, end_time):
+        """Forget cached buckets overlapping [start_time, end_time], e.g. after late writes"""
+        keys = []
+        for metric, interval_seconds in self._intervals:
+            first = floor_epoch(start_time, interval_seconds)
+            last = floor_epoch(end_time, interval_seconds)
+            if len(keys) + (last - first) // interval_seconds >= MAX_INVALIDATE_KEYS:
+                self.clear()
+                return
+            keys.extend(
+                (metric, interval_seconds, start)
+                for start in range(first, last + 1, interval_seconds)
+            )
+        self.backend.delete_many(keys)
+
+    def clear(self):
+        self.backend.clear()
+
+
+def build_bucket_cache():
+    alias = settings.EVENT_BUCKET_CACHE_BACKEND
+    if alias:
+        backend = DjangoCacheBackend(alias, timeout=settings.EVENT_RETENTION_DAYS * 24 * 3600)
+    else:
+        backend = LocalBackend(settings.EVENT_BUCKET_CACHE_MAX_ENTRIES)
+    return BucketCache(backend, settle_seconds=settings.INGEST_MAX_LATENCY_MS // 1000 + 2)
+
+
+bucket_cache = build_bucket_cache()
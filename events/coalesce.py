@@ -0,0 +1,93 @@
+import time
+
+from .buckets import add_event, empty_bucket
+from .encoding import dumps
+from .sketch import quantiles
+
+
+class FrameCoalescer:
+    """
+    Folds the bus messages of one SSE connection into a bucket per
+    `interval_seconds` of event time and sends a single `aggregate` frame per
+    bucket, plus at most `raw_per_second` of the raw `api.request` frames.
+
+    Aggregate frames carry the id of the last event folded into them, so a
+    client resuming with Last-Event-ID gets every later event re-folded. The
+    sampled raw frames are sent without an id for the same reason.
+    """
+
+    def __init__(self, interval_seconds, raw_per_second, percentiles):
+        self.interval = interval_seconds
+        self.raw_per_second = raw_per_second
+        self.percentiles = percentiles
+        self.start = None  # epoch seconds of the open bucket
+        self.bucket = None
+        self.last_id = None
+        self._tokens = raw_per_second
+        self._refilled = time.monotonic()
+
+    def _open(self, epoch):
+        self.start = epoch - epoch % self.interval
+        self.bucket = empty_bucket(self.start)
+
+    def add(self, message):
+        """Fold one message in; returns the frames to send for it"""
+        frames = []
+        epoch = message["id"] // 1_000_000
+        if self.start is None:
+            self._open(epoch)
+        elif epoch >= self.start + self.interval:
+            frames.append(self.close(epoch))
+        # Anything older than the open bucket arrived late and counts there
+        data = message["data"]
+        add_event(self.bucket, data["method"], data["duration_ms"], data["status_code"])
+        self.last_id = message["id"]
+
+        if self._take_sample():
+            # Drop the id line: only aggregate frames may move Last-Event-ID
+            frames.append(message["frame"].split("\n", 1)[1])
+        return frames
+
+    def seconds_left(self, now):
+        """Until the open bucket ends, opening one at `now` if there is none"""
+        if self.start is None:
+            self._open(int(now))
+        return max(self.start + self.interval - now, 0)
+
+    def close(self, now):
+        """Frame for the open bucket, then open the bucket containing `now`"""
+        bucket = self.bucket
+        count = bucket["count"]
+        values = quantiles(bucket["duration_sketch"], list(self.percentiles.values()))
+        payload = {
+            "timestamp": self.start * 1000,
+            "interval": self.interval,
+            "count": count,
+            "avg": round(bucket["duration_sum"] / count, 2) if count else None,
+            "min": bucket["duration_min"],
+            "max": bucket["duration_max"],
+            **{
+                name: round(value, 2) if value is not None else None
+                for name, value in zip(self.percentiles, values)
+            },
+            "status_4xx": bucket["status_4xx"],
+            "status_5xx": bucket["status_5xx"],
+            "methods": bucket["method_counts"],
+        }
+        self._open(int(now))
+        frame = f"data: {dumps(payload).decode()}\nevent: aggregate\n\n"
+        return f"id: {self.last_id}\n{frame}" if self.last_id is not None else frame
+
+    def _take_sample(self):
+        """Token bucket allowing `raw_per_second` raw frames, with bursts of as many"""
+        if self.raw_per_second <= 0:
+            return False
+        now = time.monotonic()
+        self._tokens = min(
+            max(self.raw_per_second, 1), self._tokens + (now - self._refilled) * self.raw_per_second
+        )
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
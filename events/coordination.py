@@ -0,0 +1,353 @@
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from .cache import bucket_cache
+from .executor import run_sync
+from .models import Event, GenerationState
+from .ringbuffer import recent_events
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY channel carrying generated events and state changes between workers
+CHANNEL = "logwatcher_events"
+
+# Session advisory lock held by the one worker that generates events
+PRODUCER_LOCK_KEY = 0x6C6F6777
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7900
+
+# How often a listening worker re-reads the state row, and waits before reconnecting
+STATE_REFRESH_SECONDS = 5
+
+# Identifies this process in notifications, so it skips its own
+ORIGIN = uuid.uuid4().hex
+
+UNANNOUNCED_WRITES_WARNING = (
+    "Coordination is local, so a running server is not told about events or rollups "
+    "written by this command: its charts may leave them out until it is restarted"
+)
+
+
+def load_state():
+    return GenerationState.objects.filter(pk=1).first() or GenerationState()
+
+
+def coordination_backend():
+    backend = settings.EVENT_COORDINATION_BACKEND
+    if not backend:
+        backend = "postgres" if connection.vendor == "postgresql" else "local"
+    if backend not in ("postgres", "local"):
+        raise ImproperlyConfigured(f"Unknown EVENT_COORDINATION_BACKEND {backend!r}")
+    return backend
+
+
+def announces_writes():
+    """
+    Whether announce_write reaches other processes. With local coordination
+    a server only knows about the events it stored itself.
+    """
+    return coordination_backend() == "postgres"
+
+
+def announce_write(oldest, newest):
+    """
+    Tell every worker that events between `oldest` and `newest` were stored
+    or re-aggregated outside the live stream, e.g. by the ingest API or a
+    backfill, so their ring buffers and bucket caches do not answer for
+    that time from memory. Works from any process, including management
+    commands; inside a transaction it is delivered on commit.
+    """
+    if not announces_writes():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_notify(%s, %s)",
+            [
+                CHANNEL,
+                json.dumps({"origin": ORIGIN, "written": [oldest.isoformat(), newest.isoformat()]}),
+            ],
+        )
+
+
+def announce_ingested(created):
+    """`on_batch` for ingest_lines and tail_logs: announce a stored batch's time range"""
+    if created:
+        announce_write(
+            min(event.timestamp for event in created), max(event.timestamp for event in created)
+        )
+
+
+def open_connection(listen=False):
+    """A raw autocommit connection to the default database, outside Django's pooling"""
+    wrapper = connections["default"]
+    raw = wrapper.get_new_connection(wrapper.get_connection_params())
+    raw.autocommit = True
+    if listen:
+        with raw.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+    return raw
+
+
+class Coordinator:
+    """
+    Where the generation state lives and how workers share the event stream.
+
+    `on_event(event)` is called for events generated by another worker,
+    `on_stopped()` whenever generation is stopped, by any worker, and
+    `on_gap()` when relayed events may have been missed.
+    """
+
+    def __init__(self, on_event, on_stopped, on_gap=None):
+        self.on_event = on_event
+        self.on_stopped = on_stopped
+        self.on_gap = on_gap
+        self.auto_stop = timedelta(minutes=settings.EVENT_GENERATION_AUTO_STOP_MINUTES)
+        self.state = GenerationState()
+        self.is_producer = False
+
+    def is_generating(self):
+        """From the last known state; cheap enough to check per event"""
+        return self.state.is_active()
+
+
+class LocalCoordinator(Coordinator):
+    """
+    Single-process stand-in: the state lives in memory and this process is
+    always the producer, so there is nothing to relay.
+    """
+
+    async def current_state(self):
+        return self.state
+
+    async def start(self):
+        now = timezone.now()
+        self.state = GenerationState(
+            is_generating=True, started_at=now, expires_at=now + self.auto_stop
+        )
+        return self.state
+
+    async def stop(self):
+        self.state = GenerationState()
+        self.on_stopped()
+        return self.state
+
+    async def acquire_producer(self):
+        self.is_producer = True
+        return True
+
+    async def release_producer(self):
+        self.is_producer = False
+
+    async def publish(self, event_data):
+        pass
+
+    async def ensure_listening(self):
+        pass
+
+    async def close(self):
+        self.is_producer = False
+
+
+class PostgresCoordinator(Coordinator):
+    """
+    Coordination through PostgreSQL for several worker processes or nodes.
+
+    The state is the GenerationState row. Whichever worker holds the session
+    advisory lock PRODUCER_LOCK_KEY generates the events and NOTIFYs them on
+    CHANNEL; every other worker LISTENs and feeds them into its own ring
+    buffer and subscribers, so each event is produced once and streamed by
+    every worker. State changes are notified the same way, so a stop reaches
+    every worker at once and the auto-stop time is the same everywhere.
+    """
+
+    def __init__(self, on_event, on_stopped, on_gap=None):
+        super().__init__(on_event, on_stopped, on_gap)
+        self.origin = ORIGIN
+        self._lock_connection = None  # holds the advisory lock, used from executor threads
+        self._guard = threading.Lock()
+        self._listener = None
+
+    async def current_state(self):
+        self.state = await run_sync(load_state)
+        return self.state
+
+    async def start(self):
+        self.state = await run_sync(self._save_state, True)
+        return self.state
+
+    async def stop(self):
+        self.state = await run_sync(self._save_state, False)
+        self.on_stopped()
+        return self.state
+
+    def _save_state(self, is_generating):
+        now = timezone.now()
+        with transaction.atomic():
+            state, _ = GenerationState.objects.select_for_update().get_or_create(pk=1)
+            state.is_generating = is_generating
+            state.started_at = now if is_generating else None
+            state.expires_at = now + self.auto_stop if is_generating else None
+            state.save()
+            # Delivered to the listeners when the transaction commits
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_notify(%s, %s)",
+                    [CHANNEL, json.dumps({"origin": self.origin, "state": is_generating})],
+                )
+        return state
+
+    async def acquire_producer(self):
+        """Try to become the producer; non-blocking, so followers simply retry"""
+        if not self.is_producer:
+            self.is_producer = await run_sync(self._try_lock)
+            if self.is_producer:
+                logger.info("This worker is now the event producer")
+        return self.is_producer
+
+    async def release_producer(self):
+        if self.is_producer:
+            self.is_producer = False
+            await run_sync(self._unlock)
+
+    async def publish(self, event_data):
+        """Send an event this worker generated to every other worker"""
+        payload = json.dumps({"origin": self.origin, "event": event_data})
+        if len(payload.encode()) >= MAX_PAYLOAD_BYTES:
+            # Too big for NOTIFY; the other workers still get the event, without metadata
+            payload = json.dumps({"origin": self.origin, "event": {**event_data, "metadata": {}}})
+        await run_sync(self._notify, payload)
+
+    def _try_lock(self):
+        with self._guard:
+            try:
+                if self._lock_connection is None or self._lock_connection.closed:
+                    self._lock_connection = open_connection()
+                with self._lock_connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_try_advisory_lock(%s)", [PRODUCER_LOCK_KEY])
+                    return cursor.fetchone()[0]
+            except Exception as e:
+                logger.error(f"Error acquiring the producer lock: {str(e)}")
+                self._close_lock_connection()
+                return False
+
+    def _unlock(self):
+        with self._guard:
+            try:
+                with self._lock_connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", [PRODUCER_LOCK_KEY])
+            except Exception:
+                # Closing the session releases the lock as well
+                self._close_lock_connection()
+
+    def _notify(self, payload):
+        with self._guard:
+            try:
+                with self._lock_connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+            except Exception as e:
+                # The lock went with the session: stop producing so another worker takes over
+                logger.error(f"Error publishing event, giving up the producer lock: {str(e)}")
+                self._close_lock_connection()
+                self.is_producer = False
+
+    def _close_lock_connection(self):
+        if self._lock_connection is not None:
+            self._lock_connection.close()
+            self._lock_connection = None
+
+    async def ensure_listening(self):
+        """Start this worker's listener if it is not running on the current loop"""
+        loop = asyncio.get_running_loop()
+        if self._listener and not self._listener.done() and self._listener.get_loop() is loop:
+            return
+        self._listener = loop.create_task(self._listen())
+
+    async def _listen(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            listener = None
+            try:
+                listener = await run_sync(open_connection, listen=True)
+                await self._refresh()
+                readable = asyncio.Event()
+                loop.add_reader(listener.fileno(), readable.set)
+                try:
+                    while True:
+                        try:
+                            await asyncio.wait_for(readable.wait(), STATE_REFRESH_SECONDS)
+                        except asyncio.TimeoutError:
+                            await self._refresh()
+                            continue
+                        readable.clear()
+                        listener.poll()
+                        while listener.notifies:
+                            await self._dispatch(listener.notifies.pop(0).payload)
+                finally:
+                    loop.remove_reader(listener.fileno())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Coordination listener failed, reconnecting: {str(e)}")
+                # Events were missed, so the ring buffer no longer holds every recent one
+                recent_events.clear()
+                if self.on_gap:
+                    self.on_gap()
+                await asyncio.sleep(STATE_REFRESH_SECONDS)
+            finally:
+                if listener is not None:
+                    listener.close()
+
+    async def _refresh(self):
+        was_active = self.state.is_active()
+        self.state = await run_sync(load_state)
+        if was_active and not self.state.is_active():
+            self.on_stopped()
+
+    async def _dispatch(self, payload):
+        message = json.loads(payload)
+        if "state" in message:
+            await self._refresh()
+        elif message["origin"] == self.origin:
+            return
+        elif "written" in message:
+            oldest, newest = (datetime.fromisoformat(value) for value in message["written"])
+            recent_events.forget_through(newest)
+            if oldest < timezone.now() - timedelta(seconds=bucket_cache.settle_seconds):
+                await run_sync(bucket_cache.invalidate, oldest, newest)
+        else:
+            data = message["event"]
+            event = Event(**{**data, "timestamp": datetime.fromisoformat(data["timestamp"])})
+            recent_events.extend([event])
+            self.on_event(event)
+
+    async def close(self):
+        """Stop listening and give up the producer lock, e.g. before the loop closes"""
+        if self._listener and self._listener.get_loop() is asyncio.get_running_loop():
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        self._listener = None
+        self.is_producer = False
+        await run_sync(self._disconnect)
+
+    def _disconnect(self):
+        with self._guard:
+            self._close_lock_connection()
+
+
+def build_coordinator(on_event, on_stopped, on_gap=None):
+    if coordination_backend() == "postgres":
+        return PostgresCoordinator(on_event, on_stopped, on_gap)
+    return LocalCoordinator(on_event, on_stopped, on_gap)
@@ -0,0 +1,89 @@
+import numpy as np
+
+from .encoding import Series
+
+# Bucket widths (seconds) the fine-grained fetch is rounded up to, so repeated
+# requests share bucket cache entries and align with the rollup resolutions
+NICE_STEPS = [1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 21600, 86400]
+
+# Buckets fetched per output point before reducing, so spikes narrower than
+# an output point still have a bucket of their own to be picked from
+OVERSAMPLE = 4
+
+# Upper bound on ?max_points=
+MAX_POINTS_LIMIT = 10000
+
+METHODS = ("lttb", "minmax")
+
+
+def fine_interval(range_seconds, max_points):
+    """Bucket width giving about OVERSAMPLE buckets per output point"""
+    raw = range_seconds / (max_points * OVERSAMPLE)
+    for step in NICE_STEPS:
+        if step >= raw:
+            return step
+    return NICE_STEPS[-1]
+
+
+def lttb(x, y, threshold):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets: the first
+    and last point, and from each of `threshold` - 2 equal-count buckets the
+    point forming the largest triangle with the previously kept point and
+    the average of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    kept = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[kept] - avg_x) * (y[start:end] - y[kept])
+            - (x[kept] - x[start:end]) * (avg_y - y[kept])
+        )
+        kept = start + int(np.argmax(area))
+        indices[i + 1] = kept
+    return indices
+
+
+def min_max(x, y, threshold):
+    """Indices of the lowest and highest point of each of `threshold` / 2 equal-count bins"""
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    edges = np.linspace(0, n, max(threshold // 2, 1) + 1).astype(np.int64)
+    keep = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            segment = y[lo:hi]
+            keep.extend((lo + int(np.argmin(segment)), lo + int(np.argmax(segment))))
+    return np.unique(keep)
+
+
+def reduce_series(series, max_points, method="lttb"):
+    """A Series of at most `max_points` points picked from `series`"""
+    if max_points is None or len(series) <= max_points:
+        return series
+    x = np.asarray(series.x, dtype=np.float64)
+    y = np.asarray(series.y, dtype=np.float64)
+    pick = lttb if method == "lttb" else min_max
+    reduced = Series()
+    for index in pick(x, y, max_points):
+        reduced.append(series.x[index], series.y[index])
+    return reduced
+
+
+def reduce_all(data, max_points, method="lttb"):
+    """reduce_series over every Series value of a dict"""
+    return {
+        key: reduce_series(value, max_points, method) if isinstance(value, Series) else value
+        for key, value in data.items()
+    }
@@ -0,0 +1,115 @@
+import gzip
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .instrumentation import phase
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used without it
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional; only gzip is offered without it
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+# Levels tuned for responses built per request rather than for ratio
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class Series:
+    """
+    A chart series held as parallel x (epoch ms) and y columns. It encodes as
+    the usual list of {x, y} points, or with ?format=columnar as
+    {"x": [first, delta, ...], "y": [...]}: timestamps delta-encoded as whole
+    milliseconds, which are small, repetitive and compress well.
+    """
+
+    __slots__ = ("x", "y")
+
+    def __init__(self):
+        self.x = []
+        self.y = []
+
+    def append(self, x, y):
+        self.x.append(x)
+        self.y.append(y)
+
+    def __len__(self):
+        return len(self.x)
+
+    def points(self):
+        return [{"x": x, "y": y} for x, y in zip(self.x, self.y)]
+
+    def columns(self):
+        xs = [round(x) for x in self.x]
+        return {"x": xs[:1] + [b - a for a, b in zip(xs, xs[1:])], "y": self.y}
+
+
+def _default(columnar):
+    fallback = DjangoJSONEncoder().default
+
+    def default(obj):
+        if isinstance(obj, Series):
+            return obj.columns() if columnar else obj.points()
+        return fallback(obj)
+
+    return default
+
+
+def dumps(data, columnar=False):
+    """Compact JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default(columnar), option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, default=_default(columnar), separators=(",", ":")).encode()
+
+
+def accepted_encodings(request):
+    """Content codings the client accepts, i.e. listed without q=0"""
+    accepted = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q=") and quality[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def compress(request, response):
+    """Brotli or gzip the body of `response` if the client accepts either"""
+    patch_vary_headers(response, ("Accept-Encoding",))
+    if len(response.content) < MIN_COMPRESS_BYTES or response.has_header("Content-Encoding"):
+        return response
+    accepted = accepted_encodings(request)
+    if brotli is not None and "br" in accepted:
+        response.content = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        response["Content-Encoding"] = "br"
+    elif "gzip" in accepted:
+        response.content = gzip.compress(response.content, compresslevel=GZIP_LEVEL, mtime=0)
+        response["Content-Encoding"] = "gzip"
+    else:
+        return response
+    response["Content-Length"] = str(len(response.content))
+    return response
+
+
+def api_response(request, data):
+    """
+    JSON response for the chart APIs: Series as points, or as delta-encoded
+    columns with ?format=columnar, compressed when the client accepts it.
+    Only for regular responses; the SSE stream must not be compressed.
+    """
+    with phase("serialize"):
+        body = dumps(data, columnar=request.GET.get("format") == "columnar")
+    response = HttpResponse(body, content_type="application/json")
+    with phase("compress"):
+        return compress(request, response)
@@ -0,0 +1,28 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+# Bounded pool for the sync work the async views cannot avoid: bucket
+# merging, raw SQL and transactional writes. Bursts of chart loads queue here
+# instead of growing the thread count or the number of database connections.
+executor = ThreadPoolExecutor(
+    max_workers=settings.EVENT_SYNC_WORKERS, thread_name_prefix="events-sync"
+)
+
+
+def _call_and_release(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # Pool threads outlive requests, so release their connection the way
+        # request_finished would for a sync view
+        close_old_connections()
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run sync `func` on the bounded executor without blocking the event loop"""
+    return await sync_to_async(_call_and_release, thread_sensitive=False, executor=executor)(
+        func, args, kwargs
+    )
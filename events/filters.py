@@ -0,0 +1,153 @@
+from datetime import timedelta
+
+from django.db.models.fields.json import KT
+from django.db.models.lookups import Exact
+from django.http import QueryDict
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Event
+
+# ?status= classes as [low, high) status code ranges
+STATUS_CLASSES = {
+    "2xx": (200, 300),
+    "3xx": (300, 400),
+    "4xx": (400, 500),
+    "5xx": (500, 600),
+    "errors": (400, 600),
+}
+
+# Query parameters understood by parse_filters, in the order links carry them
+FILTER_PARAMS = ["status", "method", "source", "min_duration", "minutes", "start", "end", "error_type"]
+
+# Upper bound on ?minutes=, a week
+MAX_MINUTES = 7 * 24 * 60
+
+# Offered by the table's filter form; the minutes match the chart timeframes
+MINUTE_CHOICES = ["5", "15", "60", "360"]
+ERROR_TYPES = ["client_error", "server_error"]  # as set by generator.error_metadata
+
+
+def _status(value):
+    value = value.lower()
+    if value in STATUS_CLASSES:
+        return value
+    code = int(value)
+    if not 100 <= code <= 599:
+        raise ValueError(value)
+    return str(code)
+
+
+def _aware(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_current_timezone())
+    return parsed
+
+
+def _datetime(value):
+    _aware(value)
+    return value
+
+
+CLEANERS = {
+    "status": _status,
+    "method": lambda value: value.upper(),
+    "source": lambda value: value,
+    "min_duration": lambda value: str(max(int(value), 0)),
+    "minutes": lambda value: str(min(max(int(value), 1), MAX_MINUTES)),
+    "start": _datetime,
+    "end": _datetime,
+    "error_type": lambda value: value,
+}
+
+
+def parse_filters(params):
+    """
+    The table filters present in `params` as a {name: cleaned string} dict.
+    Empty and malformed values are dropped, the way a bad ?page= falls back
+    to the first page, so a filtered link never turns into an error page.
+    """
+    filters = {}
+    for name in FILTER_PARAMS:
+        value = params.get(name, "").strip()
+        if not value:
+            continue
+        try:
+            filters[name] = CLEANERS[name](value)
+        except (ValueError, OverflowError):
+            continue
+    return filters
+
+
+def filter_events(queryset, filters, now=None):
+    """
+    `queryset` narrowed by parsed filters. Each filter is an equality or a
+    range the Event indexes lead with, so with the newest-first keyset order
+    the planner can walk one index and stop after a page:
+
+    - method, source: (method|source, timestamp, id)
+    - 4xx, 5xx, errors and exact error codes: the partial error index on
+      (status_code, timestamp, id)
+    - error_type: the partial expression index on metadata->>'error_type'
+    - time range only: (timestamp, id)
+    """
+    status = filters.get("status")
+    if status in STATUS_CLASSES:
+        low, high = STATUS_CLASSES[status]
+        queryset = queryset.filter(status_code__gte=low, status_code__lt=high)
+    elif status:
+        low = int(status)
+        queryset = queryset.filter(status_code=low)
+    if status and low >= 400:
+        # Repeat the partial index's predicate verbatim: SQLite only uses a
+        # partial index when its WHERE terms appear in the query as written
+        queryset = queryset.filter(status_code__gte=400)
+    if "method" in filters:
+        queryset = queryset.filter(method=filters["method"])
+    if "source" in filters:
+        queryset = queryset.filter(source=filters["source"])
+    if "min_duration" in filters:
+        queryset = queryset.filter(duration_ms__gte=int(filters["min_duration"]))
+    if "minutes" in filters:
+        since = (now or timezone.now()) - timedelta(minutes=int(filters["minutes"]))
+        queryset = queryset.filter(timestamp__gte=since)
+    if "start" in filters:
+        queryset = queryset.filter(timestamp__gte=_aware(filters["start"]))
+    if "end" in filters:
+        queryset = queryset.filter(timestamp__lt=_aware(filters["end"]))
+    if "error_type" in filters:
+        # A plain = on the same ->> expression as the index; the lookups
+        # Django attaches to JSON keys compare JSON values and miss it
+        queryset = queryset.filter(Exact(KT("metadata__error_type"), filters["error_type"]))
+    return queryset
+
+
+def filter_querystring(filters):
+    """`filters` as a query string to carry along in pagination links"""
+    query = QueryDict(mutable=True)
+    query.update(filters)
+    return query.urlencode()
+
+
+def matches_live(filters):
+    """
+    Whether events arriving on the live stream can belong on the first page.
+    An explicit ?end= in the past means the view is a fixed window.
+    """
+    return "end" not in filters or _aware(filters["end"]) > timezone.now()
+
+
+def filter_context(filters):
+    """Template context for the table's filter form and pagination links"""
+    return {
+        "filters": filters,
+        "filter_query": filter_querystring(filters),
+        "live_rows": matches_live(filters),
+        "status_classes": STATUS_CLASSES,
+        "method_choices": Event.HTTP_METHODS,
+        "minute_choices": MINUTE_CHOICES,
+        "error_types": ERROR_TYPES,
+    }
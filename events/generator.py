@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .models import Event
+
+ENDPOINTS = [
+    "/api/users",
+    "/api/products",
+    "/api/orders",
+]
+
+API_PATTERNS = [
+    {"method": "GET", "duration_range": (50, 200), "weight": 60},
+    {"method": "POST", "duration_range": (100, 400), "weight": 25},
+    {"method": "PUT", "duration_range": (80, 300), "weight": 10},
+    {"method": "DELETE", "duration_range": (50, 150), "weight": 5},
+]
+
+STATUS_PATTERNS = [
+    {"code": 200, "weight": 85, "message": "Success"},
+    {"code": 201, "weight": 5, "message": "Created"},
+    {"code": 400, "weight": 4, "message": "Bad request format"},
+    {"code": 404, "weight": 4, "message": "Resource not found"},
+    {"code": 500, "weight": 2, "message": "Internal server error"},
+]
+
+ERROR_DETAILS = {
+    400: "Invalid parameters provided for {source}",
+    404: "The requested resource at {source} does not exist",
+    500: "Server encountered an error processing request to {source}",
+}
+
+
+def error_metadata(status, method, source):
+    if status["code"] < 400:
+        return {}
+    details = ERROR_DETAILS.get(status["code"])
+    return {
+        "error_type": "server_error" if status["code"] >= 500 else "client_error",
+        "error_message": f"{status['message']} for {method} request to {source}",
+        "error_details": details.format(source=source) if details else None,
+    }
+
+
+class EventGenerator:
+    """
+    Synthetic API traffic following API_PATTERNS and STATUS_PATTERNS.
+
+    Cumulative weights and error metadata are computed once, and each batch
+    draws all of its random numbers in a few vectorized calls, so generating
+    thousands of events per second is cheap.
+    """
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self._pattern_weights = np.cumsum([p["weight"] for p in API_PATTERNS])
+        self._status_weights = np.cumsum([s["weight"] for s in STATUS_PATTERNS])
+        self._duration_low = np.array([p["duration_range"][0] for p in API_PATTERNS])
+        self._duration_span = np.array(
+            [p["duration_range"][1] - p["duration_range"][0] + 1 for p in API_PATTERNS]
+        )
+        self._metadata = {
+            (s, p, e): error_metadata(status, pattern["method"], source)
+            for s, status in enumerate(STATUS_PATTERNS)
+            for p, pattern in enumerate(API_PATTERNS)
+            for e, source in enumerate(ENDPOINTS)
+        }
+
+    def _pick(self, cumulative_weights, count):
+        draws = self.rng.random(count) * cumulative_weights[-1]
+        return np.searchsorted(cumulative_weights, draws, side="right")
+
+    def build(self, count, timestamps=None):
+        """`count` unsaved events, stamped now unless `timestamps` are given"""
+        patterns = self._pick(self._pattern_weights, count)
+        statuses = self._pick(self._status_weights, count)
+        endpoints = self.rng.integers(len(ENDPOINTS), size=count)
+        durations = self._duration_low[patterns] + (
+            self.rng.random(count) * self._duration_span[patterns]
+        ).astype(np.int64)
+        if timestamps is None:
+            timestamps = [timezone.now()] * count
+
+        return [
+            Event(
+                method=API_PATTERNS[p]["method"],
+                source=ENDPOINTS[e],
+                timestamp=timestamp,
+                duration_ms=duration,
+                status_code=STATUS_PATTERNS[s]["code"],
+                metadata=dict(self._metadata[s, p, e]),
+            )
+            for p, s, e, duration, timestamp in zip(
+                patterns.tolist(), statuses.tolist(), endpoints.tolist(), durations.tolist(), timestamps
+            )
+        ]
+
+    def spread(self, count, start_time, end_time):
+        """`count` events with sorted random timestamps in [start_time, end_time)"""
+        span = (end_time - start_time).total_seconds()
+        offsets = np.sort(self.rng.random(count)) * span
+        return self.build(count, [start_time + timedelta(seconds=s) for s in offsets.tolist()])
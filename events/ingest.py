@@ -0,0 +1,271 @@
+import asyncio
+import csv
+import io
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from . import rollups
+from .cache import bucket_cache
+from .encoding import dumps
+from .executor import run_sync
+from .instrumentation import phase
+from .models import Event
+from .ndjson import InvalidBody, InvalidEvent, parse_event
+from .ringbuffer import recent_events
+
+logger = logging.getLogger(__name__)
+
+
+# Columns loaded by COPY; id comes from the table's sequence
+COPY_COLUMNS = ["method", "source", "timestamp", "duration_ms", "status_code", "request_id", "metadata"]
+
+# Rejected lines reported back per ingest request; the counts cover the rest
+MAX_REPORTED_ERRORS = 100
+
+
+def write_events(events):
+    """Persist a batch of fully built events and fold them into the rollups"""
+    if not events:
+        return []
+    with transaction.atomic():
+        created = Event.objects.bulk_create(events, batch_size=settings.INGEST_BATCH_SIZE)
+        rollups.apply_events(created)
+    _written(created)
+    return created
+
+
+def _written(created):
+    """Bring the in-memory views of the events up to date after a commit"""
+    if not created:
+        return
+    recent_events.extend(created)
+
+    # Late events land in buckets the cache may already treat as closed
+    oldest = min(event.timestamp for event in created)
+    if oldest < timezone.now() - timedelta(seconds=bucket_cache.settle_seconds):
+        bucket_cache.invalidate(oldest, max(event.timestamp for event in created))
+
+
+def load_events(events):
+    """
+    Persist a batch of IngestedEvents received from outside and fold them
+    into the rollups. Events whose request_id is already stored, e.g. from a
+    client retrying a request, are skipped whatever their timestamp, and so
+    are repeats of a request_id within the batch. Only events still within
+    EVENT_RETENTION_DAYS are checked. Returns the events stored.
+    """
+    if not events:
+        return []
+    known_since = timezone.now() - timedelta(days=settings.EVENT_RETENTION_DAYS)
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            created = _copy_events(events, known_since)
+        else:
+            created = _insert_new_events(events, known_since)
+        rollups.apply_events(created)
+    _written(created)
+    return created
+
+
+def _copy_events(events, known_since):
+    """
+    COPY the batch into a temporary staging table, then move it over with
+    one INSERT ... SELECT that leaves out request_ids stored since
+    `known_since` and repeats within the batch. The table's unique key is
+    (request_id, "timestamp"), so ON CONFLICT alone would keep a retry with
+    a new timestamp, e.g. one defaulted to now; it still covers concurrent
+    inserts. Staged rows take their ids from the events sequence in COPY
+    order, so the duplicates are the staged ids missing from events_event
+    afterwards.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for event in events:
+        writer.writerow([
+            event.method,
+            event.source,
+            event.timestamp.isoformat(),
+            event.duration_ms,
+            event.status_code,
+            event.request_id,
+            dumps(event.metadata).decode(),
+        ])
+    buffer.seek(0)
+
+    columns = ", ".join(connection.ops.quote_name(name) for name in COPY_COLUMNS)
+    staged = ", ".join(f"s.{connection.ops.quote_name(name)}" for name in COPY_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMPORARY TABLE IF NOT EXISTS events_event_staging "
+            "(LIKE events_event INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        cursor.copy_expert(
+            f"COPY events_event_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+        cursor.execute(
+            f"INSERT INTO events_event (id, {columns}) "
+            f"SELECT DISTINCT ON (s.request_id) s.id, {staged} FROM events_event_staging s "
+            "WHERE NOT EXISTS (SELECT 1 FROM events_event e "
+            'WHERE e.request_id = s.request_id AND e."timestamp" >= %s) '
+            "ORDER BY s.request_id, s.id ON CONFLICT DO NOTHING",
+            [known_since],
+        )
+        if cursor.rowcount == len(events):
+            return events
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM events_event e "
+            'WHERE e.id = s.id AND e."timestamp" = s."timestamp") '
+            "FROM events_event_staging s ORDER BY s.id"
+        )
+        stored = [row[0] for row in cursor.fetchall()]
+    return [event for event, kept in zip(events, stored) if kept]
+
+
+def _insert_new_events(events, known_since):
+    """bulk_create fallback for other databases, leaving out known request_ids"""
+    seen = {
+        str(request_id) for request_id in
+        Event.objects.filter(
+            request_id__in=[event.request_id for event in events], timestamp__gte=known_since
+        )
+        .values_list("request_id", flat=True)
+    }
+    created = []
+    for event in events:
+        if event.request_id not in seen:
+            seen.add(event.request_id)
+            created.append(event)
+    Event.objects.bulk_create(
+        [event.to_model() for event in created], batch_size=settings.INGEST_BATCH_SIZE
+    )
+    return created
+
+
+def ingest_lines(lines, batch_size, on_batch=None):
+    """
+    Parse (line number, bytes) pairs from ndjson.split_lines into events and
+    store them batch by batch with load_events, so memory stays bounded by
+    one batch whatever the size of the body. `on_batch(created)` is called
+    after each stored batch. Returns the per-batch and total counts, and
+    an "error" if the body turned out to be unreadable part way.
+    """
+    summary = {"accepted": 0, "rejected": 0, "duplicates": 0, "batches": [], "errors": []}
+
+    def reject(number, message):
+        summary["rejected"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": number, "error": message})
+
+    def flush(batch, rejected):
+        result = {"batch": len(summary["batches"]), "accepted": 0, "rejected": rejected, "duplicates": 0}
+        try:
+            with phase("load"):
+                created = load_events(batch)
+        except DatabaseError as e:
+            logger.error(f"Error loading {len(batch)} ingested events: {str(e)}")
+            result["rejected"] += len(batch)
+            result["error"] = str(e).strip()
+            summary["rejected"] += len(batch)
+        else:
+            result["accepted"] = len(created)
+            result["duplicates"] = len(batch) - len(created)
+            summary["accepted"] += len(created)
+            summary["duplicates"] += result["duplicates"]
+            if on_batch:
+                on_batch(created)
+        summary["batches"].append(result)
+
+    batch = []
+    rejected = 0
+    now = timezone.now()
+    try:
+        for number, line in lines:
+            if line is None:
+                reject(number, "Line too long")
+                rejected += 1
+                continue
+            try:
+                with phase("parse"):
+                    batch.append(parse_event(line, now))
+            except InvalidEvent as e:
+                reject(number, str(e))
+                rejected += 1
+            if len(batch) >= batch_size:
+                flush(batch, rejected)
+                batch, rejected, now = [], 0, timezone.now()
+    except InvalidBody as e:
+        # The lines before the damage are still good; store them and report
+        summary["error"] = str(e)
+    if batch or rejected:
+        flush(batch, rejected)
+    return summary
+
+
+async def write_events_async(events):
+    return await run_sync(write_events, events)
+
+
+class IngestBuffer:
+    """
+    In-memory write buffer for events.
+
+    Events are collected as complete `Event` instances and flushed with one
+    `bulk_create` as soon as `batch_size` events are pending, or at the latest
+    `max_latency` seconds after the first pending event arrived.
+    """
+
+    def __init__(self, batch_size=None, max_latency=None, on_write=None):
+        self.batch_size = batch_size or settings.INGEST_BATCH_SIZE
+        self.max_latency = max_latency or settings.INGEST_MAX_LATENCY_MS / 1000
+        self.on_write = on_write  # called with (event count, seconds) per batch
+        self._pending = []
+        self._timer = None
+        self._lock = asyncio.Lock()
+        self._flushes = set()
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    def add(self, event):
+        """Queue an event for writing; never waits on the database"""
+        self._pending.append(event)
+        if len(self._pending) >= self.batch_size:
+            self._schedule_flush()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.max_latency, self._schedule_flush)
+
+    def _schedule_flush(self):
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self):
+        """Write every pending event; flushes are serialized to keep insert order"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        async with self._lock:
+            started = time.perf_counter()
+            try:
+                await write_events_async(batch)
+            except Exception as e:
+                logger.error(f"Error flushing {len(batch)} events: {str(e)}")
+                return
+            if self.on_write:
+                self.on_write(len(batch), time.perf_counter() - started)
+
+    async def drain(self):
+        """Flush everything pending and wait for in-flight flushes to finish"""
+        await self.flush()
+        if self._flushes:
+            await asyncio.gather(*list(self._flushes))
@@ -0,0 +1,312 @@
+import atexit
+import contextlib
+import functools
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+logger = logging.getLogger(__name__)
+
+# Request duration histogram buckets, in seconds
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# Per-request measurements; context-local, so it follows a request into
+# sync_to_async threads and stays separate between concurrent requests
+_current = ContextVar("events_request_stats", default=None)
+
+
+class RequestStats:
+    """What one request spent, filled in by the DB wrapper and phase timers"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.phases = {}
+        self.statements = None  # executed SQL, only collected by capture_queries()
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+# Cursor methods reading result rows, timed as DB time along with execute()
+FETCH_METHODS = ("fetchone", "fetchmany", "fetchall")
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper counting queries and their time for the current request"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+        _time_fetches(context["cursor"], stats)
+        if stats.statements is not None:
+            stats.statements.append(
+                context["connection"].ops.last_executed_query(context["cursor"], sql, params)
+            )
+
+
+def _time_fetches(cursor, stats):
+    """
+    Count the time spent reading rows from `cursor` into `stats` as well.
+    Chunked reads (.iterator(), aiterator(), async for) fetch most rows
+    after execute() returns, often from another thread, and on SQLite the
+    query mostly runs during those fetches.
+    """
+    for name in FETCH_METHODS:
+        # Django's CursorWrapper resolves these through __getattr__, so an
+        # instance attribute takes precedence; drop one left by an earlier query
+        vars(cursor).pop(name, None)
+        fetch = getattr(cursor, name)
+
+        def timed_fetch(*args, fetch=fetch):
+            started = time.perf_counter()
+            try:
+                return fetch(*args)
+            finally:
+                stats.db_time += time.perf_counter() - started
+
+        setattr(cursor, name, timed_fetch)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver putting record_query on every new connection"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextlib.contextmanager
+def capture_queries():
+    """
+    Collect every query run in this context, including from executor threads,
+    which CaptureQueriesContext cannot see. Yields the RequestStats.
+    """
+    stats = RequestStats()
+    stats.statements = []
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time a block as a named phase of the current request, if there is one"""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_phase(name, time.perf_counter() - started)
+
+
+def timed(name):
+    """Decorator timing every call as phase `name` of the current request"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class Metrics:
+    """Thread-safe per-endpoint counters rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # (endpoint, status) -> count
+        self.durations = {}  # endpoint -> [bucket counts..., sum, count]
+        self.queries = {}
+        self.db_time = {}
+        self.phases = {}  # (endpoint, phase) -> seconds
+        self.response_bytes = {}
+
+    def observe(self, endpoint, status, seconds, stats, response_bytes):
+        with self._lock:
+            key = (endpoint, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.durations.setdefault(endpoint, [0] * len(DURATION_BUCKETS) + [0.0, 0])
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram[index] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+            self.queries[endpoint] = self.queries.get(endpoint, 0) + stats.queries
+            self.db_time[endpoint] = self.db_time.get(endpoint, 0.0) + stats.db_time
+            for name, value in stats.phases.items():
+                self.phases[endpoint, name] = self.phases.get((endpoint, name), 0.0) + value
+            if response_bytes is not None:
+                self.response_bytes[endpoint] = self.response_bytes.get(endpoint, 0) + response_bytes
+
+    def render(self, gauges=None):
+        """Prometheus exposition text, followed by `gauges` as {name: (help, value)}"""
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            """`samples` are (suffix, labels, value); suffix is "" except for histograms"""
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                sample = f"{name}{suffix}{{{label_text}}}" if label_text else f"{name}{suffix}"
+                lines.append(f"{sample} {value}")
+
+        with self._lock:
+            family(
+                "logwatcher_requests_total", "counter", "Requests handled by endpoint and status",
+                [("", {"endpoint": e, "status": s}, n) for (e, s), n in sorted(self.requests.items())],
+            )
+            samples = []
+            for endpoint, histogram in sorted(self.durations.items()):
+                for bound, count in zip(DURATION_BUCKETS, histogram):
+                    samples.append(("_bucket", {"endpoint": endpoint, "le": bound}, count))
+                samples.append(("_bucket", {"endpoint": endpoint, "le": "+Inf"}, histogram[-1]))
+                samples.append(("_sum", {"endpoint": endpoint}, round(histogram[-2], 6)))
+                samples.append(("_count", {"endpoint": endpoint}, histogram[-1]))
+            family("logwatcher_request_duration_seconds", "histogram", "Wall time per request", samples)
+            family(
+                "logwatcher_db_queries_total", "counter", "Database queries issued by endpoint",
+                [("", {"endpoint": e}, n) for e, n in sorted(self.queries.items())],
+            )
+            family(
+                "logwatcher_db_seconds_total", "counter", "Time spent in database queries by endpoint",
+                [("", {"endpoint": e}, round(s, 6)) for e, s in sorted(self.db_time.items())],
+            )
+            family(
+                "logwatcher_phase_seconds_total", "counter",
+                "Time spent in instrumented phases (e.g. serialize) by endpoint",
+                [("", {"endpoint": e, "phase": p}, round(s, 6)) for (e, p), s in sorted(self.phases.items())],
+            )
+            family(
+                "logwatcher_response_bytes_total", "counter", "Response body bytes by endpoint",
+                [("", {"endpoint": e}, n) for e, n in sorted(self.response_bytes.items())],
+            )
+
+        for name, (help_text, value) in sorted((gauges or {}).items()):
+            family(name, "gauge", help_text, [("", {}, value)])
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def server_timing(total, stats):
+    entries = [f"app;dur={total * 1000:.2f}"]
+    entries.append(f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries"')
+    entries.extend(f"{name};dur={seconds * 1000:.2f}" for name, seconds in stats.phases.items())
+    return ", ".join(entries)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records wall time, query count, DB time, phase times and response size
+    per endpoint (URL name), and reports them in a Server-Timing header.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    def finish(self, request, response, stats, elapsed):
+        match = getattr(request, "resolver_match", None)
+        endpoint = match.url_name if match and match.url_name else "unmatched"
+        # Streaming responses (the SSE stream) have no size up front
+        size = None if response.streaming else len(response.content)
+        metrics.observe(endpoint, response.status_code, elapsed, stats, size)
+        response["Server-Timing"] = server_timing(elapsed, stats)
+        logger.debug(
+            "request",
+            extra={
+                "endpoint": endpoint,
+                "status": response.status_code,
+                "duration_ms": round(elapsed * 1000, 2),
+                "queries": stats.queries,
+                "db_ms": round(stats.db_time * 1000, 2),
+                "bytes": size,
+            },
+        )
+        return response
+
+
+# Attributes every LogRecord has; anything else was passed via `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the message and any `extra` fields"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level):
+    """
+    Route the events loggers through a queue so request threads and the event
+    loop only enqueue records; a listener thread formats and writes them.
+    """
+    log_queue = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    events_logger = logging.getLogger("events")
+    events_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    events_logger.setLevel(level)
+    events_logger.propagate = False
+    return listener
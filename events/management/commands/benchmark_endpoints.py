@@ -0,0 +1,382 @@
+import asyncio
+import json
+import platform
+import statistics
+import time
+from datetime import timedelta
+
+import django
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from events import partitions, views
+from events.cache import bucket_cache
+from events.generator import EventGenerator
+from events.instrumentation import capture_queries
+from events.ingest import write_events
+from events.models import Event
+from events.pagination import KeysetPaginator
+from events.ringbuffer import recent_events
+
+# Chart timeframe presets in minutes, as in dashboard/charts/controls.html
+RANGE_PRESETS = [5, 15, 60, 360]
+
+# URL names of the chart endpoints that take ?interval=&range=
+CHART_ENDPOINTS = [
+    "historical_latency",
+    "historical_latency_percentiles",
+    "historical_error_data",
+    "historical_throughput_data",
+    "historical_method_data",
+    "method_distribution",
+    "dashboard_snapshot",
+]
+
+# Filtered event table lookups, each expected to be served by an index
+TABLE_FILTERS = {
+    "table_rows_5xx_source_10m": {"status": "5xx", "source": "/api/orders", "minutes": 10},
+    "table_rows_status_404": {"status": "404"},
+    "table_rows_delete_slow": {"method": "DELETE", "min_duration": 140},
+    "table_rows_server_errors": {"error_type": "server_error"},
+}
+
+# Warm database time a filtered table lookup should stay under
+TABLE_FILTER_BUDGET_MS = 10
+
+# Below this many events a sequential scan can be the planner's best choice,
+# and the timings say little about large tables
+PLAN_CHECK_MIN_SIZE = 100000
+
+
+def interval_for_range(range_minutes):
+    # Mirrors getIntervalForTimeframe in the chart templates: ~60 points, at least 5s
+    return max(range_minutes * 60 // 60, 5)
+
+
+def explain(statements):
+    """
+    (rows scanned, plan summaries, sequential scans) for the captured
+    SELECTs. Rows scanned comes from EXPLAIN ANALYZE and is only available
+    on PostgreSQL. Sequential scans are those of the events table that read
+    any rows, so empty partitions, which are always scanned, do not count.
+    """
+    rows_scanned = 0 if connection.vendor == "postgresql" else None
+    plans = []
+    sequential = []
+    with connection.cursor() as cursor:
+        for sql in statements:
+            if not sql.lstrip().upper().startswith("SELECT"):
+                continue
+            if connection.vendor == "postgresql":
+                cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql)
+                plan = cursor.fetchone()[0]
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                nodes = [plan[0]["Plan"]]
+                while nodes:
+                    node = nodes.pop()
+                    nodes.extend(node.get("Plans", []))
+                    if "Scan" in node["Node Type"]:
+                        rows_scanned += node["Actual Rows"] * node["Actual Loops"]
+                        target = node.get("Index Name") or node.get("Relation Name", "")
+                        plans.append(f"{node['Node Type']} on {target}".strip())
+                        read = node["Actual Rows"] + node.get("Rows Removed by Filter", 0)
+                        if node["Node Type"] == "Seq Scan" and target.startswith("events_event"):
+                            if read:
+                                sequential.append(plans[-1])
+            elif connection.vendor == "sqlite":
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                for row in cursor.fetchall():
+                    plans.append(row[-1])
+                    if row[-1].startswith("SCAN events_event") and " USING " not in row[-1]:
+                        sequential.append(row[-1])
+    return rows_scanned, plans, sequential
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database at several sizes, time every chart endpoint, "
+        "the event table and the SSE stream, and write the numbers to a JSON baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="10000,1000000,10000000",
+            help="Comma-separated event counts to benchmark, seeded incrementally",
+        )
+        parser.add_argument(
+            "--hours",
+            type=float,
+            default=6,
+            help="Hours of history the seeded events are spread over",
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="Warm runs per case")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for the data")
+        parser.add_argument(
+            "--seed-batch-size", type=int, default=5000, help="Events per seeding write"
+        )
+        parser.add_argument(
+            "--warm-ring",
+            action="store_true",
+            help="Load the newest events into the ring buffer, as on a long-running server",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the test database between runs so seeded data is reused",
+        )
+        parser.add_argument(
+            "--format",
+            choices=["points", "columnar"],
+            default="points",
+            help="Response format requested from the chart endpoints",
+        )
+        parser.add_argument(
+            "--accept-encoding",
+            default="",
+            help="Accept-Encoding sent with every request, e.g. gzip or br",
+        )
+        parser.add_argument("--output", default="benchmark.json", help="Baseline file to write")
+        parser.add_argument("--compare", help="Earlier baseline to compare warm timings against")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=1.25,
+            help="Slowdown ratio reported as a regression with --compare",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(size) for size in options["sizes"].split(","))
+        except ValueError:
+            raise CommandError("--sizes must be a comma-separated list of integers")
+
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options["keepdb"]
+        )
+        self.plan_failures = 0
+        try:
+            results = []
+            for size in sizes:
+                self.seed(size, options)
+                self.load_ring(options)
+                results.extend(self.run_cases(size, options))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+
+        baseline = {
+            "created": timezone.now().isoformat(),
+            "vendor": connection.vendor,
+            "django": django.get_version(),
+            "python": platform.python_version(),
+            "hours": options["hours"],
+            "warm_ring": options["warm_ring"],
+            "format": options["format"],
+            "accept_encoding": options["accept_encoding"],
+            "results": results,
+        }
+        with open(options["output"], "w") as f:
+            json.dump(baseline, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
+
+        if options["compare"]:
+            self.compare(baseline, options["compare"], options["threshold"])
+        if self.plan_failures:
+            raise CommandError(f"{self.plan_failures} filtered table lookup(s) failed the planner check")
+
+    def seed(self, size, options):
+        existing = Event.objects.count()
+        missing = size - existing
+        if missing <= 0:
+            return
+        end_time = timezone.now()
+        start_time = end_time - timedelta(hours=options["hours"])
+        if partitions.is_partitioned():
+            partitions.ensure_partitions(
+                days_ahead=(end_time - start_time).days + 1, today=start_time.date()
+            )
+
+        self.stdout.write(f"Seeding {missing} events to reach {size}...")
+        generator = EventGenerator(seed=options["seed"] + existing)
+        started = time.perf_counter()
+        for offset in range(0, missing, options["seed_batch_size"]):
+            count = min(options["seed_batch_size"], missing - offset)
+            write_events(generator.spread(count, start_time, end_time))
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+        self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    def load_ring(self, options):
+        """Empty the ring buffer, or fill it with the newest events for --warm-ring"""
+        recent_events.clear()
+        if options["warm_ring"]:
+            newest = Event.objects.order_by("-timestamp", "-id")[: recent_events.capacity]
+            recent_events.extend(list(newest))
+
+    def measure(self, size, name, path, params, options, range_minutes=None):
+        view = resolve(path).func
+        if iscoroutinefunction(view):
+            view = async_to_sync(view)
+        request = RequestFactory().get(
+            path, params, headers={"accept-encoding": options["accept_encoding"]}
+        )
+        bucket_cache.clear()
+
+        with capture_queries() as captured:
+            started = time.perf_counter()
+            response = view(request)
+            cold = time.perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f"{path} returned {response.status_code}")
+
+        warm = []
+        with capture_queries() as warm_captured:
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                view(request)
+                warm.append(time.perf_counter() - started)
+
+        rows_scanned, plans, sequential = explain(captured.statements)
+        result = {
+            "size": size,
+            "endpoint": name,
+            "range": range_minutes,
+            "params": params,
+            "cold_ms": round(cold * 1000, 2),
+            "warm_ms": round(statistics.median(warm) * 1000, 2) if warm else None,
+            "queries": captured.queries,
+            "db_ms": round(warm_captured.db_time / len(warm) * 1000, 2) if warm else None,
+            "rows_scanned": rows_scanned,
+            "plans": plans,
+            "sequential_scans": sequential,
+            "bytes": len(response.content),
+            "serialize_ms": round(
+                sum(captured.phases.get(name, 0) for name in ("serialize", "compress")) * 1000, 3
+            ),
+        }
+        self.stdout.write(
+            f"{size:>10} {name:<32} {str(range_minutes or ''):>4} "
+            f"cold {result['cold_ms']:>9.2f}ms  warm {result['warm_ms'] or 0:>9.2f}ms  "
+            f"{result['queries']} queries ({result['db_ms'] or 0:.2f}ms)  "
+            f"{rows_scanned if rows_scanned is not None else '-'} rows  "
+            f"{result['bytes']} bytes"
+        )
+        return result
+
+    def run_cases(self, size, options):
+        results = []
+        for name in CHART_ENDPOINTS:
+            for range_minutes in RANGE_PRESETS:
+                params = {"range": range_minutes, "interval": interval_for_range(range_minutes)}
+                if options["format"] == "columnar":
+                    params["format"] = "columnar"
+                results.append(
+                    self.measure(size, name, reverse(name), params, options, range_minutes)
+                )
+
+        # Table: newest page, the page after it, and the oldest page
+        table = reverse("table_rows")
+        first = async_to_sync(KeysetPaginator(Event.objects.all(), 15).first)()
+        results.append(self.measure(size, "table_rows", table, {}, options))
+        results.append(self.measure(
+            size, "table_rows_next", table, {"after": first.end_cursor, "page": 2}, options
+        ))
+        results.append(self.measure(size, "table_rows_last", table, {"last": 1}, options))
+        for name, params in TABLE_FILTERS.items():
+            result = self.measure(size, name, table, params, options)
+            self.check_plan(result)
+            results.append(result)
+
+        results.append(self.measure_stream(size, options))
+        return results
+
+    def check_plan(self, result):
+        """
+        Flag a filtered table lookup that scans the events table sequentially
+        or spends longer than the budget in the database (rendering the rows
+        is not counted), on tables big enough for either to matter.
+        """
+        if result["size"] < PLAN_CHECK_MIN_SIZE:
+            return
+        problems = [f"sequential scan: {plan}" for plan in result["sequential_scans"]]
+        if result["db_ms"] is not None and result["db_ms"] > TABLE_FILTER_BUDGET_MS:
+            problems.append(
+                f"{result['db_ms']}ms in the database, over the {TABLE_FILTER_BUDGET_MS}ms budget"
+            )
+        result["plan_problems"] = problems
+        if problems:
+            self.plan_failures += 1
+        for problem in problems:
+            self.stdout.write(self.style.ERROR(f"{'':>10} {result['endpoint']:<32} {problem}"))
+
+    def measure_stream(self, size, options):
+        """Time from opening the SSE stream to its first frame"""
+        bucket_cache.clear()
+        request = RequestFactory().get(reverse("event_stream"))
+
+        async def first_frame():
+            await views.coordinator.start()
+            try:
+                started = time.perf_counter()
+                response = await views.event_stream(request)
+                stream = aiter(response.streaming_content)
+                await anext(stream)
+                elapsed = time.perf_counter() - started
+                await stream.aclose()
+                return elapsed
+            finally:
+                await views.coordinator.stop()
+                await views.ingest_buffer.drain()
+                # The listener and producer lock belong to this loop, closed by asyncio.run
+                await views.coordinator.close()
+
+        timings = [asyncio.run(first_frame()) for _ in range(options["repeat"] + 1)]
+        result = {
+            "size": size,
+            "endpoint": "event_stream",
+            "range": None,
+            "params": {},
+            "cold_ms": round(timings[0] * 1000, 2),
+            "warm_ms": round(statistics.median(timings[1:]) * 1000, 2) if timings[1:] else None,
+            "queries": 0,
+            "db_ms": None,
+            "rows_scanned": None,
+            "plans": [],
+            "sequential_scans": [],
+            "bytes": None,
+            "serialize_ms": None,
+        }
+        self.stdout.write(
+            f"{size:>10} {'event_stream':<32} {'':>4} "
+            f"cold {result['cold_ms']:>9.2f}ms  warm {result['warm_ms'] or 0:>9.2f}ms  first frame"
+        )
+        return result
+
+    def compare(self, baseline, path, threshold):
+        with open(path) as f:
+            previous = json.load(f)
+        key = lambda r: (r["size"], r["endpoint"], r["range"])
+        before = {key(r): r for r in previous["results"]}
+
+        regressions = 0
+        for result in baseline["results"]:
+            old = before.get(key(result))
+            if not old or not old["warm_ms"] or not result["warm_ms"]:
+                continue
+            ratio = result["warm_ms"] / old["warm_ms"]
+            line = (
+                f"{result['size']:>10} {result['endpoint']:<32} {str(result['range'] or ''):>4} "
+                f"{old['warm_ms']:>9.2f}ms -> {result['warm_ms']:>9.2f}ms ({ratio:.2f}x), "
+                f"queries {old['queries']} -> {result['queries']}"
+            )
+            if ratio >= threshold or result["queries"] > old["queries"]:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        self.stdout.write(f"{regressions} regression(s) against {path}")
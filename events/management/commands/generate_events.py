@@ -0,0 +1,172 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from events.bus import EventBus
+from events.coordination import UNANNOUNCED_WRITES_WARNING, announce_write, announces_writes
+from events.generator import EventGenerator
+from events.ingest import IngestBuffer, write_events
+from events.stream import encode_event_message
+
+# How often the live mode tops up to the target rate
+TICK_SECONDS = 0.01
+
+
+def describe(values):
+    """p50/p95/max of `values` (seconds) in milliseconds"""
+    if not values:
+        return "n/a"
+    p50, p95 = np.percentile(values, [50, 95]) * 1000
+    return f"p50 {p50:.1f}ms, p95 {p95:.1f}ms, max {max(values) * 1000:.1f}ms"
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic events at a target rate through the real ingest and "
+        "SSE fan-out path, or backfill hours of history, and report throughput"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=1000,
+            help="Events per second (of wall time live, of history when backfilling)",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=10,
+            help="Seconds to run in live mode",
+        )
+        parser.add_argument(
+            "--backfill-hours",
+            type=float,
+            help="Write this many hours of history ending now instead of running live",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.INGEST_BATCH_SIZE,
+            help="Events per database write",
+        )
+        parser.add_argument(
+            "--subscribers",
+            type=int,
+            default=1,
+            help="SSE subscribers attached to the event bus in live mode",
+        )
+        parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+
+    def handle(self, *args, **options):
+        if options["rate"] <= 0 or options["batch_size"] <= 0:
+            raise CommandError("--rate and --batch-size must be positive")
+        generator = EventGenerator(seed=options["seed"])
+        if options["backfill_hours"]:
+            self.backfill(generator, options)
+        else:
+            asyncio.run(self.run_live(generator, options))
+
+    def backfill(self, generator, options):
+        batch_size = options["batch_size"]
+        end_time = timezone.now()
+        start_time = end_time - timedelta(hours=options["backfill_hours"])
+        total = int(options["rate"] * options["backfill_hours"] * 3600)
+        step = (end_time - start_time) / max(total, 1)
+
+        if not announces_writes():
+            self.stderr.write(self.style.WARNING(UNANNOUNCED_WRITES_WARNING))
+
+        write_times = []
+        written_until = start_time
+        started = time.perf_counter()
+        try:
+            for offset in range(0, total, batch_size):
+                count = min(batch_size, total - offset)
+                batch_start = start_time + step * offset
+                events = generator.spread(count, batch_start, batch_start + step * count)
+                write_started = time.perf_counter()
+                write_events(events)
+                write_times.append(time.perf_counter() - write_started)
+                written_until = batch_start + step * count
+        finally:
+            # Running servers drop what they hold in memory for the history
+            # written, which they never saw, even if the backfill was cut short
+            if written_until > start_time:
+                announce_write(start_time, written_until)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Backfilled {total} events over {options['backfill_hours']}h in {elapsed:.1f}s "
+                f"({total / elapsed if elapsed else 0:.0f} events/s)"
+            )
+        )
+        self.stdout.write(f"DB write latency per {batch_size} events: {describe(write_times)}")
+
+    async def run_live(self, generator, options):
+        rate = options["rate"]
+        write_times = []
+        written = [0]
+
+        def on_write(count, seconds):
+            written[0] += count
+            write_times.append(seconds)
+
+        buffer = IngestBuffer(batch_size=options["batch_size"], on_write=on_write)
+
+        # Same fan-out as the SSE view: one producer, a bounded queue per subscriber
+        messages = asyncio.Queue()
+        bus = EventBus(produce=messages.get, is_active=lambda: True, next_delay=lambda: 0)
+        lags = []
+
+        async def consume(subscription):
+            while (message := await subscription.get()) is not None:
+                event_time = message["event"].timestamp.timestamp()
+                lags.append(time.time() - event_time)
+
+        subscriptions = [bus.subscribe() for _ in range(options["subscribers"])]
+        consumers = [asyncio.create_task(consume(s)) for s in subscriptions]
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        emitted = 0
+        while (elapsed := loop.time() - started) < options["duration"]:
+            due = int(rate * elapsed) - emitted
+            if due > 0:
+                for event in generator.build(due):
+                    buffer.add(event)
+                    messages.put_nowait({**encode_event_message(event), "event": event})
+                emitted += due
+            await asyncio.sleep(TICK_SECONDS)
+        generated_in = loop.time() - started
+
+        while not messages.empty():
+            await asyncio.sleep(TICK_SECONDS)
+        await asyncio.sleep(TICK_SECONDS)
+        bus.stop()
+        await asyncio.gather(*consumers)
+        backlog = buffer.pending_count
+        await buffer.drain()
+        total_time = loop.time() - started
+
+        dropped = sum(s.dropped for s in subscriptions)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {emitted} events in {generated_in:.1f}s "
+                f"({emitted / generated_in:.0f} events/s, target {rate:.0f}/s); "
+                f"{written[0]} written in {total_time:.1f}s "
+                f"({written[0] / total_time:.0f} events/s)"
+            )
+        )
+        self.stdout.write(f"Pending writes when generation stopped: {backlog}")
+        self.stdout.write(f"DB write latency per batch: {describe(write_times)}")
+        self.stdout.write(
+            f"SSE delivery lag over {options['subscribers']} subscriber(s): {describe(lags)}, "
+            f"{dropped} dropped"
+        )
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming daily event partitions and drop expired ones "
+        "(row-level retention on databases without partitioning)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running and re-apply the policy every --interval seconds",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=3600,
+            help="Seconds between runs when --loop is given",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            summary = partitions.apply_retention()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Created {len(summary['created_partitions'])} partitions, "
+                    f"dropped {len(summary['dropped_partitions'])} partitions, "
+                    f"deleted {summary['deleted_events']} events, "
+                    f"{summary['deleted_minute_rollups']} minute rollups and "
+                    f"{summary['deleted_second_rollups']} second rollups"
+                )
+            )
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
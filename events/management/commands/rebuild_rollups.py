@@ -0,0 +1,169 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from events import rollups
+from events.buckets import epoch_to_datetime, floor_epoch
+from events.cache import bucket_cache
+from events.coordination import UNANNOUNCED_WRITES_WARNING, announce_write, announces_writes
+from events.models import Event
+
+# Seconds between progress lines
+PROGRESS_SECONDS = 5
+
+
+def aggregate_chunk(start_time, end_time, chunk_size):
+    """Pool task: partial buckets for one chunk, read on the worker's own connection"""
+    return rollups.aggregate_range(start_time, end_time, chunk_size)
+
+
+def parse_time(value, name):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise CommandError(f"--{name} must be an ISO 8601 date and time")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_current_timezone())
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the per-second and per-minute rollup tables from the raw events, "
+        "aggregating time chunks in parallel worker processes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Events fetched per round trip while streaming a time chunk",
+        )
+        parser.add_argument(
+            "--chunk-minutes",
+            type=int,
+            default=60,
+            help="Minutes of events aggregated per task",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes (PostgreSQL only); 1 aggregates in this process",
+        )
+        parser.add_argument("--start", help="Only rebuild buckets from this time (ISO 8601)")
+        parser.add_argument(
+            "--end",
+            help="Only rebuild buckets before this time (ISO 8601); buckets still receiving events are skipped",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] <= 0 or options["chunk_minutes"] <= 0 or options["workers"] <= 0:
+            raise CommandError("--chunk-size, --chunk-minutes and --workers must be positive")
+
+        full = options["start"] is None and options["end"] is None
+        bounds = Event.objects.aggregate(first=Min("timestamp"), last=Max("timestamp"))
+        start_time = parse_time(options["start"], "start") if options["start"] else bounds["first"]
+        end_time = parse_time(options["end"], "end") if options["end"] else bounds["last"]
+
+        # The range and the chunks are whole buckets of the coarsest
+        # resolution, so no bucket is split between two tasks or only
+        # partly rebuilt. Buckets that may still receive events are left to
+        # the live writers: replacing one could drop an event stored while
+        # its chunk was being aggregated.
+        coarsest = rollups.ROLLUP_MODELS[-1].RESOLUTION
+        settled = floor_epoch(timezone.now() - timedelta(seconds=bucket_cache.settle_seconds), coarsest)
+        first = last = settled
+        if start_time and end_time:
+            first = min(floor_epoch(start_time, coarsest), settled)
+            last = floor_epoch(end_time, coarsest) + (coarsest if not options["end"] else 0)
+            last = max(min(last, settled), first)
+        step = options["chunk_minutes"] * 60
+        chunks = [
+            (epoch_to_datetime(epoch), epoch_to_datetime(min(epoch + step, last)))
+            for epoch in range(first, last, step)
+        ]
+
+        total = self.rebuild(chunks, options)
+        if full:
+            # Buckets outside the events' range have nothing left to count
+            self.delete_orphans(epoch_to_datetime(first), epoch_to_datetime(last), epoch_to_datetime(settled))
+
+        if chunks and not announces_writes():
+            self.stderr.write(self.style.WARNING(UNANNOUNCED_WRITES_WARNING))
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups from {total} events"))
+
+    def delete_orphans(self, first, last, settled):
+        """Delete the settled buckets before `first` or from `last` on"""
+        oldest = None
+        with transaction.atomic():
+            for model in rollups.ROLLUP_MODELS:
+                orphans = model.objects.filter(Q(bucket__lt=first) | Q(bucket__gte=last, bucket__lt=settled))
+                found = orphans.aggregate(oldest=Min("bucket"))["oldest"]
+                if found is not None:
+                    oldest = min(oldest or found, found)
+                    orphans.delete()
+            if oldest is not None:
+                announce_write(oldest, settled)
+
+    def rebuild(self, chunks, options):
+        """
+        Aggregate `chunks` and replace each chunk's buckets as its result
+        arrives, one short transaction per chunk
+        """
+        progress = {"chunks": 0, "events": 0, "started": time.perf_counter(), "reported": 0.0}
+
+        def replace(chunk, partials, count):
+            start_time, end_time = chunk
+            with transaction.atomic():
+                rollups.replace_range(start_time, end_time, partials)
+                # Delivered on commit: running workers drop the buckets they
+                # cached from the old rollups
+                announce_write(start_time, end_time)
+            progress["chunks"] += 1
+            progress["events"] += count
+            self.report(progress, len(chunks))
+
+        # On SQLite every commit waits for open readers to finish, so the
+        # workers' streaming reads would hold up the writes here; other
+        # databases aggregate in this process
+        workers = options["workers"] if connection.vendor == "postgresql" else 1
+        if workers == 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                replace(chunk, *rollups.aggregate_range(*chunk, options["chunk_size"]))
+        else:
+            # Spawned rather than forked, so no worker inherits this
+            # process's open database connection
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(chunks)),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            ) as pool:
+                tasks = {
+                    pool.submit(aggregate_chunk, start_time, end_time, options["chunk_size"]): (start_time, end_time)
+                    for start_time, end_time in chunks
+                }
+                for task in as_completed(tasks):
+                    replace(tasks[task], *task.result())
+        self.report(progress, len(chunks), final=True)
+        return progress["events"]
+
+    def report(self, progress, chunk_count, final=False):
+        now = time.perf_counter()
+        if not final and now - progress["reported"] < PROGRESS_SECONDS:
+            return
+        progress["reported"] = now
+        elapsed = now - progress["started"]
+        self.stdout.write(
+            f"{progress['chunks']}/{chunk_count} chunks, {progress['events']} events "
+            f"in {elapsed:.1f}s ({progress['events'] / elapsed if elapsed else 0:.0f} events/s)"
+        )
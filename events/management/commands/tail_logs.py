@@ -0,0 +1,217 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from events.accesslog import LOG_FORMAT, AccessLogParser
+from events.coordination import UNANNOUNCED_WRITES_WARNING, announce_ingested, announces_writes
+from events.generator import API_PATTERNS, ENDPOINTS, STATUS_PATTERNS
+from events.tailing import TailedFile, poll
+
+# Reads per file per round, so a file with a large backlog shares the loop
+READS_PER_ROUND = 4
+
+# Sample log lines written per step of --benchmark, and their request rate
+SAMPLE_BLOCK_LINES = 100_000
+SAMPLE_LINES_PER_SECOND = 2000
+
+
+def write_sample(path, size_mb, seed=None):
+    """
+    Write about `size_mb` MB of LOG_FORMAT lines with the generator's method,
+    status and endpoint mix, ending now. Returns the number of lines.
+    """
+    rng = np.random.default_rng(seed)
+    methods = [p["method"] for p in API_PATTERNS]
+    method_weights = np.array([p["weight"] for p in API_PATTERNS], dtype=np.float64)
+    statuses = [s["code"] for s in STATUS_PATTERNS]
+    status_weights = np.array([s["weight"] for s in STATUS_PATTERNS], dtype=np.float64)
+    agent = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko)"
+
+    target = size_mb * 1_000_000
+    # Rough line length, to spread the timestamps over the right span
+    lines_expected = target // 150
+    moment = timezone.now() - timedelta(seconds=lines_expected / SAMPLE_LINES_PER_SECOND)
+    written = lines = 0
+    with open(path, "w") as f:
+        while written < target:
+            count = SAMPLE_BLOCK_LINES
+            method = rng.choice(len(methods), count, p=method_weights / method_weights.sum()).tolist()
+            status = rng.choice(len(statuses), count, p=status_weights / status_weights.sum()).tolist()
+            endpoint = rng.integers(len(ENDPOINTS), size=count).tolist()
+            item = rng.integers(1, 10000, size=count).tolist()
+            durations = rng.gamma(2.0, 0.06, size=count).tolist()
+            block = []
+            stamp = None
+            for i in range(count):
+                if i % SAMPLE_LINES_PER_SECOND == 0:
+                    stamp = moment.strftime("%d/%b/%Y:%H:%M:%S +0000")
+                    moment += timedelta(seconds=1)
+                block.append(
+                    f'10.0.{i % 256}.{item[i] % 256} - - [{stamp}] '
+                    f'"{methods[method[i]]} {ENDPOINTS[endpoint[i]]}/{item[i]}?v=1 HTTP/1.1" '
+                    f'{statuses[status[i]]} {item[i] * 3} "-" "{agent}" {durations[i]:.3f}\n'
+                )
+            data = "".join(block)
+            f.write(data)
+            written += len(data)
+            lines += count
+    return lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Tail NGINX access logs into events, resuming from stored checkpoints. "
+        f"Lines must use: log_format timed '{LOG_FORMAT}'; "
+        "Running servers are told about the stored events through PostgreSQL "
+        "coordination; with local coordination they only see them after a restart."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help="Access log files to follow")
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Store what the files hold now and exit instead of following them",
+        )
+        parser.add_argument(
+            "--from-end",
+            action="store_true",
+            help="Skip what a file already holds the first time it is tailed",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait for new lines once every file is caught up",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.EVENT_INGEST_BATCH_SIZE,
+            help="Events per database write and checkpoint",
+        )
+        parser.add_argument(
+            "--mmap",
+            action="store_true",
+            help="Scan files through a memory map; only for logs rotated by rename, not copytruncate",
+        )
+        parser.add_argument(
+            "--benchmark",
+            action="store_true",
+            help="Measure read and parse throughput on the given files, or on a generated sample",
+        )
+        parser.add_argument(
+            "--benchmark-mb",
+            type=int,
+            default=2048,
+            help="Size of the generated sample file for --benchmark",
+        )
+        parser.add_argument(
+            "--benchmark-store",
+            action="store_true",
+            help="With --benchmark, also store the sample's events and time the whole path",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] <= 0:
+            raise CommandError("--batch-size must be positive")
+        if options["benchmark"]:
+            self.benchmark(options)
+            return
+        if not options["paths"]:
+            raise CommandError("Give at least one access log path")
+        self.follow(options)
+
+    def open_files(self, paths, options):
+        files = []
+        for path in paths:
+            tailed = TailedFile(path, use_mmap=options["mmap"])
+            try:
+                tailed.open(from_end=options["from_end"])
+            except OSError as e:
+                raise CommandError(f"Cannot open {path}: {e}")
+            self.stdout.write(f"{tailed.path}: starting at byte {tailed.offset}")
+            files.append(tailed)
+        return files
+
+    def follow(self, options):
+        if not announces_writes():
+            self.stderr.write(self.style.WARNING(UNANNOUNCED_WRITES_WARNING))
+        files = self.open_files(options["paths"], options)
+        parser = AccessLogParser()
+        stored = 0
+        started = time.perf_counter()
+        try:
+            while True:
+                offsets = [tailed.offset for tailed in files]
+                for tailed in files:
+                    stored += poll(tailed, parser, options["batch_size"], READS_PER_ROUND, announce_ingested)
+                if offsets != [tailed.offset for tailed in files] or any(t.pending for t in files):
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for tailed in files:
+                tailed.close()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored {stored} events in {elapsed:.1f}s "
+                f"({stored / elapsed if elapsed else 0:.0f} events/s), "
+                f"{parser.unparsed} lines not in the expected format"
+            )
+        )
+
+    def benchmark(self, options):
+        sample_dir = None
+        paths = options["paths"]
+        if not paths:
+            sample_dir = tempfile.mkdtemp(prefix="tail_logs_")
+            paths = [os.path.join(sample_dir, "access.log")]
+            started = time.perf_counter()
+            lines = write_sample(paths[0], options["benchmark_mb"])
+            self.stdout.write(
+                f"Wrote {lines} sample lines ({options['benchmark_mb']} MB) "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+        try:
+            size = sum(os.path.getsize(path) for path in paths)
+            for use_mmap in (False, True):
+                self.benchmark_parse(paths, size, use_mmap)
+            if options["benchmark_store"]:
+                self.follow({**options, "paths": paths, "once": True, "from_end": False})
+        finally:
+            if sample_dir:
+                shutil.rmtree(sample_dir)
+
+    def benchmark_parse(self, paths, size, use_mmap):
+        """Read and parse `paths` without storing anything"""
+        parser = AccessLogParser()
+        events = 0
+        started = time.perf_counter()
+        for path in paths:
+            tailed = TailedFile(path, use_mmap=use_mmap)
+            tailed.open(resume=False)
+            try:
+                while (window := tailed.read()) is not None:
+                    buffer, start, end, base = window
+                    events += sum(1 for _ in parser.parse(buffer, start, end))
+                    tailed.offset = base + end
+            finally:
+                tailed.close()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{'mmap' if use_mmap else 'pread'}: {events} events from {size / 1e6:.0f} MB in "
+            f"{elapsed:.1f}s ({size / 1e6 / elapsed:.1f} MB/s, {events / elapsed:.0f} events/s), "
+            f"{parser.unparsed} unparsed lines"
+        )
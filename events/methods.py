@@ -0,0 +1,58 @@
+from . import rollups
+from .encoding import Series
+from .models import Event
+from .sketch import mean, merge_sketch, quantiles
+
+PERCENTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+
+def known_methods(buckets):
+    """The standard methods in their usual order, then any others seen in `buckets`"""
+    seen = set()
+    for bucket in buckets:
+        seen.update(bucket["method_counts"])
+    return Event.HTTP_METHODS + sorted(seen - set(Event.HTTP_METHODS))
+
+
+def method_totals(buckets):
+    """Requests per method over `buckets`"""
+    totals = {}
+    for bucket in buckets:
+        for method, count in bucket["method_counts"].items():
+            totals[method] = totals.get(method, 0) + count
+    return totals
+
+
+def method_stats(buckets, methods):
+    """
+    Count, average and latency percentiles per method, read from the
+    per-method duration sketches of `buckets` rather than the raw events.
+    The average and percentiles are within sketch.RELATIVE_ACCURACY.
+    """
+    totals = method_totals(buckets)
+    sketches = {method: {} for method in methods}
+    for bucket in buckets:
+        for method, sketch in bucket["method_sketches"].items():
+            merge_sketch(sketches.setdefault(method, {}), sketch)
+
+    stats = {}
+    for method in methods:
+        sketch = sketches[method]
+        stats[method] = {
+            "count": totals.get(method, 0),
+            "avg": mean(sketch),
+            **dict(zip(PERCENTILES, quantiles(sketch, list(PERCENTILES.values())))),
+        }
+    return stats
+
+
+def method_breakdown(start_time, end_time, interval_seconds):
+    """Per-method totals, latency percentiles and per-bucket request counts, all from one bucket fetch"""
+    buckets = rollups.fetch_buckets(start_time, end_time, interval_seconds)
+    methods = known_methods(buckets)
+    series = {method: Series() for method in methods}
+    for bucket in buckets:
+        x = bucket["timestamp"].timestamp() * 1000
+        for method in methods:
+            series[method].append(x, bucket["method_counts"].get(method, 0))
+    return {"methods": methods, "stats": method_stats(buckets, methods), "series": series}
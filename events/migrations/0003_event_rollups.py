@@ -0,0 +1,75 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0002_event_timestamp_default"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventMinuteRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "bucket",
+                    models.DateTimeField(help_text="Start of the bucket", unique=True),
+                ),
+                ("count", models.IntegerField(default=0)),
+                ("duration_sum", models.BigIntegerField(default=0)),
+                ("duration_min", models.IntegerField(null=True)),
+                ("duration_max", models.IntegerField(null=True)),
+                ("status_2xx", models.IntegerField(default=0)),
+                ("status_3xx", models.IntegerField(default=0)),
+                ("status_4xx", models.IntegerField(default=0)),
+                ("status_5xx", models.IntegerField(default=0)),
+                ("method_counts", models.JSONField(default=dict)),
+            ],
+            options={
+                "ordering": ["bucket"],
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="EventSecondRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "bucket",
+                    models.DateTimeField(help_text="Start of the bucket", unique=True),
+                ),
+                ("count", models.IntegerField(default=0)),
+                ("duration_sum", models.BigIntegerField(default=0)),
+                ("duration_min", models.IntegerField(null=True)),
+                ("duration_max", models.IntegerField(null=True)),
+                ("status_2xx", models.IntegerField(default=0)),
+                ("status_3xx", models.IntegerField(default=0)),
+                ("status_4xx", models.IntegerField(default=0)),
+                ("status_5xx", models.IntegerField(default=0)),
+                ("method_counts", models.JSONField(default=dict)),
+            ],
+            options={
+                "ordering": ["bucket"],
+                "abstract": False,
+            },
+        ),
+    ]
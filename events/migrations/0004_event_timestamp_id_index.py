@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0003_event_rollups"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["-timestamp", "-id"], name="events_even_timesta_8efa8d_idx"
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="event",
+            name="events_even_timesta_5c8baa_idx",
+        ),
+    ]
@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+from django.db import migrations
+
+# PostgreSQL only: rebuild events_event as a table range-partitioned by day on
+# "timestamp". Primary and unique keys must include the partition key, so they
+# become (id, timestamp) and (request_id, timestamp). Other databases keep the
+# plain table and rely on row-level retention instead.
+
+
+def partition_events(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE events_event RENAME TO events_event_unpartitioned")
+        cursor.execute(
+            """
+            CREATE TABLE events_event (
+                id bigint NOT NULL,
+                method varchar(10) NOT NULL,
+                source varchar(100) NOT NULL,
+                "timestamp" timestamp with time zone NOT NULL,
+                duration_ms integer NOT NULL,
+                status_code integer NOT NULL,
+                request_id uuid NOT NULL,
+                metadata jsonb NOT NULL
+            ) PARTITION BY RANGE ("timestamp")
+            """
+        )
+        # Already exists if this migration was reversed and is being reapplied
+        cursor.execute("CREATE SEQUENCE IF NOT EXISTS events_event_partitioned_id_seq")
+        cursor.execute("ALTER SEQUENCE events_event_partitioned_id_seq OWNED BY events_event.id")
+        cursor.execute(
+            "SELECT setval('events_event_partitioned_id_seq', COALESCE(MAX(id), 0) + 1, false) "
+            "FROM events_event_unpartitioned"
+        )
+        cursor.execute(
+            "ALTER TABLE events_event ALTER COLUMN id SET DEFAULT nextval('events_event_partitioned_id_seq')"
+        )
+        cursor.execute("CREATE TABLE events_event_default PARTITION OF events_event DEFAULT")
+
+        # One partition per day that already holds data
+        cursor.execute(
+            "SELECT MIN(\"timestamp\" AT TIME ZONE 'UTC')::date, "
+            "MAX(\"timestamp\" AT TIME ZONE 'UTC')::date FROM events_event_unpartitioned"
+        )
+        first_day, last_day = cursor.fetchone()
+        day = first_day
+        while day is not None and day <= last_day:
+            cursor.execute(
+                f"CREATE TABLE events_event_p{day:%Y%m%d} PARTITION OF events_event "
+                "FOR VALUES FROM (%s) TO (%s)",
+                [f"{day.isoformat()} 00:00:00+00", f"{(day + timedelta(days=1)).isoformat()} 00:00:00+00"],
+            )
+            day += timedelta(days=1)
+
+        cursor.execute("INSERT INTO events_event SELECT * FROM events_event_unpartitioned")
+        cursor.execute("DROP TABLE events_event_unpartitioned")
+
+        cursor.execute('ALTER TABLE events_event ADD PRIMARY KEY (id, "timestamp")')
+        cursor.execute(
+            "ALTER TABLE events_event ADD CONSTRAINT events_event_request_id_key "
+            'UNIQUE (request_id, "timestamp")'
+        )
+        cursor.execute(
+            'CREATE INDEX events_even_timesta_8efa8d_idx ON events_event ("timestamp" DESC, id DESC)'
+        )
+        cursor.execute("CREATE INDEX events_even_status__6b20bc_idx ON events_event (status_code)")
+        cursor.execute("CREATE INDEX events_even_method_23204c_idx ON events_event (method)")
+
+
+def unpartition_events(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE events_event RENAME TO events_event_partitioned")
+        cursor.execute(
+            "CREATE TABLE events_event (LIKE events_event_partitioned INCLUDING DEFAULTS)"
+        )
+        cursor.execute("ALTER SEQUENCE events_event_partitioned_id_seq OWNED BY events_event.id")
+        cursor.execute("INSERT INTO events_event SELECT * FROM events_event_partitioned")
+        cursor.execute("DROP TABLE events_event_partitioned CASCADE")
+        cursor.execute("ALTER TABLE events_event ADD PRIMARY KEY (id)")
+        cursor.execute(
+            "ALTER TABLE events_event ADD CONSTRAINT events_event_request_id_key UNIQUE (request_id)"
+        )
+        cursor.execute(
+            'CREATE INDEX events_even_timesta_8efa8d_idx ON events_event ("timestamp" DESC, id DESC)'
+        )
+        cursor.execute("CREATE INDEX events_even_status__6b20bc_idx ON events_event (status_code)")
+        cursor.execute("CREATE INDEX events_even_method_23204c_idx ON events_event (method)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0004_event_timestamp_id_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_events, unpartition_events),
+    ]
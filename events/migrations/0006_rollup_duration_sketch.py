@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0005_partition_events_by_day"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventminuterollup",
+            name="duration_sketch",
+            field=models.JSONField(
+                default=dict,
+                help_text="Mergeable duration quantile sketch, see events.sketch",
+            ),
+        ),
+        migrations.AddField(
+            model_name="eventsecondrollup",
+            name="duration_sketch",
+            field=models.JSONField(
+                default=dict,
+                help_text="Mergeable duration quantile sketch, see events.sketch",
+            ),
+        ),
+    ]
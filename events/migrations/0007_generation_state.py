@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0006_rollup_duration_sketch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GenerationState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("is_generating", models.BooleanField(default=False)),
+                ("started_at", models.DateTimeField(null=True)),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        help_text="When generation stops on its own", null=True
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:43
+
+import django.db.models.fields.json
+import django.db.models.lookups
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0007_generation_state"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="event",
+            name="events_even_status__6b20bc_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="event",
+            name="events_even_method_23204c_idx",
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["method", "-timestamp", "-id"], name="event_method_ts_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["source", "-timestamp", "-id"], name="event_source_ts_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                condition=models.Q(("status_code__gte", 400)),
+                fields=["status_code", "-timestamp", "-id"],
+                name="event_error_status_ts_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                django.db.models.fields.json.KeyTextTransform("error_type", "metadata"),
+                models.OrderBy(models.F("timestamp"), descending=True),
+                models.OrderBy(models.F("id"), descending=True),
+                condition=models.Q(
+                    django.db.models.lookups.IsNull(
+                        django.db.models.fields.json.KeyTextTransform(
+                            "error_type", "metadata"
+                        ),
+                        False,
+                    )
+                ),
+                name="event_error_type_ts_idx",
+            ),
+        ),
+    ]
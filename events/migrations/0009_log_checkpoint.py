@@ -0,0 +1,49 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0008_event_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LogCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("path", models.CharField(max_length=1024, unique=True)),
+                (
+                    "inode",
+                    models.BigIntegerField(
+                        help_text="Inode of the file `offset` refers to", null=True
+                    ),
+                ),
+                (
+                    "offset",
+                    models.BigIntegerField(
+                        default=0, help_text="Bytes read and stored"
+                    ),
+                ),
+                (
+                    "fingerprint",
+                    models.CharField(
+                        blank=True,
+                        help_text="SHA-1 of the file's first bytes, to spot a replaced file",
+                        max_length=40,
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:37
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0009_log_checkpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AlertRule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "metric",
+                    models.CharField(
+                        choices=[
+                            ("rate", "Events per second"),
+                            ("error_rate", "5xx responses, % of events"),
+                            ("avg_latency", "Average duration (ms)"),
+                            ("p50_latency", "p50 duration (ms)"),
+                            ("p95_latency", "p95 duration (ms)"),
+                            ("p99_latency", "p99 duration (ms)"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("threshold", "Threshold"),
+                            ("change", "Change from the previous window (%)"),
+                        ],
+                        default="threshold",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "operator",
+                    models.CharField(
+                        choices=[(">", "above"), ("<", "below")],
+                        default=">",
+                        max_length=1,
+                    ),
+                ),
+                ("threshold", models.FloatField()),
+                (
+                    "window_seconds",
+                    models.IntegerField(
+                        default=300,
+                        validators=[
+                            django.core.validators.MinValueValidator(1),
+                            django.core.validators.MaxValueValidator(86400),
+                        ],
+                    ),
+                ),
+                (
+                    "min_events",
+                    models.IntegerField(
+                        default=20,
+                        help_text="Events the window needs before the rule is checked; not applied to rate",
+                        validators=[django.core.validators.MinValueValidator(0)],
+                    ),
+                ),
+                ("enabled", models.BooleanField(default=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["name"],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0010_alert_rule"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventminuterollup",
+            name="method_sketches",
+            field=models.JSONField(
+                default=dict, help_text="Duration sketch per HTTP method"
+            ),
+        ),
+        migrations.AddField(
+            model_name="eventsecondrollup",
+            name="method_sketches",
+            field=models.JSONField(
+                default=dict, help_text="Duration sketch per HTTP method"
+            ),
+        ),
+    ]
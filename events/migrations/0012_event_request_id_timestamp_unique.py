@@ -0,0 +1,48 @@
+import uuid
+
+from django.db import migrations, models
+
+# Brings the migration state in line with the keys 0005 gave the partitioned
+# PostgreSQL table: request_id is unique together with "timestamp" only.
+# Other databases still have a plain unique request_id and are altered to
+# match; on PostgreSQL only the state changes.
+
+
+class ExceptOnPostgreSQL(migrations.SeparateDatabaseAndState):
+    """Applies its database operations everywhere but on PostgreSQL"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+OPERATIONS = [
+    migrations.AlterField(
+        model_name="event",
+        name="request_id",
+        field=models.UUIDField(
+            default=uuid.uuid4, help_text="Unique identifier for the request"
+        ),
+    ),
+    migrations.AddConstraint(
+        model_name="event",
+        constraint=models.UniqueConstraint(
+            fields=("request_id", "timestamp"), name="events_event_request_id_key"
+        ),
+    ),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0011_rollup_method_sketches"),
+    ]
+
+    operations = [
+        ExceptOnPostgreSQL(database_operations=OPERATIONS, state_operations=OPERATIONS),
+    ]
@@ -1,4 +1,9 @@
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.fields.json import KT
+from django.db.models.lookups import IsNull
+from django.utils import timezone
 import uuid
 
 
@@ -14,21 +19,163 @@ class Event(models.Model):
     source = models.CharField(
         max_length=100,
     )
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     duration_ms = models.IntegerField()
     status_code = models.IntegerField()
+    # Unique together with the timestamp, see Meta.constraints; ingest
+    # (ingest.load_events) also skips request_ids that are already stored
     request_id = models.UUIDField(
-        default=uuid.uuid4, unique=True, help_text="Unique identifier for the request"
+        default=uuid.uuid4, help_text="Unique identifier for the request"
     )
     metadata = models.JSONField(default=dict)
 
     class Meta:
         ordering = ["-timestamp"]
+        # On PostgreSQL the table is partitioned by timestamp (migration 0005)
+        # and every unique key must include it. The primary key there is
+        # (id, timestamp), which Django models only as id; ids all come from
+        # one sequence, so they stay unique on their own.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["request_id", "timestamp"], name="events_event_request_id_key"
+            ),
+        ]
         indexes = [
-            models.Index(fields=["-timestamp"]),
-            models.Index(fields=["status_code"]),
-            models.Index(fields=["method"]),
+            models.Index(fields=["-timestamp", "-id"]),
+            # Filtered table lookups: equality on the column, then newest first
+            models.Index(fields=["method", "-timestamp", "-id"], name="event_method_ts_idx"),
+            models.Index(fields=["source", "-timestamp", "-id"], name="event_source_ts_idx"),
+            models.Index(
+                fields=["status_code", "-timestamp", "-id"],
+                name="event_error_status_ts_idx",
+                condition=Q(status_code__gte=400),
+            ),
+            models.Index(
+                KT("metadata__error_type"),
+                F("timestamp").desc(),
+                F("id").desc(),
+                name="event_error_type_ts_idx",
+                condition=Q(IsNull(KT("metadata__error_type"), False)),
+            ),
         ]
 
         def __str__(self):
             return f"{self.method} {self.source} - {self.status_code} ({self.duration_ms}ms)"
+
+
+class EventRollup(models.Model):
+    """Pre-aggregated event statistics for one fixed-width time bucket"""
+
+    RESOLUTION = None  # bucket width in seconds
+
+    bucket = models.DateTimeField(unique=True, help_text="Start of the bucket")
+    count = models.IntegerField(default=0)
+    duration_sum = models.BigIntegerField(default=0)
+    duration_min = models.IntegerField(null=True)
+    duration_max = models.IntegerField(null=True)
+    status_2xx = models.IntegerField(default=0)
+    status_3xx = models.IntegerField(default=0)
+    status_4xx = models.IntegerField(default=0)
+    status_5xx = models.IntegerField(default=0)
+    method_counts = models.JSONField(default=dict)
+    duration_sketch = models.JSONField(
+        default=dict, help_text="Mergeable duration quantile sketch, see events.sketch"
+    )
+    method_sketches = models.JSONField(default=dict, help_text="Duration sketch per HTTP method")
+
+    class Meta:
+        abstract = True
+        ordering = ["bucket"]
+
+    def __str__(self):
+        return f"{self.bucket.isoformat()} ({self.count} events)"
+
+
+class EventSecondRollup(EventRollup):
+    RESOLUTION = 1
+
+
+class EventMinuteRollup(EventRollup):
+    RESOLUTION = 60
+
+
+class GenerationState(models.Model):
+    """
+    Whether the event stream is generating, shared by every worker process.
+    There is a single row (pk=1), written by start/stop; see events.coordination.
+    """
+
+    is_generating = models.BooleanField(default=False)
+    started_at = models.DateTimeField(null=True)
+    expires_at = models.DateTimeField(null=True, help_text="When generation stops on its own")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def is_active(self, now=None):
+        """Generating and not yet past the auto-stop time"""
+        if not self.is_generating:
+            return False
+        return self.expires_at is None or (now or timezone.now()) < self.expires_at
+
+    def __str__(self):
+        return "generating" if self.is_active() else "stopped"
+
+
+class LogCheckpoint(models.Model):
+    """
+    How far tail_logs has stored a log file, so a restart resumes there.
+    Saved in the same transaction as the events read up to `offset`.
+    """
+
+    path = models.CharField(max_length=1024, unique=True)
+    inode = models.BigIntegerField(null=True, help_text="Inode of the file `offset` refers to")
+    offset = models.BigIntegerField(default=0, help_text="Bytes read and stored")
+    fingerprint = models.CharField(
+        max_length=40, blank=True, help_text="SHA-1 of the file's first bytes, to spot a replaced file"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.path} @ {self.offset}"
+
+
+class AlertRule(models.Model):
+    """
+    A condition on the live event stream, checked by events.alerts over a
+    sliding window of the last `window_seconds`. Threshold rules compare the
+    metric itself with `threshold`; change rules compare its percent change
+    from the window before.
+    """
+
+    METRICS = [
+        ("rate", "Events per second"),
+        ("error_rate", "5xx responses, % of events"),
+        ("avg_latency", "Average duration (ms)"),
+        ("p50_latency", "p50 duration (ms)"),
+        ("p95_latency", "p95 duration (ms)"),
+        ("p99_latency", "p99 duration (ms)"),
+    ]
+    KINDS = [("threshold", "Threshold"), ("change", "Change from the previous window (%)")]
+    OPERATORS = [(">", "above"), ("<", "below")]
+
+    name = models.CharField(max_length=100)
+    metric = models.CharField(max_length=20, choices=METRICS)
+    kind = models.CharField(max_length=10, choices=KINDS, default="threshold")
+    operator = models.CharField(max_length=1, choices=OPERATORS, default=">")
+    threshold = models.FloatField()
+    window_seconds = models.IntegerField(
+        default=300, validators=[MinValueValidator(1), MaxValueValidator(86400)]
+    )
+    min_events = models.IntegerField(
+        default=20,
+        validators=[MinValueValidator(0)],
+        help_text="Events the window needs before the rule is checked; not applied to rate",
+    )
+    enabled = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        change = " change" if self.kind == "change" else ""
+        return f"{self.name}: {self.metric}{change} {self.operator} {self.threshold} over {self.window_seconds}s"
@@ -0,0 +1,206 @@
+import json
+import uuid
+import zlib
+from datetime import datetime, timezone as dt_timezone
+
+from .models import Event
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library decoder is used without it
+    orjson = None
+
+# Compressed bytes read from the request per step
+READ_CHUNK_BYTES = 64 * 1024
+
+# Decompressed bytes produced per step, so a small, highly compressed body
+# cannot expand into memory all at once
+INFLATE_CHUNK_BYTES = 256 * 1024
+
+# A single NDJSON line longer than this is rejected rather than buffered
+MAX_LINE_BYTES = 64 * 1024
+
+FIELDS = {"method", "source", "timestamp", "duration_ms", "status_code", "request_id", "metadata"}
+REQUIRED = ("method", "source", "duration_ms", "status_code")
+
+METHOD_MAX_LENGTH = Event._meta.get_field("method").max_length
+SOURCE_MAX_LENGTH = Event._meta.get_field("source").max_length
+
+# Upper bound for duration_ms, the range of the integer column
+MAX_DURATION_MS = 2**31 - 1
+
+
+class IngestedEvent:
+    """
+    A validated event from the ingest API: the Event fields that loading,
+    the rollups and the ring buffer read, without the cost of building a
+    model instance per line.
+    """
+
+    __slots__ = ("method", "source", "timestamp", "duration_ms", "status_code", "request_id", "metadata")
+
+    def __init__(self, method, source, timestamp, duration_ms, status_code, request_id, metadata):
+        self.method = method
+        self.source = source
+        self.timestamp = timestamp
+        self.duration_ms = duration_ms
+        self.status_code = status_code
+        self.request_id = request_id  # canonical UUID string
+        self.metadata = metadata
+
+    def to_model(self):
+        return Event(**{name: getattr(self, name) for name in self.__slots__})
+
+
+class InvalidEvent(ValueError):
+    pass
+
+
+class InvalidBody(ValueError):
+    """The body itself is unreadable, e.g. corrupt gzip; nothing after it can be parsed"""
+
+
+loads = orjson.loads if orjson is not None else json.loads
+
+
+def read_chunks(stream):
+    """The raw body of a request (or any file) in READ_CHUNK_BYTES pieces"""
+    while True:
+        chunk = stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            return
+        yield chunk
+
+
+def gunzip(chunks):
+    """
+    Inflate gzip data incrementally, including bodies of several
+    concatenated gzip members as written by `cat a.gz b.gz` or appending
+    writers.
+    """
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    started = False
+    for chunk in chunks:
+        data = chunk
+        while data:
+            started = True
+            try:
+                output = inflater.decompress(data, INFLATE_CHUNK_BYTES)
+            except zlib.error as e:
+                raise InvalidBody(f"Invalid gzip data: {e}")
+            if output:
+                yield output
+            if inflater.eof:
+                # The next member, if any, starts right after this one
+                data = inflater.unused_data
+                inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                started = False
+            else:
+                data = inflater.unconsumed_tail
+    if started and not inflater.eof:
+        raise InvalidBody("Truncated gzip data")
+
+
+def split_lines(chunks):
+    """
+    (line number, line bytes) for every non-blank line, holding at most one
+    partial line between chunks. Overlong lines come out as None so the
+    caller can reject them by number.
+    """
+    number = 0
+    pending = b""
+    overlong = False
+    for chunk in chunks:
+        lines = chunk.split(b"\n")
+        lines[0] = pending + lines[0]
+        pending = lines.pop()
+        for line in lines:
+            number += 1
+            if overlong or len(line) > MAX_LINE_BYTES:
+                overlong = False
+                yield number, None
+            elif line.strip():
+                yield number, line
+        if len(pending) > MAX_LINE_BYTES:
+            # Drop the rest of this line as it arrives
+            pending = b""
+            overlong = True
+    if overlong:
+        yield number + 1, None
+    elif pending.strip():
+        yield number + 1, pending
+
+
+def _int(record, name, low, high):
+    value = record[name]
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise InvalidEvent(f"{name} must be an integer")
+    if not low <= value <= high:
+        raise InvalidEvent(f"{name} must be between {low} and {high}")
+    return value
+
+
+def _text(record, name, max_length):
+    value = record[name]
+    if not isinstance(value, str) or not value:
+        raise InvalidEvent(f"{name} must be a non-empty string")
+    if len(value) > max_length:
+        raise InvalidEvent(f"{name} is longer than {max_length} characters")
+    return value
+
+
+def _timestamp(value):
+    """ISO 8601 (naive means UTC) or epoch seconds"""
+    if isinstance(value, bool):
+        raise InvalidEvent("timestamp must be an ISO 8601 string or epoch seconds")
+    try:
+        if isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        if isinstance(value, str):
+            parsed = datetime.fromisoformat(value)
+            return parsed if parsed.tzinfo else parsed.replace(tzinfo=dt_timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        pass
+    raise InvalidEvent("timestamp must be an ISO 8601 string or epoch seconds")
+
+
+def parse_event(line, now):
+    """
+    An IngestedEvent from one NDJSON line, checked against the Event fields.
+    `timestamp` defaults to `now` and `request_id` to a new UUID, as they do
+    on the model; unknown fields are rejected rather than silently dropped.
+    """
+    try:
+        record = loads(line)
+    except ValueError:
+        raise InvalidEvent("Invalid JSON")
+    if not isinstance(record, dict):
+        raise InvalidEvent("Expected a JSON object")
+    unknown = record.keys() - FIELDS
+    if unknown:
+        raise InvalidEvent(f"Unknown field {sorted(unknown)[0]!r}")
+    for name in REQUIRED:
+        if name not in record:
+            raise InvalidEvent(f"Missing field {name!r}")
+
+    method = _text(record, "method", METHOD_MAX_LENGTH).upper()
+    if not method.isalpha():
+        raise InvalidEvent("method must be an HTTP method name")
+    source = _text(record, "source", SOURCE_MAX_LENGTH)
+    duration_ms = _int(record, "duration_ms", 0, MAX_DURATION_MS)
+    status_code = _int(record, "status_code", 100, 599)
+    timestamp = _timestamp(record["timestamp"]) if "timestamp" in record else now
+
+    request_id = record.get("request_id")
+    try:
+        request_id = str(uuid.UUID(request_id) if request_id is not None else uuid.uuid4())
+    except (TypeError, ValueError, AttributeError):
+        raise InvalidEvent("request_id must be a UUID")
+
+    metadata = record.get("metadata", {})
+    if not isinstance(metadata, dict):
+        raise InvalidEvent("metadata must be a JSON object")
+
+    return IngestedEvent(method, source, timestamp, duration_ms, status_code, request_id, metadata)
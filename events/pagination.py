@@ -0,0 +1,147 @@
+import json
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection
+from django.db.models import Q
+
+from .executor import run_sync
+
+
+def approximate_count(queryset):
+    """
+    Row count from planner statistics on PostgreSQL, so it never scans the
+    table. Partitioned tables sum the statistics of their partitions, and a
+    filtered queryset gets the planner's row estimate for its query. Falls
+    back to an exact COUNT when no statistics exist yet.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            if queryset.query.where:
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+                plan = cursor.fetchone()[0]
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                return plan[0]["Plan"]["Plan Rows"]
+            cursor.execute(
+                "SELECT CASE WHEN c.relkind = 'p' THEN ("
+                "  SELECT SUM(GREATEST(p.reltuples, 0)) FROM pg_inherits i"
+                "  JOIN pg_class p ON p.oid = i.inhrelid WHERE i.inhparent = c.oid"
+                ") ELSE c.reltuples END::bigint "
+                "FROM pg_class c WHERE c.oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] is not None and row[0] >= 0:
+            return row[0]
+    return queryset.count()
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(event):
+    return f"{(event.timestamp - EPOCH) // MICROSECOND}-{event.pk}"
+
+
+def decode_cursor(cursor):
+    """Parse a cursor into (timestamp, id), or None if it is malformed"""
+    try:
+        micros, pk = cursor.split("-")
+        timestamp = EPOCH + int(micros) * MICROSECOND
+        return timestamp, int(pk)
+    except (AttributeError, ValueError, OverflowError, OSError):
+        return None
+
+
+class KeysetPage:
+    """A page of events plus the cursors needed to navigate around it"""
+
+    def __init__(self, object_list, number, num_pages, has_previous, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.num_pages = num_pages
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def previous_page_number(self):
+        return max(self.number - 1, 1)
+
+    def next_page_number(self):
+        return self.number + 1
+
+    @property
+    def start_cursor(self):
+        return encode_cursor(self.object_list[0]) if self.object_list else ""
+
+    @property
+    def end_cursor(self):
+        return encode_cursor(self.object_list[-1]) if self.object_list else ""
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over newest-first `(timestamp, id)` order.
+
+    Every page is an index seek on `(timestamp, id)` with a LIMIT, so deep
+    pages cost the same as the first one. Page numbers are display hints
+    carried along with the cursor, and the total is approximate.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    async def _approximate_pages(self):
+        count = await run_sync(approximate_count, self.queryset)
+        return max(math.ceil(count / self.per_page), 1)
+
+    async def first(self):
+        rows = [row async for row in self.queryset.order_by("-timestamp", "-id")[: self.per_page + 1]]
+        num_pages = await self._approximate_pages()
+        return KeysetPage(rows[: self.per_page], 1, num_pages, False, len(rows) > self.per_page)
+
+    async def last(self):
+        num_pages = await self._approximate_pages()
+        rows = [row async for row in self.queryset.order_by("timestamp", "id")[: self.per_page]]
+        rows.reverse()
+        return KeysetPage(rows, num_pages, num_pages, num_pages > 1, False)
+
+    async def after(self, cursor, number):
+        """The page of events older than `cursor`"""
+        timestamp, pk = cursor
+        rows = [
+            row async for row in
+            self.queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+            .order_by("-timestamp", "-id")[: self.per_page + 1]
+        ]
+        num_pages = max(await self._approximate_pages(), number)
+        return KeysetPage(rows[: self.per_page], number, num_pages, True, len(rows) > self.per_page)
+
+    async def before(self, cursor, number):
+        """The page of events newer than `cursor`"""
+        timestamp, pk = cursor
+        rows = [
+            row async for row in
+            self.queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+            .order_by("timestamp", "id")[: self.per_page + 1]
+        ]
+        if len(rows) <= self.per_page:
+            # Reached the newest events; show a full first page instead
+            return await self.first()
+        rows = rows[: self.per_page]
+        rows.reverse()
+        return KeysetPage(rows, max(number, 2), await self._approximate_pages(), True, True)
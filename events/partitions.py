@@ -0,0 +1,159 @@
+import logging
+import re
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Event, EventMinuteRollup, EventSecondRollup
+
+logger = logging.getLogger(__name__)
+
+TABLE = Event._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{8}})$")
+
+# Rows are deleted in chunks so retention never holds long locks
+DELETE_CHUNK_SIZE = 10000
+
+
+def is_partitioned():
+    """Whether events_event is a native PostgreSQL partitioned table"""
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def partition_name(day):
+    return f"{TABLE}_p{day:%Y%m%d}"
+
+
+def day_bounds(day):
+    start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def existing_partitions():
+    """Map of day -> partition table name for the daily partitions"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[datetime.strptime(match.group(1), "%Y%m%d").date()] = name
+    return partitions
+
+
+def create_partition(day):
+    """
+    Create the partition for `day`, first moving any of its rows out of the
+    default partition so the attach does not fail.
+    """
+    name = partition_name(day)
+    start, end = day_bounds(day)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f"INSERT INTO {name} SELECT * FROM moved",
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+    logger.info("Created partition %s", name)
+    return name
+
+
+def drop_partition(name):
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+        cursor.execute(f"DROP TABLE {name}")
+    logger.info("Dropped partition %s", name)
+
+
+def ensure_partitions(days_ahead=None, today=None):
+    """Create daily partitions from today through `days_ahead` days in the future"""
+    days_ahead = settings.EVENT_PARTITION_PREMAKE_DAYS if days_ahead is None else days_ahead
+    today = today or timezone.now().astimezone(dt_timezone.utc).date()
+    existing = existing_partitions()
+    created = []
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        if day not in existing:
+            created.append(create_partition(day))
+    return created
+
+
+def drop_expired_partitions(retention_days=None, today=None):
+    """Drop daily partitions that lie entirely before the retention cutoff"""
+    retention_days = settings.EVENT_RETENTION_DAYS if retention_days is None else retention_days
+    today = today or timezone.now().astimezone(dt_timezone.utc).date()
+    cutoff = today - timedelta(days=retention_days)
+    dropped = []
+    for day, name in sorted(existing_partitions().items()):
+        if day < cutoff:
+            drop_partition(name)
+            dropped.append(name)
+    return dropped
+
+
+def delete_before(queryset, cutoff, field):
+    """Delete rows older than `cutoff` in bounded chunks; returns the row count"""
+    total = 0
+    while True:
+        ids = list(
+            queryset.filter(**{f"{field}__lt": cutoff}).values_list("pk", flat=True)[:DELETE_CHUNK_SIZE]
+        )
+        if not ids:
+            return total
+        total += queryset.filter(pk__in=ids).delete()[0]
+
+
+def apply_retention(now=None):
+    """
+    Enforce the retention policy on events and rollups.
+
+    On a partitioned PostgreSQL table, whole partitions are dropped and future
+    ones are created ahead of time; elsewhere (e.g. SQLite in DEBUG) expired
+    rows are deleted in chunks. Returns a summary dict.
+    """
+    now = now or timezone.now()
+    event_cutoff = now - timedelta(days=settings.EVENT_RETENTION_DAYS)
+    summary = {"created_partitions": [], "dropped_partitions": [], "deleted_events": 0}
+
+    if is_partitioned():
+        today = now.astimezone(dt_timezone.utc).date()
+        summary["created_partitions"] = ensure_partitions(today=today)
+        summary["dropped_partitions"] = drop_expired_partitions(today=today)
+        # Stragglers that landed in the default partition
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" < %s', [event_cutoff]
+            )
+            summary["deleted_events"] = cursor.rowcount
+    else:
+        summary["deleted_events"] = delete_before(Event.objects.all(), event_cutoff, "timestamp")
+
+    summary["deleted_minute_rollups"] = delete_before(
+        EventMinuteRollup.objects.all(), event_cutoff, "bucket"
+    )
+    summary["deleted_second_rollups"] = delete_before(
+        EventSecondRollup.objects.all(),
+        now - timedelta(days=settings.EVENT_SECOND_ROLLUP_RETENTION_DAYS),
+        "bucket",
+    )
+    return summary
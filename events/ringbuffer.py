@@ -0,0 +1,200 @@
+import bisect
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .buckets import empty_bucket, epoch_to_datetime
+from .sketch import LOG_GAMMA, ZERO_KEY
+
+STATUS_CLASSES = [2, 3, 4, 5]
+
+
+class EventRingBuffer:
+    """
+    Fixed-capacity, columnar in-memory buffer of the most recent events.
+
+    Columns are preallocated NumPy arrays written in arrival order, so a time
+    range maps to at most two contiguous slices and can be bucketed with
+    vectorized reductions instead of a database query. `valid_from` is the
+    earliest time for which the buffer is known to hold every event; queries
+    that start before it must fall back to the database.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.durations = np.zeros(capacity, dtype=np.int32)
+        self.statuses = np.zeros(capacity, dtype=np.int16)
+        self.methods = np.zeros(capacity, dtype=np.uint8)
+        self.method_names = []
+        self._method_codes = {}
+        self.size = 0
+        self.head = 0  # next write position
+        self.valid_from = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def _method_code(self, method):
+        code = self._method_codes.get(method)
+        if code is None:
+            code = self._method_codes[method] = len(self.method_names)
+            self.method_names.append(method)
+        return code
+
+    def _physical(self, index):
+        """Array position of the index-th oldest event"""
+        return (self.head - self.size + index) % self.capacity
+
+    def _newest(self):
+        return self.timestamps[self._physical(self.size - 1)] if self.size else None
+
+    def extend(self, events):
+        """Append events in timestamp order"""
+        if not self.enabled or not events:
+            return
+        with self._lock:
+            for event in sorted(events, key=lambda e: e.timestamp):
+                ts = event.timestamp.timestamp()
+                if self.valid_from is None:
+                    self.valid_from = ts
+                newest = self._newest()
+                if newest is not None and ts < newest:
+                    # Late arrival: keep timestamps sorted and stop claiming
+                    # completeness for anything up to this event
+                    self.valid_from = max(self.valid_from, newest)
+                    continue
+
+                position = self.head
+                if self.size == self.capacity:
+                    self.valid_from = max(self.valid_from, self.timestamps[self._physical(1)])
+                else:
+                    self.size += 1
+                self.timestamps[position] = ts
+                self.durations[position] = event.duration_ms
+                self.statuses[position] = event.status_code
+                self.methods[position] = self._method_code(event.method)
+                self.head = (position + 1) % self.capacity
+
+    def forget_through(self, timestamp):
+        """
+        Events up to `timestamp` were stored without passing through this
+        buffer, e.g. by another worker: stop claiming completeness for them
+        """
+        with self._lock:
+            if self.valid_from is not None:
+                self.valid_from = max(self.valid_from, timestamp.timestamp())
+
+    def clear(self):
+        with self._lock:
+            self.size = 0
+            self.head = 0
+            self.valid_from = None
+
+    def covers(self, start_time):
+        return self.valid_from is not None and start_time.timestamp() >= self.valid_from
+
+    def _columns(self, start_epoch, end_epoch):
+        """Copies of the columns for events with start_epoch <= ts <= end_epoch"""
+        ordered = _LogicalTimestamps(self)
+        lo = bisect.bisect_left(ordered, start_epoch)
+        hi = bisect.bisect_right(ordered, end_epoch)
+        if hi <= lo:
+            return None
+        first, last = self._physical(lo), self._physical(hi - 1) + 1
+        if first < last:
+            take = lambda column: column[first:last].copy()
+        else:
+            take = lambda column: np.concatenate((column[first:], column[:last]))
+        return (
+            take(self.timestamps),
+            take(self.durations).astype(np.int64),
+            take(self.statuses),
+            take(self.methods),
+        )
+
+    def fetch_buckets(self, start_time, end_time, interval_seconds):
+        """Same output as rollups.fetch_buckets, computed from the buffer"""
+        base = int(start_time.timestamp())
+        base -= base % interval_seconds
+        with self._lock:
+            columns = self._columns(start_time.timestamp(), end_time.timestamp())
+            method_names = list(self.method_names)
+        if columns is None:
+            return []
+        timestamps, durations, statuses, methods = columns
+
+        # Timestamps are sorted, so each bucket is a contiguous run
+        indexes = ((timestamps - base) // interval_seconds).astype(np.int64)
+        starts = np.flatnonzero(np.diff(indexes, prepend=-1))
+        counts = np.diff(np.append(starts, len(indexes)))
+        duration_sums = np.add.reduceat(durations, starts)
+        duration_mins = np.minimum.reduceat(durations, starts)
+        duration_maxs = np.maximum.reduceat(durations, starts)
+        classes = statuses // 100
+        status_counts = {
+            f"status_{cls}xx": np.add.reduceat((classes == cls).astype(np.int64), starts)
+            for cls in STATUS_CLASSES
+        }
+        method_counts = {
+            method_names[code]: np.add.reduceat((methods == code).astype(np.int64), starts)
+            for code in np.unique(methods)
+        }
+        sketches, method_sketches = self._sketches(indexes, durations, methods, method_names)
+
+        buckets = []
+        for i, index in enumerate(indexes[starts].tolist()):
+            bucket = empty_bucket(epoch_to_datetime(base + index * interval_seconds))
+            bucket["count"] = int(counts[i])
+            bucket["duration_sum"] = int(duration_sums[i])
+            bucket["duration_min"] = int(duration_mins[i])
+            bucket["duration_max"] = int(duration_maxs[i])
+            for name, values in status_counts.items():
+                bucket[name] = int(values[i])
+            bucket["method_counts"] = {
+                method: int(values[i]) for method, values in method_counts.items() if values[i]
+            }
+            bucket["duration_sketch"] = sketches.get(index, {})
+            bucket["method_sketches"] = method_sketches.get(index, {})
+            buckets.append(bucket)
+        return buckets
+
+    @staticmethod
+    def _sketches(indexes, durations, methods, method_names):
+        """
+        Duration sketch per bucket index, and per bucket index and method,
+        matching sketch.add_value
+        """
+        positive = durations > 0
+        bins = np.zeros(len(durations), dtype=np.int64)
+        bins[positive] = np.ceil(np.log(durations[positive]) / LOG_GAMMA)
+        groups, counts = np.unique(
+            np.stack((indexes, methods, bins, positive)), axis=1, return_counts=True
+        )
+        sketches = {}
+        method_sketches = {}
+        for (index, code, bin_, is_positive), count in zip(groups.T.tolist(), counts.tolist()):
+            key = str(bin_) if is_positive else ZERO_KEY
+            sketch = sketches.setdefault(index, {})
+            sketch[key] = sketch.get(key, 0) + count
+            method_sketches.setdefault(index, {}).setdefault(method_names[code], {})[key] = count
+        return sketches, method_sketches
+
+
+class _LogicalTimestamps:
+    """Sequence view of the buffer's timestamps, oldest first, for bisect"""
+
+    def __init__(self, ring):
+        self.ring = ring
+
+    def __len__(self):
+        return self.ring.size
+
+    def __getitem__(self, index):
+        return self.ring.timestamps[self.ring._physical(index)]
+
+
+recent_events = EventRingBuffer(settings.EVENT_RING_BUFFER_CAPACITY)
@@ -0,0 +1,300 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .buckets import (
+    COUNTER_FIELDS,
+    add_event,
+    empty_bucket,
+    epoch_to_datetime,
+    floor_epoch,
+    merge_bucket,
+    regroup_buckets,
+)
+from .cache import bucket_cache
+from .instrumentation import timed
+from .models import Event, EventMinuteRollup, EventSecondRollup
+from .ringbuffer import recent_events
+
+# Finest resolution first
+ROLLUP_MODELS = [EventSecondRollup, EventMinuteRollup]
+
+ROLLUP_FIELDS = COUNTER_FIELDS + [
+    "duration_min",
+    "duration_max",
+    "method_counts",
+    "duration_sketch",
+    "method_sketches",
+]
+
+# bulk_update builds one CASE expression per field, which grows quadratically
+ROLLUP_UPDATE_BATCH_SIZE = 100
+
+# Rows per UPDATE ... FROM (VALUES ...) on PostgreSQL
+ROLLUP_VALUES_BATCH_SIZE = 1000
+
+
+def aggregate_events(events, resolution):
+    """Group events into partial buckets keyed by bucket start epoch"""
+    buckets = {}
+    for event in events:
+        start = floor_epoch(event.timestamp, resolution)
+        bucket = buckets.get(start)
+        if bucket is None:
+            bucket = buckets[start] = empty_bucket(epoch_to_datetime(start))
+        add_event(bucket, event.method, event.duration_ms, event.status_code)
+    return buckets
+
+
+def apply_partials(model, partials):
+    """Merge partial buckets into the rollup table, creating rows as needed"""
+    if not partials:
+        return
+    try:
+        _merge_partials(model, partials)
+    except IntegrityError:
+        # A concurrent writer created one of our new buckets; merge into it instead
+        _merge_partials(model, partials)
+
+
+def _merge_partials(model, partials):
+    with transaction.atomic():
+        timestamps = [bucket["timestamp"] for bucket in partials.values()]
+        rows = list(model.objects.select_for_update().filter(bucket__in=timestamps))
+        for row in rows:
+            merged = {name: getattr(row, name) for name in ROLLUP_FIELDS}
+            merge_bucket(merged, partials[int(row.bucket.timestamp())])
+            for name in ROLLUP_FIELDS:
+                setattr(row, name, merged[name])
+        _update_rows(model, rows)
+
+        existing = {row.bucket for row in rows}
+        model.objects.bulk_create(
+            [
+                model(bucket=bucket["timestamp"], **{name: bucket[name] for name in ROLLUP_FIELDS})
+                for bucket in partials.values()
+                if bucket["timestamp"] not in existing
+            ]
+        )
+
+
+def _update_rows(model, rows):
+    """
+    Write back the rollup fields of `rows`. On PostgreSQL this is one
+    UPDATE ... FROM (VALUES ...) per ROLLUP_VALUES_BATCH_SIZE rows, which
+    costs far less to build than bulk_update's CASE per field and row; that
+    matters for bulk loads touching hundreds of buckets per batch.
+    """
+    if connection.vendor != "postgresql":
+        model.objects.bulk_update(rows, ROLLUP_FIELDS, batch_size=ROLLUP_UPDATE_BATCH_SIZE)
+        return
+    fields = [model._meta.get_field(name) for name in ROLLUP_FIELDS]
+    quote = connection.ops.quote_name
+    row_sql = "(%s, " + ", ".join(f"%s::{field.db_type(connection)}" for field in fields) + ")"
+    assignments = ", ".join(f"{quote(field.column)} = v.{quote(field.column)}" for field in fields)
+    columns = ", ".join(quote(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), ROLLUP_VALUES_BATCH_SIZE):
+            batch = rows[offset : offset + ROLLUP_VALUES_BATCH_SIZE]
+            params = []
+            for row in batch:
+                params.append(row.pk)
+                params.extend(
+                    field.get_db_prep_save(getattr(row, field.attname), connection) for field in fields
+                )
+            cursor.execute(
+                f"UPDATE {quote(model._meta.db_table)} AS r SET {assignments} "
+                f"FROM (VALUES {', '.join([row_sql] * len(batch))}) AS v(id, {columns}) "
+                "WHERE r.id = v.id",
+                params,
+            )
+
+
+def apply_events(events):
+    """Incrementally maintain every rollup resolution for a batch of new events"""
+    for model in ROLLUP_MODELS:
+        apply_partials(model, aggregate_events(events, model.RESOLUTION))
+
+
+def replace_range(start_time, end_time, partials):
+    """
+    Replace every rollup bucket in [start_time, end_time) with `partials`,
+    as returned by aggregate_range for the same range. Unlike
+    apply_partials nothing is merged, so a range can be rebuilt any number
+    of times without counting its events twice.
+    """
+    with transaction.atomic():
+        for model in ROLLUP_MODELS:
+            model.objects.filter(bucket__gte=start_time, bucket__lt=end_time).delete()
+            model.objects.bulk_create(
+                [
+                    model(bucket=bucket["timestamp"], **{name: bucket[name] for name in ROLLUP_FIELDS})
+                    for bucket in partials[model.RESOLUTION].values()
+                ]
+            )
+
+
+def aggregate_range(start_time, end_time, chunk_size):
+    """
+    Partial buckets at every rollup resolution for the events in
+    [start_time, end_time), as {resolution: {start epoch: bucket}}, and the
+    number of events read. Rows are streamed with .iterator(), a server-side
+    cursor on PostgreSQL, and only the finest resolution is built from them;
+    the coarser ones are merged from its buckets.
+    """
+    finest = ROLLUP_MODELS[0].RESOLUTION
+    buckets = {}
+    count = 0
+    rows = (
+        Event.objects.filter(timestamp__gte=start_time, timestamp__lt=end_time)
+        .order_by()
+        .values_list("timestamp", "method", "duration_ms", "status_code")
+        .iterator(chunk_size=chunk_size)
+    )
+    for timestamp, method, duration_ms, status_code in rows:
+        start = floor_epoch(timestamp, finest)
+        bucket = buckets.get(start)
+        if bucket is None:
+            bucket = buckets[start] = empty_bucket(epoch_to_datetime(start))
+        add_event(bucket, method, duration_ms, status_code)
+        count += 1
+
+    partials = {finest: buckets}
+    for model in ROLLUP_MODELS[1:]:
+        partials[model.RESOLUTION] = {
+            int(bucket["timestamp"].timestamp()): bucket
+            for bucket in regroup_buckets(buckets.values(), model.RESOLUTION)
+        }
+    return partials, count
+
+
+def rollup_model_for(interval_seconds):
+    """Coarsest rollup whose buckets tile `interval_seconds` exactly"""
+    for model in reversed(ROLLUP_MODELS):
+        if interval_seconds % model.RESOLUTION == 0:
+            return model
+    return ROLLUP_MODELS[0]
+
+
+def readable_interval(start_time, interval_seconds):
+    """
+    `interval_seconds`, rounded up to whole minutes when the range starting
+    at `start_time` reaches back past EVENT_SECOND_ROLLUP_RETENTION_DAYS.
+    Only minute rollups are kept that long, and a sub-minute interval would
+    read the second rollups and come back partly empty.
+    """
+    minute = EventMinuteRollup.RESOLUTION
+    if interval_seconds % minute == 0:
+        return interval_seconds
+    kept_from = timezone.now() - timedelta(days=settings.EVENT_SECOND_ROLLUP_RETENTION_DAYS)
+    if start_time >= kept_from:
+        return interval_seconds
+    return math.ceil(interval_seconds / minute) * minute
+
+
+@timed("buckets")
+def fetch_buckets(start_time, end_time, interval_seconds):
+    """
+    Buckets of `interval_seconds` covering [start_time, end_time], with
+    `start_time` aligned down to the interval. Empty buckets are omitted.
+    Closed buckets are served from the bucket cache, so treat the returned
+    buckets as read-only.
+    """
+    return bucket_cache.fetch("events", start_time, end_time, interval_seconds, fetch_live_buckets)
+
+
+def fetch_live_buckets(start_time, end_time, interval_seconds):
+    """
+    Uncached buckets of `interval_seconds` covering [start_time, end_time].
+
+    Recent ranges are served from the in-memory ring buffer; whatever part of
+    the range is older than the buffer holds is read from the rollup tables.
+    """
+    if not recent_events.enabled or recent_events.valid_from is None:
+        return fetch_rollup_buckets(start_time, end_time, interval_seconds)
+    if recent_events.covers(start_time):
+        return recent_events.fetch_buckets(start_time, end_time, interval_seconds)
+
+    # Split on a bucket boundary so no bucket mixes both sources
+    split = math.ceil(recent_events.valid_from / interval_seconds) * interval_seconds
+    split_time = epoch_to_datetime(split)
+    if split_time > end_time:
+        return fetch_rollup_buckets(start_time, end_time, interval_seconds)
+    older = fetch_rollup_buckets(start_time, split_time - timedelta(microseconds=1), interval_seconds)
+    return older + recent_events.fetch_buckets(split_time, end_time, interval_seconds)
+
+
+def fetch_rollup_buckets(start_time, end_time, interval_seconds):
+    """
+    Buckets of `interval_seconds` covering [start_time, end_time], read from
+    the coarsest rollup that satisfies the interval. Empty buckets are omitted.
+    """
+    model = rollup_model_for(interval_seconds)
+    first = epoch_to_datetime(floor_epoch(start_time, model.RESOLUTION))
+    rows = (
+        model.objects.filter(bucket__gte=first, bucket__lte=end_time)
+        .order_by("bucket")
+        .values("bucket", *ROLLUP_FIELDS)
+    )
+
+    buckets = {}
+    for row in rows:
+        start = floor_epoch(row["bucket"], interval_seconds)
+        bucket = buckets.get(start)
+        if bucket is None:
+            bucket = buckets[start] = empty_bucket(epoch_to_datetime(start))
+        merge_bucket(bucket, row)
+    return [buckets[start] for start in sorted(buckets)]
+
+
+def window_resolution(step_seconds, window):
+    """Coarsest rollup resolution that both the step and the window tile"""
+    return rollup_model_for(math.gcd(step_seconds, int(window.total_seconds()))).RESOLUTION
+
+
+def sliding_window_sums(start_time, end_time, step_seconds, window, fields):
+    """
+    Sum `fields` over the trailing `window` at points every `step_seconds`
+    from `start_time` to `end_time`. Returns a list of (point, sums).
+
+    Buckets are fetched once at the coarsest resolution the step and window
+    allow and turned into prefix sums, so each point costs O(1). Points are
+    aligned to that resolution so every window covers whole buckets.
+    """
+    resolution = window_resolution(step_seconds, window)
+    buckets = fetch_buckets(start_time, end_time, resolution)
+    return window_sums(buckets, resolution, start_time, end_time, step_seconds, window, fields)
+
+
+def window_sums(buckets, resolution, start_time, end_time, step_seconds, window, fields):
+    """sliding_window_sums over already fetched `resolution`-second buckets"""
+    window_seconds = int(window.total_seconds())
+    base = floor_epoch(start_time, resolution)
+    size = (floor_epoch(end_time, resolution) - base) // resolution + 1
+    dense = {name: [0] * size for name in fields}
+    for bucket in buckets:
+        index = (int(bucket["timestamp"].timestamp()) - base) // resolution
+        if 0 <= index < size:
+            for name in fields:
+                dense[name][index] += bucket[name]
+    prefix = {}
+    for name in fields:
+        running = prefix[name] = [0] * (size + 1)
+        for index, value in enumerate(dense[name]):
+            running[index + 1] = running[index] + value
+
+    # Window [point - window, point) maps to prefix[upper] - prefix[lower]
+    first = base if base >= start_time.timestamp() else base + resolution
+    window_buckets = window_seconds // resolution
+    results = []
+    for epoch in range(first, int(end_time.timestamp()) + 1, step_seconds):
+        upper = min((epoch - base) // resolution, size)
+        lower = max(upper - window_buckets, 0)
+        results.append((
+            epoch_to_datetime(epoch),
+            {name: prefix[name][upper] - prefix[name][lower] for name in fields},
+        ))
+    return results
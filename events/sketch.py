@@ -0,0 +1,90 @@
+import math
+
+# DDSketch-style quantile sketch over positive values, stored as a plain dict
+# of bin -> count so it can live in a bucket dict and a JSONField. Bin i
+# holds values in (GAMMA**(i-1), GAMMA**i], so any quantile read back is
+# within RELATIVE_ACCURACY of a value that was actually added. Sketches
+# merge by adding counts, which makes them safe to combine across buckets.
+# Keys are strings so sketches survive a JSON round trip unchanged.
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+# Values <= 0 are counted here rather than in a log bin
+ZERO_KEY = "z"
+
+# Beyond this many bins the lowest ones are collapsed, trading accuracy at
+# the bottom of the distribution for a bounded size. Durations from 1ms to
+# an hour need only ~750 bins, so this is a safety net
+MAX_BINS = 2048
+
+
+def bin_index(value):
+    return math.ceil(math.log(value) / LOG_GAMMA)
+
+
+def bin_value(index):
+    """Representative value of bin `index`, equidistant from its bounds in relative terms"""
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+def add_value(sketch, value, count=1):
+    key = str(bin_index(value)) if value > 0 else ZERO_KEY
+    sketch[key] = sketch.get(key, 0) + count
+
+
+def merge_sketch(target, other):
+    """Fold sketch `other` into sketch `target`"""
+    for key, count in other.items():
+        target[key] = target.get(key, 0) + count
+    if len(target) > MAX_BINS:
+        collapse(target)
+
+
+def collapse(sketch):
+    """Merge the lowest bins into one until at most MAX_BINS remain"""
+    indexes = sorted(int(key) for key in sketch if key != ZERO_KEY)
+    excess = len(sketch) - MAX_BINS
+    if excess <= 0 or len(indexes) <= excess:
+        return
+    floor = indexes[excess]
+    for index in indexes[:excess]:
+        sketch[str(floor)] = sketch.get(str(floor), 0) + sketch.pop(str(index))
+
+
+def total_count(sketch):
+    return sum(sketch.values())
+
+
+def mean(sketch):
+    """Mean of the values added, within RELATIVE_ACCURACY, or None for an empty sketch"""
+    total = total_count(sketch)
+    if not total:
+        return None
+    return sum(bin_value(int(key)) * count for key, count in sketch.items() if key != ZERO_KEY) / total
+
+
+def quantiles(sketch, fractions):
+    """
+    Values at each of `fractions` (0..1, ascending), or None for an empty
+    sketch, in a single pass over the sorted bins.
+    """
+    total = total_count(sketch)
+    if not total:
+        return [None] * len(fractions)
+
+    bins = sorted(
+        (float("-inf") if key == ZERO_KEY else int(key), count) for key, count in sketch.items()
+    )
+    results = []
+    position = 0
+    seen = bins[0][1]
+    for fraction in fractions:
+        rank = fraction * (total - 1)
+        while seen <= rank and position < len(bins) - 1:
+            position += 1
+            seen += bins[position][1]
+        index = bins[position][0]
+        results.append(0.0 if index == float("-inf") else bin_value(index))
+    return results
@@ -2,6 +2,8 @@ class StreamHandler {
   constructor() {
     this.subscribers = new Map();
     this.eventSource = null;
+    // id of the last event received; sent on reconnect so the server replays the gap
+    this.lastEventId = null;
     
     // Add broadcast channel
     this.broadcastChannel = new BroadcastChannel('stream_state');
@@ -69,7 +71,12 @@ class StreamHandler {
     }
 
     try {
-      this.eventSource = new EventSource("/stream/events/");
+      // EventSource resends Last-Event-ID on its own reconnects, but a new
+      // EventSource has to pass it explicitly
+      const url = this.lastEventId
+        ? `/stream/events/?last_event_id=${encodeURIComponent(this.lastEventId)}`
+        : "/stream/events/";
+      this.eventSource = new EventSource(url);
 
       this.eventSource.onerror = (error) => {
         console.error("[StreamHandler] Connection error:", error);
@@ -81,6 +88,9 @@ class StreamHandler {
 
       this.eventSource.addEventListener("api.request", async (e) => {
         try {
+          if (e.lastEventId) {
+            this.lastEventId = e.lastEventId;
+          }
           const rawData = JSON.parse(e.data);
           const formattedData = this.formatEventData(rawData);
           
@@ -115,6 +125,8 @@ class StreamHandler {
   }
 
   async disconnect() {
+    // Stopped on purpose: the next stream starts fresh rather than replaying
+    this.lastEventId = null;
     if (this.eventSource) {
       try {
         this.eventSource.close();
@@ -150,6 +162,7 @@ class StreamHandler {
       status: rawData.status_code,
       isError: rawData.status_code >= 400,
       message: rawData.status_code >= 400 ? rawData.metadata.error_message : "",
+      errorType: rawData.metadata ? rawData.metadata.error_type : undefined,
     };
   }
 }
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from .encoding import dumps
+
+# How events are encoded for the SSE stream and the event bus. Kept apart
+# from the views so management commands can use it without building the
+# views' coordinator, event bus and alert evaluator.
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def serialize_event(event):
+    """Build the SSE payload for an event"""
+    return {
+        "timestamp": event.timestamp.isoformat(),
+        "method": event.method,
+        "source": event.source,
+        "status_code": event.status_code,
+        "duration_ms": event.duration_ms,
+        "metadata": event.metadata,
+    }
+
+
+def encode_event_message(event):
+    """The bus message for an event: its SSE id, payload and the encoded frame"""
+    event_data = serialize_event(event)
+    message_id = event_id(event.timestamp)
+    return {
+        "id": message_id,
+        "data": event_data,
+        "frame": f"id: {message_id}\ndata: {dumps(event_data).decode()}\nevent: api.request\n\n",
+    }
+
+
+def event_id(timestamp):
+    """
+    SSE id of an event: its timestamp in integer microseconds, the same on
+    every worker and usable as a range bound for the database fallback.
+    views.generate_event_async keeps generated timestamps unique and increasing.
+    """
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+
+def event_id_time(message_id):
+    return EPOCH + timedelta(microseconds=message_id)
@@ -0,0 +1,219 @@
+import hashlib
+import logging
+import mmap
+import os
+
+from django.db import transaction
+
+from .ingest import load_events
+from .models import LogCheckpoint
+
+logger = logging.getLogger(__name__)
+
+# Bytes scanned per read; every read ends at a line boundary
+READ_BYTES = 8 * 1024 * 1024
+
+# Leading bytes hashed into LogCheckpoint.fingerprint
+FINGERPRINT_BYTES = 256
+
+
+class TailedFile:
+    """
+    A log file followed across appends, truncation (copytruncate) and
+    rotation by rename, with its read position checkpointed in
+    LogCheckpoint.
+
+    New bytes are read with large pread() calls, or with `use_mmap` scanned
+    in place through a memory map of the file. A file truncated while it
+    is mapped raises SIGBUS, so mmap is for logs rotated by rename only.
+    """
+
+    def __init__(self, path, use_mmap=False):
+        self.path = os.path.abspath(path)
+        self.use_mmap = use_mmap
+        self.checkpoint = LogCheckpoint(path=self.path)
+        self.fd = None
+        self.inode = None
+        self.offset = 0  # read so far; the checkpoint trails it until a commit
+        self.pending = []  # events read but not yet stored
+        self._map = None
+        self._fingerprint = None
+
+    def open(self, from_end=False, resume=True):
+        """
+        Resume from the stored checkpoint, unless `resume` is false. If the
+        file was rotated while nothing was tailing it, the rest of the
+        checkpointed file is read from `<path>.1` first, where logrotate
+        moves it.
+        """
+        if resume:
+            self.checkpoint = LogCheckpoint.objects.filter(path=self.path).first() or self.checkpoint
+        checkpoint = self.checkpoint
+        self._open(self.path)
+        if checkpoint.inode is None:
+            self.offset = self._last_line_end() if from_end else 0
+        elif checkpoint.inode == self.inode and self._resumable(checkpoint):
+            self.offset = checkpoint.offset
+        else:
+            rotated = f"{self.path}.1"
+            try:
+                moved = os.stat(rotated).st_ino == checkpoint.inode
+            except FileNotFoundError:
+                moved = False
+            if moved:
+                self.close()
+                self._open(rotated)
+                self.offset = checkpoint.offset if self._resumable(checkpoint) else 0
+            else:
+                logger.warning(f"{self.path} was replaced since its checkpoint; reading it from the start")
+                self.offset = 0
+
+    def _open(self, path):
+        self.fd = os.open(path, os.O_RDONLY)
+        self.inode = os.fstat(self.fd).st_ino
+
+    def _resumable(self, checkpoint):
+        """Whether the open file still holds the bytes the checkpoint was taken on"""
+        if os.fstat(self.fd).st_size < checkpoint.offset:
+            return False
+        return self.fingerprint(checkpoint.offset) == checkpoint.fingerprint
+
+    def _last_line_end(self):
+        size = os.fstat(self.fd).st_size
+        tail = os.pread(self.fd, min(size, READ_BYTES), max(size - READ_BYTES, 0))
+        return size - len(tail) + tail.rfind(b"\n") + 1
+
+    def fingerprint(self, offset):
+        """SHA-1 of the first FINGERPRINT_BYTES of the file, or of its first `offset` bytes if fewer"""
+        length = min(offset, FINGERPRINT_BYTES)
+        if length == FINGERPRINT_BYTES and self._fingerprint is not None:
+            return self._fingerprint
+        digest = hashlib.sha1(os.pread(self.fd, length, 0)).hexdigest()
+        if length == FINGERPRINT_BYTES:
+            self._fingerprint = digest
+        return digest
+
+    def read(self):
+        """
+        (buffer, start, end, base) for the complete lines after `offset`, at
+        most READ_BYTES of them, where buffer[i] is byte base + i of the
+        file; None when there is no new complete line.
+        """
+        if self.use_mmap:
+            size = os.fstat(self.fd).st_size
+            if size <= self.offset:
+                return None
+            if self._map is None or len(self._map) < size:
+                self._unmap()
+                self._map = mmap.mmap(self.fd, size, access=mmap.ACCESS_READ)
+            end = min(size, self.offset + READ_BYTES)
+            last = self._map.rfind(b"\n", self.offset, end)
+            if last == -1:
+                return self._skip_overlong(end - self.offset)
+            return self._map, self.offset, last + 1, 0
+
+        data = os.pread(self.fd, READ_BYTES, self.offset)
+        last = data.rfind(b"\n")
+        if last == -1:
+            return self._skip_overlong(len(data))
+        return data, 0, last + 1, self.offset
+
+    def _skip_overlong(self, length):
+        """A READ_BYTES stretch without a newline is dropped; anything shorter is a partial line"""
+        if length == READ_BYTES:
+            logger.warning(f"Skipping {length} bytes without a newline in {self.path}")
+            self.offset += length
+        return None
+
+    def check(self):
+        """
+        After read() found nothing: "truncated" if the file shrank below the
+        offset, "rotated" if the path now names a different file, else None.
+        """
+        if os.fstat(self.fd).st_size < self.offset:
+            return "truncated"
+        if self._fingerprint is not None:
+            # Truncated and written past the old offset since the last poll
+            if hashlib.sha1(os.pread(self.fd, FINGERPRINT_BYTES, 0)).hexdigest() != self._fingerprint:
+                return "truncated"
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            # Moved away and not recreated yet; keep reading the old file
+            return None
+        return "rotated" if current != self.inode else None
+
+    def rewind(self):
+        self._unmap()
+        self.offset = 0
+        self._fingerprint = None
+
+    def reopen(self):
+        """Switch to the file now at `path`, from its start"""
+        self.close()
+        self._open(self.path)
+        self.offset = 0
+        self._fingerprint = None
+
+    def commit(self, offset, on_batch=None):
+        """
+        Store the pending events and move the checkpoint to `offset` in one
+        transaction, so a restart neither loses nor repeats lines. Returns
+        the events stored.
+        """
+        events, self.pending = self.pending, []
+        checkpoint = self.checkpoint
+        checkpoint.inode = self.inode
+        checkpoint.offset = offset
+        checkpoint.fingerprint = self.fingerprint(offset)
+        with transaction.atomic():
+            created = load_events(events)
+            if on_batch:
+                on_batch(created)
+            checkpoint.save()
+        return created
+
+    def _unmap(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def close(self):
+        self._unmap()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def poll(tailed, parser, batch_size, max_reads=None, on_batch=None):
+    """
+    Store what was appended to `tailed` since the last poll in batches of
+    `batch_size`, following truncation and rotation. Stops early after
+    `max_reads` reads, so one busy file cannot starve the others. Returns
+    the number of events stored.
+    """
+    stored = 0
+    reads = 0
+    while max_reads is None or reads < max_reads:
+        window = tailed.read()
+        if window is None:
+            if tailed.pending or tailed.offset != tailed.checkpoint.offset:
+                stored += len(tailed.commit(tailed.offset, on_batch))
+            change = tailed.check()
+            if change is None:
+                break
+            logger.info(f"{tailed.path} was {change}; reading it from the start")
+            if change == "truncated":
+                tailed.rewind()
+            else:
+                tailed.reopen()
+            continue
+
+        reads += 1
+        buffer, start, end, base = window
+        for event, line_end in parser.parse(buffer, start, end):
+            tailed.pending.append(event)
+            if len(tailed.pending) >= batch_size:
+                stored += len(tailed.commit(base + line_end, on_batch))
+        tailed.offset = base + end
+    return stored
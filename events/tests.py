@@ -1,3 +1,805 @@
-from django.test import TestCase
+import math
+import os
+import random
+import shutil
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db.models import Avg, F
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from django.utils import timezone
+
+from . import downsample, partitions, views
+from .accesslog import AccessLogParser
+from .alerts import AlertEvaluator, Window
+from .buckets import empty_bucket, epoch_to_datetime, floor_epoch
+from .cache import BucketCache, DjangoCacheBackend, LocalBackend, bucket_cache
+from .coalesce import FrameCoalescer
+from .encoding import Series
+from .ingest import write_events
+from .models import AlertRule, Event, EventMinuteRollup, LogCheckpoint
+from .ndjson import InvalidEvent, parse_event
+from .pagination import KeysetPaginator, decode_cursor, encode_cursor
+from .ringbuffer import recent_events
+from .rollups import ROLLUP_MODELS, fetch_rollup_buckets, window_sums
+from .sketch import RELATIVE_ACCURACY, add_value, bin_index, mean, merge_sketch, quantiles
+from .stream import encode_event_message, event_id
+from .tailing import TailedFile, poll
+
+NOW = datetime(2026, 10, 18, 12, 0, tzinfo=dt_timezone.utc)
+
+
+class SketchTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.values = rng.lognormal(mean=5, sigma=1, size=20000).round().astype(int).clip(1).tolist()
+        self.sketch = {}
+        for value in self.values:
+            add_value(self.sketch, value)
+
+    def test_quantiles_within_relative_accuracy(self):
+        fractions = [0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 1.0]
+        ordered = sorted(self.values)
+        for fraction, estimate in zip(fractions, quantiles(self.sketch, fractions)):
+            exact = ordered[math.floor(fraction * (len(ordered) - 1))]
+            self.assertLessEqual(abs(estimate - exact), RELATIVE_ACCURACY * exact + 1e-9, fraction)
+
+    def test_mean_within_relative_accuracy(self):
+        exact = sum(self.values) / len(self.values)
+        self.assertLessEqual(abs(mean(self.sketch) - exact), RELATIVE_ACCURACY * exact)
+
+    def test_merged_sketches_match_one_sketch(self):
+        first, second = {}, {}
+        for index, value in enumerate(self.values):
+            add_value(first if index % 2 else second, value)
+        merge_sketch(first, second)
+        self.assertEqual(first, self.sketch)
+
+    def test_empty_and_zero(self):
+        self.assertEqual(quantiles({}, [0.5, 0.99]), [None, None])
+        self.assertIsNone(mean({}))
+        zeros = {}
+        add_value(zeros, 0, count=3)
+        self.assertEqual(quantiles(zeros, [0.5]), [0.0])
+
+
+class WindowSumsTests(SimpleTestCase):
+    def bucket(self, epoch, count, errors=0):
+        bucket = empty_bucket(epoch_to_datetime(epoch))
+        bucket["count"] = count
+        bucket["status_5xx"] = errors
+        return bucket
+
+    def test_matches_brute_force(self):
+        base = int(NOW.timestamp())
+        counts = {base + 60 * i: (i % 7) + 1 for i in range(30) if i % 5 != 3}
+        buckets = [self.bucket(epoch, count, count // 2) for epoch, count in counts.items()]
+        start, end = NOW, NOW + timedelta(minutes=29)
+        window = timedelta(minutes=5)
+
+        results = window_sums(buckets, 60, start, end, 120, window, ["count", "status_5xx"])
+
+        points = list(range(base, base + 29 * 60 + 1, 120))
+        self.assertEqual([point for point, _ in results], [epoch_to_datetime(p) for p in points])
+        for (point, sums), epoch in zip(results, points):
+            inside = [s for s in counts if epoch - 300 <= s < epoch]
+            self.assertEqual(sums["count"], sum(counts[s] for s in inside))
+            self.assertEqual(sums["status_5xx"], sum(counts[s] // 2 for s in inside))
+
+    def test_unaligned_start_skips_partial_first_point(self):
+        start = NOW + timedelta(seconds=10)
+        buckets = [self.bucket(int(NOW.timestamp()), 4)]
+        results = window_sums(
+            buckets, 60, start, start + timedelta(minutes=2), 60, timedelta(minutes=1), ["count"]
+        )
+        self.assertEqual(results[0][0], NOW + timedelta(minutes=1))
+        self.assertEqual(results[0][1]["count"], 4)
+
+
+class StoredEventsTestCase(TransactionTestCase):
+    """
+    Events written through the ingest path, so the rollups are maintained.
+    A TransactionTestCase because the chart views read on the executor's
+    own connection.
+    """
+
+    def setUp(self):
+        bucket_cache.clear()
+        recent_events.clear()
+        # Whole minutes, all inside a 15 minute range
+        self.base = floor_epoch(timezone.now(), 60) - 12 * 60
+        self.addCleanup(bucket_cache.clear)
+        self.addCleanup(recent_events.clear)
+
+    def store(self, count, seconds=600, seed=1):
+        rng = random.Random(seed)
+        events = [
+            Event(
+                method=rng.choice(Event.HTTP_METHODS),
+                source="/api/test",
+                duration_ms=rng.randint(1, 500),
+                status_code=rng.choice([200, 200, 200, 301, 404, 500]),
+                timestamp=epoch_to_datetime(self.base + rng.randrange(seconds)),
+            )
+            for _ in range(count)
+        ]
+        write_events(events)
+        return events
+
+    def read_rollups(self):
+        """Serve the next reads from the rollup tables rather than the ring buffer"""
+        recent_events.clear()
+        bucket_cache.clear()
+
+
+class LatencySeriesTests(StoredEventsTestCase):
+    def test_matches_raw_bucket_averages(self):
+        self.store(600)
+        self.read_rollups()
+        for interval in (10, 60, 300):
+            response = self.client.get(
+                "/api/historical-latency-data/", {"interval": interval, "range": 15}
+            )
+            points = response.json()["data"]
+            starts = sorted({
+                floor_epoch(timestamp, interval)
+                for timestamp in Event.objects.values_list("timestamp", flat=True)
+            })
+            # Points sit on bucket starts rather than on each bucket's first event
+            self.assertEqual([point["x"] / 1000 for point in points], starts, interval)
+            for point in points:
+                start = epoch_to_datetime(point["x"] / 1000)
+                raw = Event.objects.filter(
+                    timestamp__gte=start, timestamp__lt=start + timedelta(seconds=interval)
+                ).aggregate(avg=Avg("duration_ms"))["avg"]
+                self.assertAlmostEqual(point["y"], raw, delta=0.01)
+
+
+class ErrorRateSeriesTests(StoredEventsTestCase):
+    def test_windows_end_before_each_point(self):
+        self.store(300)
+        # Server errors exactly on minute boundaries count towards the next
+        # point's window, [point - window, point), not towards their own
+        write_events([
+            Event(
+                method="GET", source="/api/test", duration_ms=10, status_code=500,
+                timestamp=epoch_to_datetime(self.base + 60 * minute),
+            )
+            for minute in range(1, 10)
+        ])
+        self.read_rollups()
+
+        response = self.client.get("/api/historical-error-data/", {"interval": 60, "range": 15})
+        data = response.json()
+        window = timedelta(minutes=1)  # a twelfth of the range
+        expected = {"client_errors": [], "server_errors": []}
+        for epoch in range(self.base, self.base + 11 * 60 + 1, 60):
+            point = epoch_to_datetime(epoch)
+            events = Event.objects.filter(timestamp__gte=point - window, timestamp__lt=point)
+            total = events.count()
+            if total:
+                client = events.filter(status_code__gte=400, status_code__lt=500).count()
+                server = events.filter(status_code__gte=500).count()
+                expected["client_errors"].append({"x": epoch * 1000, "y": client / total * 100})
+                expected["server_errors"].append({"x": epoch * 1000, "y": server / total * 100})
+        self.assertEqual(data, expected)
+
+
+class ExpiredSecondRollupTests(StoredEventsTestCase):
+    def test_long_ranges_fall_back_to_minute_rollups(self):
+        self.base = floor_epoch(timezone.now() - timedelta(days=2, hours=12), 60)
+        self.store(300)
+        partitions.apply_retention()  # the second rollups of those events expire
+        self.read_rollups()
+
+        # Sub-minute buckets asked for directly, or picked for downsampling
+        for params in ({"interval": 10}, {"max_points": 10000}):
+            response = self.client.get(
+                "/api/historical-throughput-data/", {"range": 3 * 24 * 60, **params}
+            )
+            points = response.json()["data"]
+            self.assertEqual(sum(point["y"] for point in points), 300, params)
+            self.assertTrue(all(point["x"] % 60000 == 0 for point in points), params)
+
+
+class RebuildRollupsTests(StoredEventsTestCase):
+    def rebuild(self):
+        call_command("rebuild_rollups", workers=1, stdout=StringIO(), stderr=StringIO())
+
+    def test_counts_match_events(self):
+        events = self.store(600)
+        live = floor_epoch(timezone.now(), 60)
+        for model in ROLLUP_MODELS:
+            model.objects.update(count=F("count") * 2)
+            model.objects.create(bucket=epoch_to_datetime(self.base - 3600), count=5)
+            model.objects.create(bucket=epoch_to_datetime(live), count=7)
+
+        # Twice: rebuilding replaces buckets rather than adding to them
+        self.rebuild()
+        self.rebuild()
+        for model in ROLLUP_MODELS:
+            expected = Counter(floor_epoch(event.timestamp, model.RESOLUTION) for event in events)
+            rows = {int(row.bucket.timestamp()): row.count for row in model.objects.all()}
+            # The live bucket may still receive events and is left alone
+            self.assertEqual(rows.pop(live), 7)
+            self.assertEqual(rows, dict(expected))
+
+
+class ChartParameterTests(SimpleTestCase):
+    CHART_URLS = [
+        "/api/historical-latency-data/",
+        "/api/historical-latency-percentiles/",
+        "/api/historical-error-data/",
+        "/api/historical-throughput-data/",
+        "/api/method-distribution/",
+        "/api/historical-method-data/",
+        "/api/dashboard-snapshot/",
+    ]
+
+    def assertRejected(self, url, params, message):
+        with self.assertLogs("django.request", "WARNING"):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 400, (url, params))
+        self.assertIn(message, response.json()["message"])
+
+    def test_malformed_values_are_a_bad_request(self):
+        for url in self.CHART_URLS:
+            self.assertRejected(url, {"interval": 0}, "interval must be an integer from 1")
+            self.assertRejected(url, {"range": "abc"}, "range must be an integer from 1")
+            self.assertRejected(url, {"range": 10**12}, "range must be an integer from 1")
+
+    def test_malformed_downsampling_is_a_bad_request(self):
+        url = "/api/historical-latency-data/"
+        self.assertRejected(url, {"max_points": "abc"}, "max_points must be an integer")
+        self.assertRejected(url, {"max_points": -5}, "max_points must be an integer")
+        self.assertRejected(url, {"max_points": 100, "downsample": "mean"}, "downsample must be one of")
+
+
+class RingBufferTests(StoredEventsTestCase):
+    def test_same_buckets_as_the_rollups(self):
+        write_events([
+            Event(
+                method="GET", source="/api/test", duration_ms=0, status_code=200,
+                timestamp=epoch_to_datetime(self.base),
+            )
+        ])
+        self.store(1000)
+        start = epoch_to_datetime(self.base)
+        end = epoch_to_datetime(self.base + 600)
+        self.assertTrue(recent_events.covers(start))
+        for interval in (1, 10, 60, 300):
+            self.assertEqual(
+                recent_events.fetch_buckets(start, end, interval),
+                fetch_rollup_buckets(start, end, interval),
+                interval,
+            )
+
+
+class BucketCacheTests(SimpleTestCase):
+    def setUp(self):
+        # A closed ten minute range, ending on a bucket boundary
+        self.end = epoch_to_datetime(floor_epoch(timezone.now(), 60) - 60)
+        self.start = self.end - timedelta(minutes=10)
+        self.computed = []
+
+    def compute(self, start, end, interval):
+        """One bucket per interval, counting how often each was computed"""
+        self.computed.append(start)
+        buckets = []
+        for epoch in range(floor_epoch(start, interval), floor_epoch(end, interval) + 1, interval):
+            bucket = empty_bucket(epoch_to_datetime(epoch))
+            bucket["count"] = self.computed.count(start)
+            buckets.append(bucket)
+        return buckets
+
+    def fetch(self, cache):
+        return cache.fetch("events", self.start, self.end, 60, self.compute)
+
+    def test_closed_buckets_are_served_from_the_cache(self):
+        cache = BucketCache(LocalBackend(1000), settle_seconds=0)
+        first = self.fetch(cache)
+        self.assertEqual(len(first), 11)
+        self.assertEqual((cache.hits, cache.misses), (0, 10))
+
+        second = self.fetch(cache)
+        self.assertEqual(second, first)
+        # Only the bucket starting at the end of the range is still open
+        self.assertEqual(self.computed, [self.start, self.end])
+        self.assertEqual((cache.hits, cache.misses), (10, 10))
+
+    def test_invalidate_recomputes_from_the_first_forgotten_bucket(self):
+        cache = BucketCache(LocalBackend(1000), settle_seconds=0)
+        self.fetch(cache)
+        late = self.start + timedelta(minutes=4, seconds=30)
+        cache.invalidate(late, late)
+        self.fetch(cache)
+        self.assertEqual(self.computed[-1], self.start + timedelta(minutes=4))
+
+        cache.clear()
+        self.fetch(cache)
+        self.assertEqual(self.computed[-1], self.start)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_shared_cache_is_never_cleared(self):
+        shared = caches["default"]
+        shared.set("someone-elses-key", 1)
+        cache = BucketCache(DjangoCacheBackend("default", timeout=60), settle_seconds=0)
+        self.fetch(cache)
+        self.fetch(cache)
+        self.assertEqual(len(self.computed), 2)
+
+        # Too many keys to delete one by one, so the whole bucket cache goes
+        cache.invalidate(self.start - timedelta(days=30), self.end)
+        self.fetch(cache)
+        self.assertEqual(self.computed[-1], self.start)
+        self.assertEqual(shared.get("someone-elses-key"), 1)
+
+        shared.delete(DjangoCacheBackend.VERSION_KEY)  # e.g. evicted
+        cache.clear()
+        self.fetch(cache)
+        self.assertEqual(self.computed[-1], self.start)
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        event = Event(pk=42, timestamp=datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc))
+        self.assertEqual(decode_cursor(encode_cursor(event)), (event.timestamp, 42))
+
+    def test_malformed(self):
+        for cursor in ["", "abc", "1-2-3", "x-1", "1-y", None, "9" * 30 + "-1"]:
+            self.assertIsNone(decode_cursor(cursor), cursor)
+
+
+class KeysetPaginatorTests(TransactionTestCase):
+    # The page count is read on the executor's own connection, which cannot
+    # see into a TestCase transaction
+
+    def setUp(self):
+        # Pairs of events share a timestamp, so the id has to break ties
+        Event.objects.bulk_create([
+            Event(
+                method="GET", source="/api/test", duration_ms=10, status_code=200,
+                timestamp=NOW - timedelta(seconds=i // 2),
+            )
+            for i in range(25)
+        ])
+        self.newest_first = list(
+            Event.objects.order_by("-timestamp", "-id").values_list("id", flat=True)
+        )
+
+    async def test_walks_every_event_once_in_both_directions(self):
+        paginator = KeysetPaginator(Event.objects.all(), per_page=10)
+        page = await paginator.first()
+        pages = [page]
+        while page.has_next():
+            page = await paginator.after(decode_cursor(page.end_cursor), page.number + 1)
+            pages.append(page)
+        self.assertEqual([event.id for page in pages for event in page], self.newest_first)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+
+        previous = await paginator.before(decode_cursor(pages[2].start_cursor), 2)
+        self.assertEqual([event.id for event in previous], [event.id for event in pages[1]])
+        # Going back from the second page lands on a full first page
+        first = await paginator.before(decode_cursor(pages[1].start_cursor), 1)
+        self.assertEqual([event.id for event in first], self.newest_first[:10])
+        self.assertFalse(first.has_previous())
+
+
+class ParseEventTests(SimpleTestCase):
+    def test_valid_event_with_defaults(self):
+        line = b'{"method": "get", "source": "/a", "duration_ms": 12.0, "status_code": 503}'
+        event = parse_event(line, NOW)
+        self.assertEqual(
+            (event.method, event.source, event.duration_ms, event.status_code),
+            ("GET", "/a", 12, 503),
+        )
+        self.assertEqual((event.timestamp, event.metadata), (NOW, {}))
+        self.assertEqual(len(event.request_id), 36)
+
+    def test_timestamps(self):
+        base = (
+            b'{"method": "GET", "source": "/a", "duration_ms": 1, "status_code": 200, '
+            b'"timestamp": %s}'
+        )
+        self.assertEqual(parse_event(base % b'"2026-10-18T12:00:00"', None).timestamp, NOW)
+        self.assertEqual(parse_event(base % b'"2026-10-18T14:00:00+02:00"', None).timestamp, NOW)
+        self.assertEqual(parse_event(base % str(NOW.timestamp()).encode(), None).timestamp, NOW)
+
+    def test_rejections(self):
+        valid = '"method": "GET", "source": "/a", "duration_ms": 1, "status_code": 200'
+        cases = {
+            b"{not json": "Invalid JSON",
+            b"[1, 2]": "Expected a JSON object",
+            b'{%s, "extra": 1}' % valid.encode(): "Unknown field 'extra'",
+            b'{"method": "GET", "source": "/a", "duration_ms": 1}': "Missing field 'status_code'",
+            b'{"method": "G3T", "source": "/a", "duration_ms": 1, "status_code": 200}': "HTTP method",
+            b'{"method": "GET", "source": "", "duration_ms": 1, "status_code": 200}': "non-empty string",
+            b'{"method": "GET", "source": "/a", "duration_ms": -1, "status_code": 200}': "between",
+            b'{"method": "GET", "source": "/a", "duration_ms": 1.5, "status_code": 200}': "integer",
+            b'{"method": "GET", "source": "/a", "duration_ms": 1, "status_code": true}': "integer",
+            b'{"method": "GET", "source": "/a", "duration_ms": 1, "status_code": 600}': "between",
+            b'{%s, "timestamp": "yesterday"}' % valid.encode(): "timestamp",
+            b'{%s, "request_id": "nope"}' % valid.encode(): "request_id",
+            b'{%s, "metadata": [1]}' % valid.encode(): "metadata",
+        }
+        for line, message in cases.items():
+            with self.assertRaisesMessage(InvalidEvent, message, msg=line):
+                parse_event(line, NOW)
+
+
+class IngestEndpointTests(TransactionTestCase):
+    # The body is stored on the executor's own connection
+
+    def setUp(self):
+        self.addCleanup(bucket_cache.clear)
+        self.addCleanup(recent_events.clear)
+
+    def post(self, lines, **headers):
+        body = "".join(line + "\n" for line in lines)
+        return self.client.post(
+            "/api/ingest/", body, content_type="application/x-ndjson", **headers
+        )
+
+    def assertStored(self, count):
+        self.assertEqual(Event.objects.count(), count)
+        rolled_up = sum(EventMinuteRollup.objects.values_list("count", flat=True))
+        self.assertEqual(rolled_up, count)
+
+    def test_accepts_rejects_and_skips_retries(self):
+        request_id = "0b6e3f4c-9f2a-4d1e-8c5b-6a7d8e9f0a1b"
+        lines = [
+            # A retry of this one gets a new timestamp, defaulted to now
+            '{"method": "GET", "source": "/a", "duration_ms": 5, "status_code": 200, '
+            f'"request_id": "{request_id}"}}',
+            '{"method": "POST", "source": "/b", "duration_ms": 7, "status_code": 500, '
+            '"request_id": "5f0c1d2e-3b4a-4c5d-9e8f-7a6b5c4d3e2f", "timestamp": "%s"}'
+            % timezone.now().isoformat(),
+            '{"method": "PUT", "source": "/c", "duration_ms": 9, "status_code": 404}',
+            '{"method": "GET", "source": "/d"}',
+        ]
+        first = self.post(lines).json()
+        self.assertEqual(
+            (first["status"], first["accepted"], first["rejected"], first["duplicates"]),
+            ("ok", 3, 1, 0),
+        )
+        self.assertEqual(first["errors"], [{"line": 4, "error": "Missing field 'duration_ms'"}])
+        self.assertStored(3)
+
+        # The line without a request_id is a new event every time
+        retry = self.post(lines + lines[:1]).json()
+        self.assertEqual((retry["accepted"], retry["rejected"], retry["duplicates"]), (1, 1, 3))
+        self.assertStored(4)
+        self.assertEqual(Event.objects.filter(request_id=request_id).count(), 1)
+
+    @override_settings(EVENT_INGEST_TOKEN="s3cret")
+    def test_token_required_once_set(self):
+        line = '{"method": "GET", "source": "/a", "duration_ms": 5, "status_code": 200}'
+        with self.assertLogs("django.request", "WARNING"):
+            self.assertEqual(self.post([line]).status_code, 401)
+        response = self.post([line], HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.json()["accepted"], 1)
+        self.assertStored(1)
+
+
+class DownsampleTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.x = np.arange(1000, dtype=np.float64) * 1000
+        self.y = rng.normal(100, 10, size=1000)
+        self.y[417] = 500  # a spike both methods must keep
+
+    def test_lttb_size_and_endpoints(self):
+        indices = downsample.lttb(self.x, self.y, 100)
+        self.assertEqual(len(indices), 100)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertIn(417, indices)
+
+    def test_min_max_size_and_extremes(self):
+        indices = downsample.min_max(self.x, self.y, 100)
+        self.assertLessEqual(len(indices), 100)
+        self.assertIn(int(np.argmin(self.y)), indices)
+        self.assertIn(417, indices)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_reduce_series(self):
+        series = Series()
+        for x, y in zip(self.x.tolist(), self.y.tolist()):
+            series.append(x, y)
+        reduced = downsample.reduce_series(series, 50, "lttb")
+        self.assertEqual(len(reduced), 50)
+        self.assertEqual((reduced.x[0], reduced.x[-1]), (series.x[0], series.x[-1]))
+        self.assertIs(downsample.reduce_series(series, 5000), series)
+        self.assertIs(downsample.reduce_series(series, None), series)
+
+
+def bus_message(epoch, offset, method="GET", duration_ms=100, status_code=200):
+    message_id = epoch * 1_000_000 + offset
+    return {
+        "id": message_id,
+        "data": {"method": method, "duration_ms": duration_ms, "status_code": status_code},
+        "frame": f"id: {message_id}\ndata: {{}}\nevent: api.request\n\n",
+    }
+
+
+class FrameCoalescerTests(SimpleTestCase):
+    def test_one_aggregate_frame_per_interval(self):
+        coalescer = FrameCoalescer(5, 0, {"p50": 0.5})
+        base = int(NOW.timestamp())
+        frames = []
+        events = [(0, 100, 200), (1, 300, 500), (4, 200, 404)]
+        for offset, (second, duration, status) in enumerate(events):
+            message = bus_message(base + second, offset, duration_ms=duration, status_code=status)
+            frames += coalescer.add(message)
+        self.assertEqual(frames, [])
+
+        frames = coalescer.add(bus_message(base + 5, 9))
+        self.assertEqual(len(frames), 1)
+        self.assertTrue(frames[0].startswith(f"id: {(base + 4) * 1_000_000 + 2}\n"))
+        self.assertIn("event: aggregate", frames[0])
+        fields = [
+            '"count":3', '"avg":200.0', '"min":100', '"max":300',
+            '"status_4xx":1', '"status_5xx":1', '"methods":{"GET":3}',
+        ]
+        for field in fields:
+            self.assertIn(field, frames[0])
+
+    def test_raw_frames_are_sampled_without_ids(self):
+        coalescer = FrameCoalescer(5, 2, {})
+        base = int(NOW.timestamp())
+        frames = [frame for offset in range(10) for frame in coalescer.add(bus_message(base, offset))]
+        self.assertEqual(len(frames), 2)
+        self.assertTrue(all(frame.startswith("data: ") for frame in frames))
+
+    def test_close_without_events(self):
+        coalescer = FrameCoalescer(5, 0, {"p50": 0.5})
+        coalescer.seconds_left(NOW.timestamp())
+        frame = coalescer.close(NOW.timestamp() + 5)
+        self.assertTrue(frame.startswith("data: "))
+        self.assertIn('"count":0', frame)
+        self.assertIn('"p50":null', frame)
+
+
+class StreamReplayTests(TransactionTestCase):
+    def setUp(self):
+        start = floor_epoch(timezone.now(), 1) - 60
+        self.events = write_events([
+            Event(
+                method="GET", source=f"/api/items/{i}", duration_ms=10, status_code=200,
+                timestamp=epoch_to_datetime(start + i),
+            )
+            for i in range(6)
+        ])
+        self.ids = [event_id(event.timestamp) for event in self.events]
+        # Only the newest three are still in the bus replay buffer
+        views.event_bus.clear_replay()
+        self.addCleanup(views.event_bus.clear_replay)
+        for event in self.events[3:]:
+            views.event_bus.publish(encode_event_message(event))
+
+    async def stream_ids(self, last_id, count):
+        """Ids of the first `count` frames of a stream resumed after `last_id`"""
+        await views.coordinator.start()
+        try:
+            request = RequestFactory().get("/stream/events/", HTTP_LAST_EVENT_ID=str(last_id))
+            response = await views.event_stream(request)
+            stream = aiter(response.streaming_content)
+            frames = [await anext(stream) for _ in range(count)]
+            await stream.aclose()
+        finally:
+            await views.coordinator.stop()
+            await views.ingest_buffer.drain()
+            await views.coordinator.close()
+        return [int(frame.split(b"\n", 1)[0].removeprefix(b"id: ")) for frame in frames]
+
+    async def test_replays_from_the_buffer_then_streams_live(self):
+        ids = await self.stream_ids(self.ids[3], 3)
+        self.assertEqual(ids[:2], self.ids[4:])
+        self.assertGreater(ids[2], self.ids[-1])
+
+    async def test_tops_up_from_the_database(self):
+        ids = await self.stream_ids(self.ids[1], 5)
+        self.assertEqual(ids[:4], self.ids[2:])
+        self.assertGreater(ids[4], self.ids[-1])
+
+
+class AlertWindowTests(SimpleTestCase):
+    def test_slots_expire_after_the_window(self):
+        window = Window(10, 1000)
+        for second in (1001, 1005, 1005, 1010):
+            self.assertTrue(window.add(second, 100, 500 if second == 1005 else 200))
+        self.assertEqual((window.count, window.errors), (4, 2))
+        self.assertEqual(window.value("error_rate"), 50)
+
+        window.advance(1015)  # 1001 to 1005 expire
+        self.assertEqual((window.count, window.errors, window.duration_sum), (1, 0, 100))
+        self.assertEqual(window.bins, {str(bin_index(100)): 1})
+        self.assertFalse(window.add(1005, 100, 200))
+
+        window.advance(1100)
+        self.assertEqual((window.count, window.bins), (0, {}))
+        self.assertIsNone(window.value("p95_latency"))
+        self.assertEqual(window.value("rate"), 0)
+
+    def test_expired_slots_spill_into_previous_window(self):
+        window = Window(10, 1000)
+        window.spill = Window(10, 990)
+        for second in range(1001, 1011):
+            window.add(second, 10 * (second - 1000), 200)
+        window.advance(1015)
+        self.assertEqual((window.count, window.spill.count), (5, 5))
+        self.assertEqual(window.duration_sum + window.spill.duration_sum, sum(range(10, 110, 10)))
+        self.assertEqual(window.spill.value("avg_latency"), 30)
+
+        # The spill is advanced by its owner, one window behind
+        window.advance(1030)
+        self.assertEqual((window.count, window.spill.count), (0, 10))
+        window.spill.advance(1030 - 10)
+        self.assertEqual(window.spill.count, 0)
+
+    def test_percentiles_follow_the_sketch(self):
+        window = Window(60, 0)
+        for value in range(1, 101):
+            window.add(1, value, 200)
+        self.assertAlmostEqual(window.value("p50_latency"), 50, delta=50 * RELATIVE_ACCURACY)
+        self.assertAlmostEqual(window.value("p99_latency"), 99, delta=99 * RELATIVE_ACCURACY)
+
+
+class AlertEvaluatorTests(SimpleTestCase):
+    def test_firing_rule_goes_to_no_data_when_traffic_stops(self):
+        sent = []
+        evaluator = AlertEvaluator(sent.append)
+        rule = AlertRule(
+            id=1, name="errors", metric="error_rate", threshold=10, window_seconds=10, min_events=5
+        )
+        base = int(NOW.timestamp())
+        evaluator.set_rules([rule], base)
+        for offset in range(10):
+            evaluator.observe(bus_message(base + 10, offset, status_code=500))
+        evaluator.evaluate(base + 10)
+        self.assertEqual([message["data"]["state"] for message in sent], ["firing"])
+        self.assertEqual(len(evaluator.firing_messages()), 1)
+
+        evaluator.evaluate(base + 30)  # The errors have left the window
+        self.assertEqual(sent[-1]["data"]["state"], "no_data")
+        self.assertIsNone(sent[-1]["data"]["value"])
+        self.assertEqual(evaluator.firing_messages(), [])
+        evaluator.evaluate(base + 31)
+        self.assertEqual(len(sent), 2)
+
+        for offset in range(10):
+            evaluator.observe(bus_message(base + 40, offset))
+        evaluator.evaluate(base + 40)
+        self.assertEqual(sent[-1]["data"]["state"], "resolved")
+        self.assertEqual(len(sent), 3)
+
+
+class MetricsEndpointTests(SimpleTestCase):
+    @override_settings(METRICS_TOKEN="", DEBUG=False)
+    def test_hidden_without_a_token_outside_debug(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(METRICS_TOKEN="", DEBUG=True)
+    def test_open_in_debug_without_a_token(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"logwatcher_sse_subscribers", response.content)
+
+    @override_settings(METRICS_TOKEN="s3cret", DEBUG=True)
+    def test_token_required_once_set(self):
+        with self.assertLogs("django.request", "WARNING"):
+            self.assertEqual(self.client.get("/metrics").status_code, 401)
+            wrong = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer nope")
+        self.assertEqual(wrong.status_code, 401)
+        right = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(right.status_code, 200)
+        self.assertTrue(right["Content-Type"].startswith("text/plain; version=0.0.4"))
+
+
+def access_line(moment, path="/api/users/1?v=1", status=200, request_time="0.123", agent="curl/8.0"):
+    stamp = moment.strftime("%d/%b/%Y:%H:%M:%S %z")
+    return f'10.0.0.1 - - [{stamp}] "GET {path} HTTP/1.1" {status} 512 "-" "{agent}" {request_time}\n'
+
+
+class AccessLogParserTests(SimpleTestCase):
+    def test_parses_lines_in_place(self):
+        pacific = dt_timezone(timedelta(hours=-7))
+        data = (
+            access_line(NOW)
+            + "not an access log line\n"
+            + access_line(NOW.astimezone(pacific), path="/api/orders", status=503, request_time="1.0005")
+            + access_line(NOW, agent="a \\x22quoted\\x22 agent")
+        ).encode()
+        parser = AccessLogParser()
+        parsed = list(parser.parse(data, 0, len(data)))
+
+        self.assertEqual(len(parsed), 3)
+        self.assertEqual(parser.unparsed, 1)
+        first, second, third = (event for event, _ in parsed)
+        self.assertEqual(
+            (first.method, first.source, first.duration_ms, first.timestamp),
+            ("GET", "/api/users/1", 123, NOW),
+        )
+        self.assertEqual(
+            (second.source, second.status_code, second.duration_ms), ("/api/orders", 503, 1001)
+        )
+        self.assertEqual(second.timestamp, NOW)
+        self.assertEqual(second.metadata, {"error_type": "server_error"})
+        self.assertEqual(third.metadata, {})
+        # Offsets are just past each line, for checkpoints
+        self.assertEqual([end for _, end in parsed][-1], len(data))
+        self.assertEqual(data[parsed[0][1] - 1:parsed[0][1]], b"\n")
+
+
+class TailCheckpointTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "access.log")
+        self.lines = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def append(self, count, path=None):
+        with open(path or self.path, "a") as f:
+            for _ in range(count):
+                moment = NOW + timedelta(seconds=self.lines)
+                f.write(access_line(moment, path=f"/api/items/{self.lines}"))
+                self.lines += 1
+
+    def tail(self):
+        """One poll from a fresh TailedFile, as after a restart"""
+        tailed = TailedFile(self.path)
+        tailed.open()
+        try:
+            return poll(tailed, AccessLogParser(), batch_size=4)
+        finally:
+            tailed.close()
+
+    def test_resumes_from_checkpoint(self):
+        self.append(10)
+        self.assertEqual(self.tail(), 10)
+        checkpoint = LogCheckpoint.objects.get(path=self.path)
+        self.assertEqual(checkpoint.offset, os.path.getsize(self.path))
+
+        self.assertEqual(self.tail(), 0)
+        self.append(3)
+        with open(self.path, "a") as f:
+            f.write('10.0.0.1 - - [partial')  # not yet a complete line
+        self.assertEqual(self.tail(), 3)
+        self.assertEqual(Event.objects.count(), 13)
+        self.assertEqual(Event.objects.values("source").distinct().count(), 13)
+
+    def test_truncated_file_is_read_from_the_start(self):
+        self.append(5)
+        self.tail()
+        with open(self.path, "w"):
+            pass
+        self.append(2)
+        with self.assertLogs("events.tailing", "WARNING"):
+            self.assertEqual(self.tail(), 2)
+        self.assertEqual(Event.objects.count(), 7)
+
+    def test_rotation_while_stopped_finishes_the_old_file(self):
+        self.append(5)
+        self.tail()
+        self.append(2)  # written before the rotation but never read
+        os.rename(self.path, self.path + ".1")
+        self.append(3)
+
+        tailed = TailedFile(self.path)
+        tailed.open()
+        try:
+            stored = poll(tailed, AccessLogParser(), batch_size=100)
+        finally:
+            tailed.close()
+        self.assertEqual(stored, 5)
+        self.assertEqual(Event.objects.count(), 10)
+        self.assertEqual(LogCheckpoint.objects.get(path=self.path).inode, os.stat(self.path).st_ino)
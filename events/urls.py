@@ -12,11 +12,19 @@ urlpatterns = [
     # Stream endpoint
     path('stream/events/', views.event_stream, name='event_stream'),
     
+    # Monitoring
+    path('metrics', views.metrics_view, name='metrics'),
+
+    # Event ingestion from API gateways
+    path('api/ingest/', views.ingest_events, name='ingest_events'),
+
     # Data API endpoints
     path('api/historical-latency-data/', views.get_historical_latency_data, name='historical_latency'),
+    path('api/historical-latency-percentiles/', views.get_historical_latency_percentiles, name='historical_latency_percentiles'),
     path('api/event-rows/', views.table_rows, name='table_rows'),
     path('api/historical-error-data/', views.get_historical_error_data, name='historical_error_data'),
     path('api/historical-throughput-data/', views.get_historical_throughput_data, name='historical_throughput_data'),
     path('api/method-distribution/', views.get_method_distribution, name='method_distribution'),
     path('api/historical-method-data/', views.get_historical_method_data, name='historical_method_data'),
+    path('api/dashboard-snapshot/', views.get_dashboard_snapshot, name='dashboard_snapshot'),
 ] 
@@ -1,93 +1,71 @@
 import asyncio
-from itertools import count
 from django.shortcuts import render
-from django.http import JsonResponse, StreamingHttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from .models import Event
+from .alerts import AlertEvaluator
+from .bus import EventBus
+from .generator import EventGenerator
+from .ingest import IngestBuffer, ingest_lines
+from .ndjson import gunzip, read_chunks, split_lines
+from .pagination import KeysetPaginator, decode_cursor
+from .filters import filter_context, filter_events, parse_filters
+from .ringbuffer import recent_events
+from .buckets import epoch_to_datetime, floor_epoch, regroup_buckets
+from . import rollups
+from .cache import bucket_cache
+from .coalesce import FrameCoalescer
+from . import downsample
+from .coordination import announce_ingested, build_coordinator
+from .executor import run_sync
+from .encoding import Series, api_response
+from .instrumentation import metrics
+from .methods import method_breakdown, method_totals
+from .sketch import quantiles
+from .stream import encode_event_message, event_id, event_id_time
+import hmac
+from functools import wraps
 import random
 import time
-from django.db.models import Avg, Min, Count
 import json
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models.functions import (
-    ExtractMinute, ExtractSecond, ExtractHour
-)
-from django.db.models import IntegerField
-from django.db.models.expressions import ExpressionWrapper
-from django.core.paginator import Paginator
-from asgiref.sync import sync_to_async, async_to_sync
-from django.db import models
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 import logging
 import markdown2
 
-# Global flag to control event generation
-is_generating = False
-generation_start_time = None
-auto_stop_task = None
-
 logger = logging.getLogger(__name__)
 
-# Create async versions of all database operations
-create_event_async = sync_to_async(Event.objects.create)
-save_event_async = sync_to_async(lambda x: x.save())
-get_events_async = sync_to_async(Event.objects.filter)
-paginate_async = sync_to_async(Paginator)
+ingest_buffer = IngestBuffer()
+event_generator = EventGenerator()
+
+# Latency percentiles charted from the rollup sketches
+LATENCY_PERCENTILES = {'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+
+# Bucket fields behind the error-rate series
+ERROR_FIELDS = ['count', 'status_4xx', 'status_5xx']
+
+# Largest ?interval= the chart APIs accept: one bucket per day
+MAX_INTERVAL_SECONDS = 86400
 
 async def generate_event_async():
     """Async version of generate_event"""
-    ENDPOINTS = [
-        "/api/users",
-        "/api/products",
-        "/api/orders",
-    ]
-
-    API_PATTERNS = [
-        {"method": "GET", "duration_range": (50, 200), "weight": 60},
-        {"method": "POST", "duration_range": (100, 400), "weight": 25},
-        {"method": "PUT", "duration_range": (80, 300), "weight": 10},
-        {"method": "DELETE", "duration_range": (50, 150), "weight": 5},
-    ]
-
-    STATUS_PATTERNS = [
-        {"code": 200, "weight": 85, "message": "Success"},
-        {"code": 201, "weight": 5, "message": "Created"},
-        {"code": 400, "weight": 4, "message": "Bad request format"},
-        {"code": 404, "weight": 4, "message": "Resource not found"},
-        {"code": 500, "weight": 2, "message": "Internal server error"},
-    ]
-
-    pattern = random.choices(API_PATTERNS, weights=[p["weight"] for p in API_PATTERNS])[0]
-    status = random.choices(STATUS_PATTERNS, weights=[s["weight"] for s in STATUS_PATTERNS])[0]
-
-    event = await create_event_async(
-        method=pattern["method"],
-        source=random.choice(ENDPOINTS),
-        duration_ms=random.randint(*pattern["duration_range"]),
-        status_code=status["code"],
-        metadata={},
-    )
-
-    error_details = None
-    if event.status_code >= 400:
-        if event.status_code == 404:
-            error_details = f"The requested resource at {event.source} does not exist"
-        elif event.status_code == 400:
-            error_details = f"Invalid parameters provided for {event.source}"
-        elif event.status_code == 500:
-            error_details = f"Server encountered an error processing request to {event.source}"
-
-        event.metadata = {
-            'error_type': 'server_error' if event.status_code >= 500 else 'client_error',
-            'error_message': f"{status['message']} for {event.method} request to {event.source}",
-            'error_details': error_details
-        }
-        await save_event_async(event)
+    # Built complete in memory and written in batches by the ingest buffer
+    event = event_generator.build(1)[0]
+    # The SSE id is the timestamp, so it must move past every id streamed so
+    # far: two events in one microsecond, a clock stepping back or a new
+    # producer with a slower clock would otherwise repeat or reorder ids
+    newest = event_bus.newest_id
+    if newest is not None and event_id(event.timestamp) <= newest:
+        event.timestamp = event_id_time(newest + 1)
+    ingest_buffer.add(event)
 
     return event
 
-def dashboard(request):
+async def dashboard(request):
     """Main view that renders the monitoring dashboard"""
-    global is_generating
+    state = await coordinator.current_state()
 
     # Read and convert README.md to HTML
     with open("README.md", "r") as f:
@@ -96,200 +74,366 @@ def dashboard(request):
     return render(
         request,
         "dashboard/index.html",
-        {"is_generating": is_generating, "readme_content": readme_content},
+        {"is_generating": state.is_active(), "readme_content": readme_content},
     )
 
-def table_rows(request):
-    """HTMX endpoint for paginated table rows"""
-    page_number = request.GET.get("page", 1)
-    paginator = Paginator(Event.objects.all().order_by("-timestamp"), 15)
-    events = paginator.get_page(page_number)
-    return render(request, "dashboard/table/base.html", {"events": events})
-
-async def stop_generation_after_delay():
-    """Background task to stop generation after 15 minutes"""
+async def table_rows(request):
+    """HTMX endpoint for keyset-paginated table rows, optionally filtered"""
+    filters = parse_filters(request.GET)
+    paginator = KeysetPaginator(filter_events(Event.objects.all(), filters), 15)
     try:
-        await asyncio.sleep(15 * 60)  # 15 minutes
-        global is_generating
-        if is_generating:
-            logger.info("Auto-stopping generation after 15 minutes")
-            is_generating = False
-    except asyncio.CancelledError:
-        logger.info("Auto-stop task cancelled")
-
-async def async_start_generation():
-    """Async helper for starting generation"""
-    global is_generating, generation_start_time, auto_stop_task
-    
-    is_generating = True
-    generation_start_time = timezone.now()
-    
-    # Cancel any existing auto-stop task
-    if auto_stop_task and not auto_stop_task.done():
-        auto_stop_task.cancel()
-    
-    # Create new auto-stop task
-    loop = asyncio.get_event_loop()
-    auto_stop_task = loop.create_task(stop_generation_after_delay())
-    
-    return {"status": "started"}
-
-def start_generation(request):
-    """API endpoint to start event generation"""
-    global is_generating
+        page_number = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page_number = 1
+
+    after = decode_cursor(request.GET.get("after"))
+    before = decode_cursor(request.GET.get("before"))
+    if after:
+        events = await paginator.after(after, page_number)
+    elif before:
+        events = await paginator.before(before, page_number)
+    elif request.GET.get("last"):
+        events = await paginator.last()
+    else:
+        events = await paginator.first()
+    return render(
+        request, "dashboard/table/base.html", {"events": events, **filter_context(filters)}
+    )
+
+async def start_generation(request):
+    """API endpoint to start event generation, in every worker"""
     logger.info("Start generation requested")
-    
+
     try:
-        # Convert async function to sync
-        result = async_to_sync(async_start_generation)()
-        logger.info("Generation started with 15-minute auto-stop")
-        return JsonResponse(result)
+        state = await coordinator.start()
+        logger.info("Generation started until %s", state.expires_at.isoformat())
+        return JsonResponse({"status": "started", "expires_at": state.expires_at.isoformat()})
     except Exception as e:
         logger.error(f"Error starting generation: {str(e)}")
         return JsonResponse({"status": "error", "message": str(e)}, status=500)
 
-def stop_generation(request):
-    """API endpoint to stop event generation"""
-    global is_generating, generation_start_time, auto_stop_task
+async def stop_generation(request):
+    """API endpoint to stop event generation, in every worker"""
     logger.info("Stop generation requested")
-    
-    is_generating = False
-    generation_start_time = None
-    
-    # Cancel auto-stop task if it exists
-    if auto_stop_task and not auto_stop_task.done():
-        try:
-            # We're in a sync context, so we need to get the event loop
-            loop = asyncio.get_event_loop()
-            loop.call_soon_threadsafe(auto_stop_task.cancel)
-        except Exception as e:
-            logger.error(f"Error cancelling auto-stop task: {str(e)}")
-    
-    auto_stop_task = None
+
+    await coordinator.stop()
     logger.info("Generation stopped")
     return JsonResponse({"status": "stopped"})
 
-def get_historical_latency_data(request):
-    interval_seconds = int(request.GET.get("interval", "60"))
-    range_minutes = int(request.GET.get('range', '15'))
+@csrf_exempt
+@require_POST
+async def ingest_events(request):
+    """
+    Bulk ingestion for API gateways: newline-delimited JSON events, one per
+    line, optionally gzip'd with Content-Encoding: gzip. The body is parsed
+    as it is read and stored in batches; the response has accepted, rejected
+    and duplicate counts per batch and the first rejected lines.
+    """
+    token = settings.EVENT_INGEST_TOKEN
+    if token and not hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()
+    ):
+        return JsonResponse({'status': 'error', 'message': 'Invalid or missing ingest token'}, status=401)
+
+    encoding = request.headers.get('Content-Encoding', 'identity').strip().lower()
+    if encoding not in ('identity', 'gzip', 'x-gzip'):
+        return JsonResponse(
+            {'status': 'error', 'message': f'Unsupported Content-Encoding {encoding!r}'}, status=415
+        )
+
+    started = time.perf_counter()
+    summary = await run_sync(ingest_body, request, encoding != 'identity')
+    seconds = time.perf_counter() - started
+    logger.info(
+        "Ingested %d events (%d rejected, %d duplicates) in %.2fs",
+        summary['accepted'], summary['rejected'], summary['duplicates'], seconds,
+    )
+    return JsonResponse(
+        {
+            'status': 'error' if 'error' in summary else 'ok',
+            **summary,
+            'seconds': round(seconds, 3),
+            'events_per_second': round(summary['accepted'] / seconds) if seconds else None,
+        },
+        status=400 if 'error' in summary else 200,
+    )
+
+def ingest_body(request, gzipped):
+    """Read, parse and store a request body of NDJSON events; runs on the executor"""
+    chunks = read_chunks(request)
+    if gzipped:
+        chunks = gunzip(chunks)
+    return ingest_lines(
+        split_lines(chunks), settings.EVENT_INGEST_BATCH_SIZE, on_batch=announce_ingested
+    )
+
+def error_window_for(range_minutes):
+    # Scale window size based on timeframe
+    # Use ~1/12 of the total range as the window size
+    return timedelta(minutes=max(1, range_minutes // 12))
+
+def latency_points(buckets):
+    points = Series()
+    for bucket in buckets:
+        points.append(
+            bucket['timestamp'].timestamp() * 1000,
+            round(bucket['duration_sum'] / bucket['count'], 2),
+        )
+    return points
+
+def latency_percentile_points(buckets):
+    series = {name: Series() for name in LATENCY_PERCENTILES}
+    for bucket in buckets:
+        values = quantiles(bucket['duration_sketch'], list(LATENCY_PERCENTILES.values()))
+        if values[0] is None:
+            continue  # rolled up before sketches were recorded
+        x = bucket['timestamp'].timestamp() * 1000
+        for name, value in zip(LATENCY_PERCENTILES, values):
+            series[name].append(x, round(value, 2))
+    return series
+
+def throughput_points(buckets, interval_seconds):
+    points = Series()
+    for bucket in buckets:
+        # Convert to requests per minute
+        points.append(bucket['timestamp'].timestamp() * 1000, (bucket['count'] * 60) / interval_seconds)
+    return points
+
+def error_rate_points(windows):
+    client_errors, server_errors = Series(), Series()
+    for current_time, totals in windows:
+        total = totals['count']
+        if total > 0:
+            x = current_time.timestamp() * 1000
+            client_errors.append(x, (totals['status_4xx'] / total) * 100)
+            server_errors.append(x, (totals['status_5xx'] / total) * 100)
+    return {'client_errors': client_errors, 'server_errors': server_errors}
+
+class InvalidParameter(Exception):
+    """A malformed chart API query parameter, answered with a 400"""
+
+def chart_api(view):
+    """Answer an InvalidParameter raised while `view` reads its parameters with a 400"""
+    @wraps(view)
+    async def wrapped(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except InvalidParameter as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return wrapped
+
+def query_int(request, name, default, maximum=None):
+    """?name= as a positive integer of at most `maximum`, or `default` when absent"""
+    value = request.GET.get(name)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = None
+    if number is None or number < 1 or (maximum is not None and number > maximum):
+        bounds = f'from 1 to {maximum}' if maximum is not None else 'of at least 1'
+        raise InvalidParameter(f'{name} must be an integer {bounds}')
+    return number
+
+def chart_range(request):
+    """(?interval= in seconds, ?range= in minutes), at most a day and the retention period"""
+    return (
+        query_int(request, 'interval', 60, maximum=MAX_INTERVAL_SECONDS),
+        query_int(request, 'range', 15, maximum=settings.EVENT_RETENTION_DAYS * 24 * 60),
+    )
 
-    print(f"\n=== Historical Latency Data Request ===")
-    print(f"Interval: {interval_seconds}s, Range: {range_minutes}m")
+def downsampling(request, interval_seconds, range_minutes):
+    """
+    (bucket interval, max_points, method) for ?max_points=&downsample=. With
+    max_points the buckets are fetched finer than ?interval= and reduced with
+    LTTB (default) or min/max, so long ranges keep their spikes.
+    """
+    max_points = query_int(request, 'max_points', None)
+    if max_points is None:
+        return interval_seconds, None, None
+    max_points = min(max(max_points, 3), downsample.MAX_POINTS_LIMIT)
+    method = request.GET.get('downsample') or 'lttb'
+    if method not in downsample.METHODS:
+        raise InvalidParameter(f"downsample must be one of {', '.join(downsample.METHODS)}")
+    return downsample.fine_interval(range_minutes * 60, max_points), max_points, method
+
+@chart_api
+async def get_historical_latency_data(request):
+    interval_seconds, range_minutes = chart_range(request)
+    interval_seconds, max_points, method = downsampling(request, interval_seconds, range_minutes)
 
     now = timezone.now()
     start_time = now - timedelta(minutes=range_minutes)
+    interval_seconds = rollups.readable_interval(start_time, interval_seconds)
 
-    events = Event.objects.filter(timestamp__gte=start_time).order_by('timestamp')
-    print(f"Total events in range: {events.count()}")
-
-    if interval_seconds < 60:  # Sub-minute intervals
-        print(f"Using sub-minute interval bucketing")
-        aggregated_data = (
-            events.annotate(
-                bucket=ExpressionWrapper(
-                    (ExtractHour('timestamp') * 3600 + 
-                     ExtractMinute('timestamp') * 60 + 
-                     ExtractSecond('timestamp')) / interval_seconds,
-                    output_field=IntegerField()
-                )
-            )
-            .values('bucket')
-            .annotate(
-                avg_latency=Avg('duration_ms'),
-                timestamp=Min('timestamp')
-            )
-            .order_by('bucket')
-        )
-    else:  # Minute-based intervals
-        print(f"Using minute-based interval bucketing")
-        minutes_fraction = interval_seconds // 60
-        aggregated_data = (
-            events.annotate(
-                bucket=ExpressionWrapper(
-                    (ExtractHour('timestamp') * 60 + ExtractMinute('timestamp')) / minutes_fraction,
-                    output_field=IntegerField()
-                )
-            )
-            .values('bucket')
-            .annotate(
-                avg_latency=Avg('duration_ms'),
-                timestamp=Min('timestamp')
-            )
-            .order_by('bucket')
-        )
+    buckets = await run_sync(rollups.fetch_buckets, start_time, now, interval_seconds)
+    logger.debug(
+        "Latency data: interval=%ss range=%sm buckets=%d",
+        interval_seconds, range_minutes, len(buckets),
+    )
 
-    data = list(aggregated_data)
-    print(f"Number of buckets after aggregation: {len(data)}")
-    if len(data) > 0:
-        print(f"First bucket: {data[0]}")
-        print(f"Last bucket: {data[-1]}")
-        print(f"Bucket values: {[d['bucket'] for d in data[:5]]}...")
-
-    return JsonResponse({
-        'data': [
-            {
-                'x': entry['timestamp'].timestamp() * 1000,
-                'y': round(entry['avg_latency'], 2) if entry['avg_latency'] else 0
-            } for entry in data
-        ]
-    })
+    points = downsample.reduce_series(latency_points(buckets), max_points, method)
+    return api_response(request, {'data': points})
 
-def get_historical_error_data(request):
-    interval_seconds = int(request.GET.get("interval", "60"))
-    range_minutes = int(request.GET.get('range', '15'))
-    
-    # Scale window size based on timeframe
-    # Use ~1/12 of the total range as the window size
-    window_minutes = max(1, range_minutes // 12)
-    window_size = timedelta(minutes=window_minutes)
+@chart_api
+async def get_historical_latency_percentiles(request):
+    interval_seconds, range_minutes = chart_range(request)
+    interval_seconds, max_points, method = downsampling(request, interval_seconds, range_minutes)
 
     now = timezone.now()
     start_time = now - timedelta(minutes=range_minutes)
-    events = Event.objects.filter(timestamp__gte=start_time).order_by('timestamp')
-
-    data_points = []
-    current_time = start_time
-    
-    while current_time <= now:
-        window_start = current_time - window_size
-        window_events = events.filter(
-            timestamp__gt=window_start,
-            timestamp__lte=current_time
-        )
-        
-        total = window_events.count()
-        if total > 0:
-            client_errors = window_events.filter(status_code__gte=400, status_code__lt=500).count()
-            server_errors = window_events.filter(status_code__gte=500).count()
-            
-            data_points.append({
-                'timestamp': current_time,
-                'client_error_rate': (client_errors / total) * 100,
-                'server_error_rate': (server_errors / total) * 100
-            })
-        
-        current_time += timedelta(seconds=interval_seconds)
-
-    return JsonResponse({
-        'client_errors': [
-            {
-                'x': point['timestamp'].timestamp() * 1000,
-                'y': point['client_error_rate']
-            } for point in data_points
-        ],
-        'server_errors': [
-            {
-                'x': point['timestamp'].timestamp() * 1000,
-                'y': point['server_error_rate']
-            } for point in data_points
-        ]
-    })
+    interval_seconds = rollups.readable_interval(start_time, interval_seconds)
+
+    # Each bucket's sketch is already merged from its rollup rows, so this
+    # scales with the number of buckets rather than events
+    buckets = await run_sync(rollups.fetch_buckets, start_time, now, interval_seconds)
+
+    series = latency_percentile_points(buckets)
+    return api_response(request, downsample.reduce_all(series, max_points, method))
+
+@chart_api
+async def get_historical_error_data(request):
+    interval_seconds, range_minutes = chart_range(request)
+    interval_seconds, max_points, method = downsampling(request, interval_seconds, range_minutes)
+
+    now = timezone.now()
+    start_time = now - timedelta(minutes=range_minutes)
+    interval_seconds = rollups.readable_interval(start_time, interval_seconds)
+
+    # One rollup fetch, then an in-memory sliding window over prefix sums
+    windows = await run_sync(
+        rollups.sliding_window_sums,
+        start_time, now, interval_seconds, error_window_for(range_minutes),
+        fields=ERROR_FIELDS,
+    )
+
+    series = error_rate_points(windows)
+    return api_response(request, downsample.reduce_all(series, max_points, method))
+
+@chart_api
+async def get_dashboard_snapshot(request):
+    """Initial data for every chart, computed from a single bucket fetch"""
+    interval_seconds, range_minutes = chart_range(request)
+
+    now = timezone.now()
+    start_time = now - timedelta(minutes=range_minutes)
+    interval_seconds = rollups.readable_interval(start_time, interval_seconds)
+
+    snapshot = await run_sync(
+        dashboard_snapshot, start_time, now, interval_seconds, error_window_for(range_minutes)
+    )
+    return api_response(request, snapshot)
+
+def dashboard_snapshot(start_time, now, interval_seconds, window_size):
+    # Fetch at a resolution fine enough for the error-rate windows, starting
+    # at the first chart bucket, then regroup for the per-interval series
+    resolution = rollups.window_resolution(interval_seconds, window_size)
+    fine = rollups.fetch_buckets(
+        epoch_to_datetime(floor_epoch(start_time, interval_seconds)), now, resolution
+    )
+    buckets = regroup_buckets(fine, interval_seconds)
+    windows = rollups.window_sums(
+        fine, resolution, start_time, now, interval_seconds, window_size, ERROR_FIELDS
+    )
+
+    totals = method_totals(buckets)
+    distribution = sorted(totals.items(), key=lambda item: -item[1])
+
+    return {
+        'latency': {'data': latency_points(buckets)},
+        'latency_percentiles': latency_percentile_points(buckets),
+        'errors': error_rate_points(windows),
+        'throughput': {'data': throughput_points(buckets, interval_seconds)},
+        'method_distribution': {
+            'labels': [method for method, _ in distribution],
+            'data': [count for _, count in distribution],
+        },
+        'method_data': {
+            'data': [totals.get(method, 0) for method in Event.HTTP_METHODS],
+        },
+    }
+
+async def produce_event_message():
+    """Generate and persist one event, encoding its SSE frame once for every subscriber"""
+    if not await coordinator.acquire_producer():
+        # Another worker generates; its events arrive through relay_event
+        return None
+
+    event = await generate_event_async()
+    if not event:
+        logger.warning("No event generated")
+        return None
+
+    message = encode_event_message(event)
+    await coordinator.publish(message['data'])
+    alert_evaluator.observe(message)
+    return message
+
+def relay_event(event):
+    """Stream an event generated by another worker to this worker's subscribers"""
+    message = encode_event_message(event)
+    alert_evaluator.observe(message)
+    event_bus.publish(message)
+
+def parse_last_event_id(request):
+    """Last-Event-ID as sent by a reconnecting EventSource, or ?last_event_id= for a new one"""
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+async def replay_messages(last_id):
+    """
+    Messages for the events after `last_id`: from the bus replay buffer when
+    it reaches back that far, otherwise topped up from the database. At most
+    EVENT_STREAM_REPLAY_SIZE, keeping the newest.
+    """
+    buffered, complete = event_bus.replay_after(last_id)
+    buffered = buffered[-settings.EVENT_STREAM_REPLAY_SIZE:]
+    missing = settings.EVENT_STREAM_REPLAY_SIZE - len(buffered)
+    if complete or missing <= 0:
+        return buffered
+
+    events = Event.objects.filter(timestamp__gt=event_id_time(last_id))
+    if buffered:
+        events = events.filter(timestamp__lt=event_id_time(buffered[0]['id']))
+    newest = [event async for event in events.order_by('-timestamp', '-id')[:missing]]
+    return [encode_event_message(event) for event in reversed(newest)] + buffered
+
+# Exponential distribution with mean of 0.8 seconds, ~75 events per minute on average
+MEAN_INTERVAL = 0.8
+
+# How often a worker that is not the producer retries to take over
+PRODUCER_RETRY_SECONDS = 1.0
+
+coordinator = build_coordinator(
+    on_event=relay_event,
+    on_stopped=lambda: event_bus.stop(),
+    on_gap=lambda: event_bus.clear_replay(),
+)
+
+event_bus = EventBus(
+    produce=produce_event_message,
+    is_active=coordinator.is_generating,
+    next_delay=lambda: (
+        random.expovariate(1.0 / MEAN_INTERVAL) if coordinator.is_producer else PRODUCER_RETRY_SECONDS
+    ),
+    on_stop=coordinator.release_producer,
+    replay_size=settings.EVENT_STREAM_REPLAY_SIZE,
+)
+
+# Every worker sees every event on its bus, so each evaluates the rules itself
+alert_evaluator = AlertEvaluator(broadcast=event_bus.broadcast)
 
 async def event_stream(request):
     logger.info("SSE connection attempted")
-    global is_generating
 
-    if not is_generating:
+    await coordinator.ensure_listening()
+    alert_evaluator.ensure_running()
+    state = await coordinator.current_state()
+    if not state.is_active():
         logger.info("Stream requested but generation is stopped")
         return StreamingHttpResponse(
             content_type='text/event-stream',
@@ -297,42 +441,94 @@ async def event_stream(request):
         )
 
     try:
-        async def event_stream_generator():
-            logger.info("Starting event stream generator")
-            MEAN_INTERVAL = 0.8  # ~75 events per minute on average
-
-            while True:
-                try:
-                    if not is_generating:
-                        logger.info("Generation stopped, breaking stream")
+        # ?mode=aggregate sends one frame per interval with the bucket
+        # statistics, plus a rate-limited sample of raw events (e.g. for the table)
+        aggregate = request.GET.get('mode') == 'aggregate'
+        if aggregate:
+            interval_seconds = max(int(request.GET.get('interval', '5')), 1)
+            raw_per_second = max(float(request.GET.get('raw', '5')), 0)
+
+        # Subscribe before reading the replay buffer so nothing published in
+        # between is lost; overlap is skipped by id below
+        subscription = event_bus.subscribe()
+        last_id = parse_last_event_id(request)
+        try:
+            backlog = await replay_messages(last_id) if last_id is not None else []
+        except Exception:
+            event_bus.unsubscribe(subscription)
+            raise
+        if backlog:
+            logger.info("Replaying %d events after %s", len(backlog), last_id)
+        # Already sent, but may still arrive through the subscription: the
+        # replayed messages if they were published between subscribing and
+        # reading the replay buffer, and the client's last event if this
+        # worker has not relayed it yet. Matched by id rather than by order,
+        # so a live event is never dropped for having a smaller id.
+        replayed = {message['id'] for message in backlog}
+        if last_id is not None:
+            replayed.add(last_id)
+        # Alerts already firing, then transitions as they happen
+        alerts = [message['frame'] for message in alert_evaluator.firing_messages()]
+
+        async def aggregate_stream_generator(interval_seconds, raw_per_second):
+            logger.info("Starting aggregate stream subscriber")
+            coalescer = FrameCoalescer(interval_seconds, raw_per_second, LATENCY_PERCENTILES)
+            try:
+                for frame in alerts:
+                    yield frame
+                for message in backlog:
+                    for frame in coalescer.add(message):
+                        yield frame
+                while True:
+                    try:
+                        message = await asyncio.wait_for(
+                            subscription.get(), coalescer.seconds_left(time.time())
+                        )
+                    except asyncio.TimeoutError:
+                        yield coalescer.close(time.time())
+                        continue
+                    if message is None:
+                        logger.info("Subscription closed, breaking stream")
                         break
+                    if message['id'] is None:
+                        yield message['frame']
+                        continue
+                    if replayed and message['id'] in replayed:
+                        replayed.discard(message['id'])
+                        continue
+                    for frame in coalescer.add(message):
+                        yield frame
+            finally:
+                event_bus.unsubscribe(subscription)
 
-                    logger.info("Generating event...")
-                    event = await generate_event_async()
-                    if not event:
-                        logger.warning("No event generated")
+        async def event_stream_generator():
+            logger.info("Starting event stream subscriber")
+            try:
+                for frame in alerts:
+                    yield frame
+                for message in backlog:
+                    yield message['frame']
+                while True:
+                    message = await subscription.get()
+                    if message is None:
+                        logger.info("Subscription closed, breaking stream")
+                        break
+                    if message['id'] is None:
+                        yield message['frame']
                         continue
+                    if replayed and message['id'] in replayed:
+                        replayed.discard(message['id'])
+                        continue
+                    yield message['frame']
+            finally:
+                event_bus.unsubscribe(subscription)
 
-                    event_data = {
-                        'timestamp': event.timestamp.isoformat(),
-                        'method': event.method,
-                        'source': event.source,
-                        'status_code': event.status_code,
-                        'duration_ms': event.duration_ms,
-                        'metadata': event.metadata
-                    }
-
-                    yield f"data: {json.dumps(event_data)}\nevent: api.request\n\n"
-                    # Exponential distribution with mean of 0.8 seconds
-                    await asyncio.sleep(random.expovariate(1.0/MEAN_INTERVAL))
-                except Exception as e:
-                    logger.error(f"Error in generator: {str(e)}")
-                    break
-
-        response = StreamingHttpResponse(
-            event_stream_generator(),
-            content_type='text/event-stream'
-        )
+        if aggregate:
+            content = aggregate_stream_generator(interval_seconds, raw_per_second)
+        else:
+            content = event_stream_generator()
+
+        response = StreamingHttpResponse(content, content_type='text/event-stream')
         response['Cache-Control'] = 'no-cache'
         response['X-Accel-Buffering'] = 'no'
         return response
@@ -344,92 +540,93 @@ async def event_stream(request):
         )
 
 
-def get_historical_throughput_data(request):
-    interval_seconds = int(request.GET.get("interval", "60"))
-    range_minutes = int(request.GET.get("range", "15"))
+@chart_api
+async def get_historical_throughput_data(request):
+    interval_seconds, range_minutes = chart_range(request)
+    interval_seconds, max_points, method = downsampling(request, interval_seconds, range_minutes)
 
     now = timezone.now()
     start_time = now - timedelta(minutes=range_minutes)
+    interval_seconds = rollups.readable_interval(start_time, interval_seconds)
 
-    events = Event.objects.filter(timestamp__gte=start_time).order_by("timestamp")
-
-    if interval_seconds < 60:  # Sub-minute intervals
-        aggregated_data = (
-            events.annotate(
-                bucket=ExpressionWrapper(
-                    (
-                        ExtractHour("timestamp") * 3600
-                        + ExtractMinute("timestamp") * 60
-                        + ExtractSecond("timestamp")
-                    )
-                    / interval_seconds,
-                    output_field=IntegerField(),
-                )
-            )
-            .values("bucket")
-            .annotate(count=Count("id"), timestamp=Min("timestamp"))
-            .order_by("bucket")
-        )
-    else:  # Minute-based intervals
-        minutes_fraction = interval_seconds // 60
-        aggregated_data = (
-            events.annotate(
-                bucket=ExpressionWrapper(
-                    (ExtractHour("timestamp") * 60 + ExtractMinute("timestamp"))
-                    / minutes_fraction,
-                    output_field=IntegerField(),
-                )
-            )
-            .values("bucket")
-            .annotate(count=Count("id"), timestamp=Min("timestamp"))
-            .order_by("bucket")
-        )
+    buckets = await run_sync(rollups.fetch_buckets, start_time, now, interval_seconds)
 
-    return JsonResponse(
-        {
-            "data": [
-                {
-                    "x": entry["timestamp"].timestamp() * 1000,
-                    "y": (entry["count"] * 60)
-                    / interval_seconds,  # Convert to requests per minute
-                }
-                for entry in aggregated_data
-            ]
-        }
-    )
+    points = throughput_points(buckets, interval_seconds)
+    return api_response(request, {'data': downsample.reduce_series(points, max_points, method)})
 
-def get_method_distribution(request):
-    range_minutes = int(request.GET.get('range', '15'))
-    start_time = timezone.now() - timedelta(minutes=range_minutes)
-    
-    method_counts = (Event.objects.filter(timestamp__gte=start_time)
-                    .values('method')
-                    .annotate(count=Count('method'))
-                    .order_by('-count'))
-    
-    return JsonResponse({
-        'labels': [item['method'] for item in method_counts],
-        'data': [item['count'] for item in method_counts],
+@chart_api
+async def get_method_distribution(request):
+    interval_seconds, range_minutes = chart_range(request)
+    now = timezone.now()
+    start_time = now - timedelta(minutes=range_minutes)
+    interval_seconds = rollups.readable_interval(start_time, interval_seconds)
+
+    # Counts only, so no percentiles: the same totals as the dashboard snapshot
+    buckets = await run_sync(rollups.fetch_buckets, start_time, now, interval_seconds)
+    distribution = sorted(method_totals(buckets).items(), key=lambda item: -item[1])
+
+    return api_response(request, {
+        'labels': [method for method, _ in distribution],
+        'data': [count for _, count in distribution],
     })
 
-def get_historical_method_data(request):
-    range_minutes = int(request.GET.get('range', '15'))
-    start_time = timezone.now() - timedelta(minutes=range_minutes)
-    
-    events = Event.objects.filter(timestamp__gte=start_time)
-    
-    method_counts = {
-        'GET': events.filter(method='GET').count(),
-        'POST': events.filter(method='POST').count(),
-        'PUT': events.filter(method='PUT').count(),
-        'DELETE': events.filter(method='DELETE').count(),
+@chart_api
+async def get_historical_method_data(request):
+    interval_seconds, range_minutes = chart_range(request)
+    now = timezone.now()
+    start_time = now - timedelta(minutes=range_minutes)
+    interval_seconds = rollups.readable_interval(start_time, interval_seconds)
+
+    breakdown = await run_sync(method_breakdown, start_time, now, interval_seconds)
+    stats = breakdown['stats']
+
+    return api_response(request, {
+        # Standard methods in chart order
+        'data': [stats[method]['count'] for method in Event.HTTP_METHODS],
+        'methods': breakdown['methods'],
+        'stats': stats,
+        'series': breakdown['series'],
+    })
+
+async def metrics_view(request):
+    """
+    Prometheus scrape endpoint for the per-endpoint request metrics. Only
+    scrapers sending METRICS_TOKEN get them; without a token they are
+    served in DEBUG only.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=404)
+    elif not hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()
+    ):
+        return HttpResponse('Invalid or missing metrics token\n', status=401, content_type='text/plain')
+
+    cache_stats = bucket_cache.stats()
+    alert_stats = alert_evaluator.stats()
+    gauges = {
+        'logwatcher_bucket_cache_hits': ('Chart buckets served from the bucket cache', cache_stats['hits']),
+        'logwatcher_bucket_cache_misses': ('Chart buckets recomputed', cache_stats['misses']),
+        'logwatcher_sse_subscribers': ('Connected SSE subscribers', event_bus.subscriber_count),
+        'logwatcher_ingest_pending_events': ('Events waiting to be written', ingest_buffer.pending_count),
+        'logwatcher_ring_buffer_events': ('Events held in the in-memory ring buffer', recent_events.size),
+        'logwatcher_alert_rules': ('Enabled alert rules being evaluated', alert_stats['rules']),
+        'logwatcher_alerts_firing': ('Alert rules currently firing', alert_stats['firing']),
+        'logwatcher_alert_transitions': ('Alert state changes sent', alert_stats['transitions']),
+        'logwatcher_alert_events_observed': ('Stream events folded into alert windows', alert_stats['observed']),
+        'logwatcher_alert_events_late': ('Stream events older than an alert window', alert_stats['late']),
+        'logwatcher_alert_observe_seconds': (
+            'Time spent folding stream events into alert windows', round(alert_stats['observe_seconds'], 6)
+        ),
+        'logwatcher_alert_evaluations': ('Alert evaluation passes', alert_stats['evaluations']),
+        'logwatcher_alert_evaluation_seconds': (
+            'Time spent in alert evaluation passes', round(alert_stats['evaluation_seconds'], 6)
+        ),
+        'logwatcher_alert_evaluation_max_seconds': (
+            'Slowest alert evaluation pass', round(alert_stats['evaluation_max_seconds'], 6)
+        ),
     }
-    
-    data = [
-        method_counts['GET'],
-        method_counts['POST'],
-        method_counts['PUT'],
-        method_counts['DELETE'],
-    ]
-    
-    return JsonResponse({'data': data})
+    return HttpResponse(
+        metrics.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
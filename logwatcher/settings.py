@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "events.instrumentation.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -149,3 +150,66 @@ ASGI_APPLICATION = "logwatcher.asgi.application"
 
 # Add this to ensure proper async handling
 DJANGO_ALLOW_ASYNC_UNSAFE = True
+
+# Event bus fan-out for the SSE stream: per-subscriber queue bound and the
+# number of dropped messages after which a slow subscriber is disconnected
+EVENT_BUS_QUEUE_SIZE = int(os.getenv("EVENT_BUS_QUEUE_SIZE", "256"))
+EVENT_BUS_MAX_DROPPED = int(os.getenv("EVENT_BUS_MAX_DROPPED", "1024"))
+
+# Event ingestion is buffered in memory and written with bulk_create once
+# INGEST_BATCH_SIZE events are pending or INGEST_MAX_LATENCY_MS has elapsed
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_MAX_LATENCY_MS = int(os.getenv("INGEST_MAX_LATENCY_MS", "1000"))
+
+# Capacity of the in-memory ring buffer of recent events that serves the
+# historical chart endpoints without a database query (0 disables it)
+EVENT_RING_BUFFER_CAPACITY = int(os.getenv("EVENT_RING_BUFFER_CAPACITY", "1000000"))
+
+# Retention: raw events and minute rollups are kept for EVENT_RETENTION_DAYS,
+# second rollups for EVENT_SECOND_ROLLUP_RETENTION_DAYS. On PostgreSQL the
+# events table is partitioned by day and partitions are created
+# EVENT_PARTITION_PREMAKE_DAYS ahead (see the manage_partitions command)
+EVENT_RETENTION_DAYS = int(os.getenv("EVENT_RETENTION_DAYS", "30"))
+EVENT_SECOND_ROLLUP_RETENTION_DAYS = int(os.getenv("EVENT_SECOND_ROLLUP_RETENTION_DAYS", "2"))
+EVENT_PARTITION_PREMAKE_DAYS = int(os.getenv("EVENT_PARTITION_PREMAKE_DAYS", "7"))
+
+# Cache of closed chart buckets: an in-process LRU bounded to
+# EVENT_BUCKET_CACHE_MAX_ENTRIES, or the named entry of CACHES when
+# EVENT_BUCKET_CACHE_BACKEND is set (e.g. a shared Redis cache)
+EVENT_BUCKET_CACHE_BACKEND = os.getenv("EVENT_BUCKET_CACHE_BACKEND", "")
+EVENT_BUCKET_CACHE_MAX_ENTRIES = int(os.getenv("EVENT_BUCKET_CACHE_MAX_ENTRIES", "100000"))
+
+# Level of the events loggers, which write one JSON object per line through a
+# background queue listener; per-request timings are logged at DEBUG
+EVENT_LOG_LEVEL = os.getenv("EVENT_LOG_LEVEL", "WARNING")
+
+# Worker threads for the sync work behind the async views (bucket merging,
+# raw SQL, batched writes); bounds threads and database connections per process
+EVENT_SYNC_WORKERS = int(os.getenv("EVENT_SYNC_WORKERS", "8"))
+
+# Generation state and the live event stream are shared between worker
+# processes through "postgres" (state row, advisory lock and LISTEN/NOTIFY) or
+# kept in memory with "local" for a single process; the default picks
+# "postgres" when the database is PostgreSQL. Generation stops on its own
+# after EVENT_GENERATION_AUTO_STOP_MINUTES
+EVENT_COORDINATION_BACKEND = os.getenv("EVENT_COORDINATION_BACKEND", "")
+EVENT_GENERATION_AUTO_STOP_MINUTES = int(os.getenv("EVENT_GENERATION_AUTO_STOP_MINUTES", "15"))
+
+# Events kept per worker to replay to SSE clients reconnecting with
+# Last-Event-ID; older gaps are read back from the database, capped at the
+# same number of events
+EVENT_STREAM_REPLAY_SIZE = int(os.getenv("EVENT_STREAM_REPLAY_SIZE", "1000"))
+
+# POST /api/ingest/ loads NDJSON events (optionally gzip'd) in batches of
+# EVENT_INGEST_BATCH_SIZE; when EVENT_INGEST_TOKEN is set, requests must send
+# it as "Authorization: Bearer <token>"
+EVENT_INGEST_BATCH_SIZE = int(os.getenv("EVENT_INGEST_BATCH_SIZE", "5000"))
+EVENT_INGEST_TOKEN = os.getenv("EVENT_INGEST_TOKEN", "")
+
+# GET /metrics exposes internal request, database and queue timings, so it
+# is only served to scrapers sending METRICS_TOKEN as "Authorization: Bearer
+# <token>"; without a token it is served in DEBUG only
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Enabled AlertRules are re-read this often by each worker's alert evaluator
+ALERT_RULES_REFRESH_SECONDS = int(os.getenv("ALERT_RULES_REFRESH_SECONDS", "10"))